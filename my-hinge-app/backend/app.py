@@ -1,40 +1,139 @@
 # app.py
-from flask import Flask, jsonify, request, make_response
+from flask import Flask, Response, jsonify, request, make_response
 from flask_cors import CORS
-from profiles import generate_user_profiles
-from conversation_simulator import simulate_conversations, simulate_conversation_with_ai
-from sentiment_analyzer import analyze_sentiment, initialize_nlp
-import time
+from conversation_simulator import simulate_conversation_with_ai
+from sentiment_analyzer import (analyze_sentiment, initialize_nlp, start_nlp_warmup, get_nlp_status, sentiment_cache,
+                                start_scoring_pool, DEFAULT_SCORING_WORKERS)
+from llm_client import get_default_client
+from candidates import candidate_pair_ids, candidate_recall
+from jobs import JobManager, JOB_STATES
+from profile_store import ProfileStore
+from pair_cache import PairCache
+from sentiment_details import SentimentDetails
+from run_store import run_store_from_env
+from metrics import registry, render_metrics
+from pipeline import (run_generate_profiles, run_simulate_conversations, run_analyze_sentiment, run_match_scores,
+                      update_analysis, conversations_from_list, pair_id, DEFAULT_TOP_K)
+from bulk_io import (run_records, select_tables, ndjson_gzip_chunks, arrow_stream_chunks, read_ndjson,
+                     collect_records, TABLES)
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import threading
+
+# LOG_LEVEL=DEBUG shows per-pair progress and timing spans; the default keeps one line per stage
+logging.basicConfig(
+    level=os.environ.get("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+)
+logger = logging.getLogger(__name__)
+if logging.getLogger().getEffectiveLevel() > logging.DEBUG:
+    # The HTTP client logs every LLM request at INFO
+    for name in ("httpx", "httpx2"):
+        logging.getLogger(name).setLevel(logging.WARNING)
 
 app = Flask(__name__)
 # Enable CORS with more explicit settings
 CORS(app, resources={r"/api/*": {"origins": "*", "methods": ["GET", "POST", "OPTIONS"], "allow_headers": ["Content-Type", "X-Get-Current-Only"]}})
 
-# Global state to store data between steps
+# Global state to store data between steps; "profiles" is a ProfileStore
 app_state = {
     "profiles": None,
     "conversations": None,
     "sentiment_analyzed": None,
     "in_progress": False,
     "progress_step": None,
-    "progress_message": None
+    "progress_message": None,
+    "job_id": None,
+    "run_id": None
 }
 
-# Initialize the NLP model at startup
-@app.before_first_request
-def before_first_request():
-    initialize_nlp()
+# Runs are persisted here (None when RUN_STORE=off) so a restart can pick them up
+run_store = run_store_from_env()
+
+def configured_workers(environ=os.environ):
+    """Worker processes a gunicorn-style server was told to start (WEB_CONCURRENCY, GUNICORN_CMD_ARGS)"""
+    args = environ.get("GUNICORN_CMD_ARGS", "").split()
+    for index, arg in enumerate(args):
+        if arg.startswith("--workers="):
+            return int(arg.split("=", 1)[1])
+        if arg in ("-w", "--workers") and index + 1 < len(args):
+            return int(args[index + 1])
+    return int(environ.get("WEB_CONCURRENCY", 1))
+
+# The current run, jobs and caches live in this process; the run store only
+# carries them across restarts. Other workers would answer from their own,
+# different state, so serve the app from one worker (with threads).
+if configured_workers() > 1:
+    logger.warning("%d worker processes configured, but the app keeps its state in-process; "
+                   "run a single worker so every request sees the same run and jobs", configured_workers())
+
+# Background jobs run on this pool; each job works on its own inputs and results
+JOB_TYPES = ("generate_profiles", "simulate_conversations", "analyze_sentiment", "pipeline")
+job_manager = JobManager(max_workers=int(os.environ.get("JOB_WORKERS", 4)))
+
+# Conversations and scores served by /api/conversation, kept until the run changes
+pair_cache = PairCache(max_entries=int(os.environ.get("PAIR_CACHE_SIZE", 5000)))
+
+# Results responses page through all_pairs; conversations are fetched separately by pair
+RESULT_FIELDS = ("results", "all_pairs", "sentiment_cache")
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Loading the last run at startup: state is "none", "loading", "done" or "failed"
+restore_status = {"state": "none", "run_id": None, "stage": None, "error": None}
+
+# Seconds an event stream waits for news before sending a keep-alive
+STREAM_HEARTBEAT = 15
+
+# When to load the spaCy model (NLP_WARMUP):
+#   "background" - on a thread at startup, while the server already answers requests
+#   "eager"      - before the server starts accepting requests
+#   "lazy"       - on the first request that needs it
+NLP_WARMUP_MODES = ("background", "eager", "lazy")
+NLP_WARMUP = os.environ.get("NLP_WARMUP", "background")
+if NLP_WARMUP not in NLP_WARMUP_MODES:
+    raise ValueError(f"Unknown NLP_WARMUP '{NLP_WARMUP}'. Expected one of: {', '.join(NLP_WARMUP_MODES)}")
+
+def start_warmup():
+    """Load the NLP model as NLP_WARMUP says"""
+    if NLP_WARMUP == "eager":
+        initialize_nlp()
+    elif NLP_WARMUP == "background":
+        start_nlp_warmup()
+
+@app.route('/api/ready', methods=['GET'])
+def get_ready():
+    """
+    Readiness check: 200 once the NLP model is loaded (or will load on
+    demand) and the last run is restored, 503 until then
+    """
+    nlp = get_nlp_status()
+    ready = nlp["state"] == "ready" or (NLP_WARMUP == "lazy" and nlp["state"] != "failed")
+    ready = ready and restore_status["state"] != "loading"
+    return jsonify({"ready": ready, "warmup": NLP_WARMUP, "nlp": nlp, "restore": dict(restore_status)}), \
+        200 if ready else 503
 
 @app.route('/api/status', methods=['GET'])
 def get_status():
     """Return the current status of the application"""
+    message = app_state["progress_message"]
+    job = job_manager.get(app_state["job_id"]) if app_state["job_id"] else None
+    if job is not None and app_state["in_progress"]:
+        # Background stage jobs report finer-grained progress
+        message = job.message
     return jsonify({
         "in_progress": app_state["in_progress"],
         "step": app_state["progress_step"],
-        "message": app_state["progress_message"],
+        "message": message,
+        "job_id": app_state["job_id"],
+        "run_id": app_state["run_id"],
         "has_profiles": app_state["profiles"] is not None,
         "has_conversations": app_state["conversations"] is not None,
-        "has_sentiment": app_state["sentiment_analyzed"] is not None
+        "has_sentiment": app_state["sentiment_analyzed"] is not None,
+        "nlp_state": get_nlp_status()["state"]
     })
 
 @app.route('/api/generate-profiles', methods=['POST'])
@@ -46,37 +145,36 @@ def api_generate_profiles():
             return jsonify({"error": "No profiles generated yet"}), 400
         return jsonify({
             "success": True,
-            "profiles": app_state["profiles"],
+            "profiles": app_state["profiles"].to_list(),
             "message": "Retrieved existing profiles"
         })
     
     if app_state["in_progress"]:
         return jsonify({"error": "Another operation is in progress"}), 409
     
+    # Get number of profiles and other options from request
+    options = request.get_json(silent=True) or {}
+    if options.get("async"):
+        return _start_stage_job("generate_profiles", options)
+    
     # Start the operation
     app_state["in_progress"] = True
     app_state["progress_step"] = "generate_profiles"
     app_state["progress_message"] = "Generating user profiles..."
     
     try:
-        # Get number of profiles from request or use default
-        num_profiles = request.json.get("num_profiles", 10) if request.is_json else 10
-        
-        # Generate profiles
-        app_state["profiles"] = generate_user_profiles(num_profiles=num_profiles)
-        
-        # Reset other state since we have new profiles
-        app_state["conversations"] = None
-        app_state["sentiment_analyzed"] = None
+        # Generate profiles; committing them resets the other state
+        message = _commit_stage(_run_stage(None, "generate_profiles", options))
         
         # Complete the operation
         app_state["in_progress"] = False
-        app_state["progress_message"] = f"Generated {len(app_state['profiles'])} user profiles"
+        app_state["progress_message"] = message
         
         return jsonify({
             "success": True,
-            "profiles": app_state["profiles"],
-            "message": f"Generated {len(app_state['profiles'])} user profiles"
+            "profiles": app_state["profiles"].to_list(),
+            "run_id": app_state["run_id"],
+            "message": message
         })
         
     except Exception as e:
@@ -112,18 +210,20 @@ def api_simulate_conversations():
     if not app_state["profiles"]:
         return jsonify({"error": "No profiles generated yet. Generate profiles first."}), 400
     
+    options = request.get_json(silent=True) or {}
+    if options.get("async"):
+        return _start_stage_job("simulate_conversations", options)
+    
     # Start the operation
     app_state["in_progress"] = True
     app_state["progress_step"] = "simulate_conversations"
     app_state["progress_message"] = "Simulating conversations between users..."
     
     try:
-        # Simulate conversations
-        profiles = app_state["profiles"]
-        app_state["conversations"] = simulate_conversations(profiles)
-        
-        # Reset sentiment analysis since we have new conversations
-        app_state["sentiment_analyzed"] = None
+        # Simulate conversations; committing them resets sentiment analysis
+        output = _run_stage(None, "simulate_conversations", options, app_state["profiles"],
+                            app_state["conversations"], run_id=app_state["run_id"])
+        message = _commit_stage(output)
         
         # Get a sample conversation for the response
         sample_pair = next(iter(app_state["conversations"].items()))
@@ -131,7 +231,7 @@ def api_simulate_conversations():
         
         # Complete the operation
         app_state["in_progress"] = False
-        app_state["progress_message"] = f"Simulated {len(app_state['conversations'])} conversations"
+        app_state["progress_message"] = message
         
         return jsonify({
             "success": True,
@@ -140,7 +240,9 @@ def api_simulate_conversations():
                 "pair": sample_pair[0],
                 "messages": sample_conversation
             },
-            "message": f"Simulated {len(app_state['conversations'])} conversations"
+            "simulation_stats": output["simulation_stats"],
+            "run_id": app_state["run_id"],
+            "message": message
         })
         
     except Exception as e:
@@ -157,122 +259,605 @@ def api_analyze_sentiment():
     if not app_state["conversations"]:
         return jsonify({"error": "No conversations to analyze. Generate profiles and simulate conversations first."}), 400
     
+    options = request.get_json(silent=True) or {}
+    if options.get("async"):
+        return _start_stage_job("analyze_sentiment", options)
+    
+    try:
+        view = _result_view(options)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
     try:
         app_state["in_progress"] = True
         app_state["progress_step"] = "ANALYZING_SENTIMENT"
         app_state["progress_message"] = "Analyzing sentiment..."
         
-        # Create a simplified data structure for sentiment analysis
-        conversation_pairs = []
-        user_conversations = {}
-        for (userA_id, userB_id), conversation in app_state["conversations"].items():
-            user_conversations[(userA_id, userB_id)] = conversation
-            conversation_pairs.append((userA_id, userB_id, conversation))
-        
-        profiles = app_state["profiles"]
-        
-        # Initialize user-match structure
-        user_matches = {}
-        for profile in profiles:
-            user_matches[profile['id']] = {
-                'user': profile,
-                'matches': []
-            }
+        output = _run_stage(None, "analyze_sentiment", options, app_state["profiles"],
+                            app_state["conversations"], run_id=app_state["run_id"])
         
-        # Process all conversation pairs
-        scored_pairs = []
-        for userA_id, userB_id, conversation in conversation_pairs:
-            # Get user names for output
-            userA = next((p for p in profiles if p['id'] == userA_id), None)
-            userB = next((p for p in profiles if p['id'] == userB_id), None)
-            
-            if not userA or not userB:
-                continue
-                
-            userA_name = userA['name'] 
-            userB_name = userB['name']
-            
-            try:
-                print(f"Analyzing sentiment for conversation between {userA_name}, {userB_name}...")
-                sentiment_score = analyze_sentiment(conversation)
-                
-                # Add to scored pairs
-                scored_pairs.append({
-                    'userA_id': userA_id,
-                    'userB_id': userB_id,
-                    'userA_name': userA_name,
-                    'userB_name': userB_name,
-                    'sentiment_score': sentiment_score,
-                    'conversation': conversation
-                })
-            except Exception as e:
-                print(f"Error analyzing sentiment between {userA_name} and {userB_name}: {str(e)}")
-                # Provide a neutral score as fallback
-                scored_pairs.append({
-                    'userA_id': userA_id,
-                    'userB_id': userB_id,
-                    'userA_name': userA_name,
-                    'userB_name': userB_name,
-                    'sentiment_score': 0.5,  # Neutral score
-                    'conversation': conversation,
-                    'error': str(e)
-                })
+        # Store the results
+        message = _commit_stage(output)
         
-        # Sort by sentiment score (highest first)
-        scored_pairs_sorted = sorted(scored_pairs, key=lambda x: x['sentiment_score'], reverse=True)
+        # Complete the operation
+        app_state["in_progress"] = False
+        app_state["progress_message"] = message
         
-        # For each user, find top 3 matches
-        for pair in scored_pairs_sorted:
-            userA_id = pair['userA_id']
-            userB_id = pair['userB_id']
-            
-            # Add match data for both sides if they don't have 3 yet
-            if len(user_matches[userA_id]['matches']) < 3:
-                userB = next((p for p in profiles if p['id'] == userB_id), None)
-                user_matches[userA_id]['matches'].append({
-                    'partner_id': userB_id,
-                    'partner_name': userB['name'] if userB else f"User {userB_id}",
-                    'sentiment_score': pair['sentiment_score'],
-                    'conversation': pair['conversation']
-                })
-            
-            if len(user_matches[userB_id]['matches']) < 3:
-                userA = next((p for p in profiles if p['id'] == userA_id), None)
-                user_matches[userB_id]['matches'].append({
-                    'partner_id': userA_id,
-                    'partner_name': userA['name'] if userA else f"User {userA_id}",
-                    'sentiment_score': pair['sentiment_score'],
-                    'conversation': pair['conversation']
-                })
+        return jsonify({
+            "success": True,
+            **_results_payload(output["analysis"], view)
+        })
         
-        # Store the results
+    except Exception as e:
+        app_state["in_progress"] = False
+        app_state["progress_message"] = f"Error analyzing sentiment: {str(e)}"
+        return jsonify({"error": str(e)}), 500
+
+def _result_view(params):
+    """
+    Parse the results view parameters from query args or JSON options:
+    "fields" (comma-separated or a list of RESULT_FIELDS) selects top-level
+    sections, "limit" and "cursor" page through all_pairs.
+    Raises ValueError for bad parameters.
+    """
+    fields = params.get("fields") or RESULT_FIELDS
+    if isinstance(fields, str):
+        fields = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = set(fields) - set(RESULT_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}. Choose from: {', '.join(RESULT_FIELDS)}")
+    limit = int(params.get("limit", DEFAULT_PAGE_SIZE))
+    cursor = int(params.get("cursor") or 0)
+    if limit < 1 or cursor < 0:
+        raise ValueError("limit must be positive and cursor must not be negative")
+    return {"fields": set(fields), "limit": min(limit, MAX_PAGE_SIZE), "cursor": cursor}
+
+def _results_payload(analysis, view):
+    """Response body for an analysis as selected by a _result_view"""
+    payload = {}
+    if "results" in view["fields"]:
+        payload["results"] = analysis["results"]
+    if "sentiment_cache" in view["fields"] and "sentiment_cache" in analysis:
+        payload["sentiment_cache"] = analysis["sentiment_cache"]
+    if "all_pairs" in view["fields"] and analysis.get("all_pairs") is not None:
+        all_pairs = analysis["all_pairs"]
+        end = view["cursor"] + view["limit"]
+        payload["all_pairs"] = all_pairs[view["cursor"]:end]
+        payload["total_pairs"] = len(all_pairs)
+        payload["next_cursor"] = str(end) if end < len(all_pairs) else None
+    return payload
+
+def _progress(job, stage, message_format):
+    """Progress callback reporting to the job, if there is one"""
+    return job.progress_callback(stage, message_format) if job is not None else None
+
+def _conversation_event(job):
+    """result_callback publishing each simulated conversation as a job event"""
+    if job is None:
+        return None
+    
+    def emit(pair, messages):
+        job.emit("conversation", {"userA_id": pair[0], "userB_id": pair[1],
+                                  "pair_id": pair_id(*pair), "messages": messages})
+    return emit
+
+def _pair_event(job):
+    """pair_callback publishing each scored pair as a job event"""
+    return (lambda pair: job.emit("pair", pair)) if job is not None else None
+
+def _new_run(options, profiles, conversations=None, source="app"):
+    """Store a new run holding `profiles` (and `conversations`); returns its id, or None without a run store"""
+    if run_store is None:
+        return None
+    run_id = run_store.create_run({key: value for key, value in options.items() if key not in ("profiles", "conversations")},
+                                  source=source)
+    run_store.save_profiles(run_id, profiles)
+    if conversations:
+        run_store.save_conversations(run_id, conversations)
+        run_store.set_conversation_order(run_id, conversations)
+        run_store.set_status(run_id, "simulated")
+    return run_id
+
+def _simulate(job, profiles, options, run_id, stats=None, new_ids=None, skip_pairs=None):
+    """
+    run_simulate_conversations publishing job events and, for a stored run,
+    writing conversations as they finish so an interrupted run can resume
+    """
+    emit = _conversation_event(job)
+    progress = _progress(job, "simulate_conversations", "Simulated {done}/{total} conversations")
+    if run_id is None:
+        return run_simulate_conversations(profiles, options, progress, new_ids=new_ids, stats=stats,
+                                          result_callback=emit, skip_pairs=skip_pairs)
+    
+    run_store.set_status(run_id, "simulating")
+    with run_store.conversation_writer(run_id) as writer:
+        def record(pair, messages):
+            writer.add(pair, messages)
+            if emit:
+                emit(pair, messages)
+        conversations = run_simulate_conversations(profiles, options, progress, new_ids=new_ids, stats=stats,
+                                                   result_callback=record, skip_pairs=skip_pairs)
+    run_store.set_status(run_id, "simulated")
+    return conversations
+
+def _run_stage(job, kind, options, profiles=None, conversations=None, analysis=None, run_id=None, source="app"):
+    """
+    Run one pipeline stage (or the whole pipeline) inside a job and return its
+    raw outputs. With a run store, outputs are saved to run `run_id` as they
+    are produced; newly generated profiles, or inputs that don't belong to a
+    stored run, start a new run tagged with `source` ("job" runs are never
+    reloaded as the current run).
+    """
+    output = {}
+    if kind == "add_profiles":
+        # Incremental mode: only pairs involving the new profiles are simulated and scored
+        profiles = ProfileStore.of(profiles).copy()
+        new_profiles = profiles.add(run_generate_profiles(
+            options, _progress(job, "generate_profiles", "Generated {done}/{total} profiles"), start_id=profiles.next_id()))
+        output["added_profiles"] = new_profiles
+        output["pool"] = profiles
+        if run_id is None:
+            run_id = _new_run(options, profiles, conversations, source)
+        elif run_store is not None:
+            run_store.save_profiles(run_id, new_profiles)
+        if conversations is not None:
+            new_conversations = _simulate(job, profiles, options, run_id, new_ids={p.id for p in new_profiles})
+            if run_id is not None:
+                run_store.set_conversation_order(run_id, new_conversations, first_position=len(conversations))
+            output["added_conversations"] = new_conversations
+            if analysis is not None:
+                details = SentimentDetails() if run_id is not None else None
+                changes = {}
+                update_analysis(analysis, profiles, new_conversations, options,
+                                _progress(job, "analyze_sentiment", "Scored {done}/{total} messages"),
+                                pair_callback=_pair_event(job), message_details=details, changes=changes)
+                if run_id is not None:
+                    run_store.save_analysis(run_id, analysis, details, changes=changes)
+                output["updated_analysis"] = analysis
+        output["run_id"] = run_id
+        return output
+    
+    if kind in ("generate_profiles", "pipeline"):
+        profiles = ProfileStore(run_generate_profiles(
+            options, _progress(job, "generate_profiles", "Generated {done}/{total} profiles")))
+        output["profiles"] = profiles
+        run_id = _new_run(options, profiles, source=source)
+    elif run_id is None:
+        run_id = _new_run(options, profiles, conversations if kind == "analyze_sentiment" else None, source)
+    
+    if kind in ("simulate_conversations", "pipeline"):
+        # With "resume", pairs that already have a conversation are kept and not simulated again
+        existing = conversations if options.get("resume") and conversations else {}
+        if run_id is not None:
+            if existing:
+                run_store.clear_analysis(run_id)
+            else:
+                run_store.clear_conversations(run_id)
+        output["simulation_stats"] = {}
+        new_conversations = _simulate(job, profiles, options, run_id, stats=output["simulation_stats"],
+                                      skip_pairs=set(existing))
+        conversations = {**existing, **new_conversations}
+        if run_id is not None:
+            run_store.set_conversation_order(run_id, conversations)
+        output["conversations"] = conversations
+    
+    if kind in ("analyze_sentiment", "pipeline"):
+        details = SentimentDetails() if run_id is not None else None
+        output["analysis"] = run_analyze_sentiment(
+            profiles, conversations, options, _progress(job, "analyze_sentiment", "Scored {done}/{total} messages"),
+            pair_callback=_pair_event(job), message_details=details)
+        if run_id is not None:
+            run_store.save_analysis(run_id, output["analysis"], details)
+    
+    output["run_id"] = run_id
+    return output
+
+def _job_result(output):
+    """
+    Summary of _run_stage outputs kept on the job: the run id, counts and
+    stats. Jobs are kept around (up to JobManager's limit), so they don't
+    hold profiles, conversations or pairs; matches are paged from
+    /api/results and messages fetched from /api/conversation (or the stored
+    run, for independent jobs).
+    """
+    result = {"run_id": output.get("run_id")}
+    if "profiles" in output:
+        result["num_profiles"] = len(output["profiles"])
+    if "conversations" in output:
+        result["num_conversations"] = len(output["conversations"])
+        result["simulation_stats"] = output["simulation_stats"]
+    if "analysis" in output:
+        analysis = output["analysis"]
+        result["num_users"] = len(analysis['results'])
+        if analysis.get('all_pairs') is not None:
+            result["num_pairs"] = len(analysis['all_pairs'])
+        result["sentiment_cache"] = analysis.get('sentiment_cache')
+    if "added_profiles" in output:
+        result["num_added_profiles"] = len(output["added_profiles"])
+        result["num_added_conversations"] = len(output.get("added_conversations", {}))
+        result["sentiment_updated"] = "updated_analysis" in output
+    return result
+
+def _commit_stage(output):
+    """Store a stage's outputs in app_state, resetting the stages downstream of it"""
+    pair_cache.clear()
+    app_state["run_id"] = output.get("run_id")
+    if "profiles" in output:
+        app_state["profiles"] = output["profiles"]
+        app_state["conversations"] = None
+        app_state["sentiment_analyzed"] = None
+        message = f"Generated {len(output['profiles'])} user profiles"
+    if "conversations" in output:
+        app_state["conversations"] = output["conversations"]
+        app_state["sentiment_analyzed"] = None
+        message = f"Simulated {len(output['conversations'])} conversations"
+    if "analysis" in output:
         app_state["sentiment_analyzed"] = {
-            'results': user_matches,
-            'all_pairs': scored_pairs_sorted
+            'results': output["analysis"]['results'],
+            'all_pairs': output["analysis"].get('all_pairs')
         }
+        message = "Sentiment analysis complete"
+    if "added_profiles" in output:
+        # Grow the existing run in place instead of resetting it
+        app_state["profiles"] = output["pool"]
+        if "added_conversations" in output:
+            app_state["conversations"].update(output["added_conversations"])
+        if "updated_analysis" in output:
+            app_state["sentiment_analyzed"] = {
+                'results': output["updated_analysis"]['results'],
+                'all_pairs': output["updated_analysis"].get('all_pairs')
+            }
+        message = (f"Added {len(output['added_profiles'])} profiles "
+                   f"({len(output.get('added_conversations', {}))} new conversations)")
+    return message
+
+def _copy_analysis(analysis):
+    """Copy of stored results that update_analysis can modify without touching app_state until commit"""
+    if analysis is None:
+        return None
+    return {
+        'results': {user_id: {'user': data['user'], 'matches': list(data['matches'])}
+                    for user_id, data in analysis['results'].items()},
+        'all_pairs': analysis.get('all_pairs')
+    }
+
+def _start_stage_job(kind, options):
+    """Run a stage endpoint's work as a background job that commits its output to app_state"""
+    profiles = app_state["profiles"]
+    conversations = app_state["conversations"]
+    analysis = _copy_analysis(app_state["sentiment_analyzed"])
+    run_id = app_state["run_id"]
+    
+    app_state["in_progress"] = True
+    app_state["progress_step"] = kind
+    app_state["progress_message"] = f"Queued {kind.replace('_', ' ')}"
+    
+    def run(job):
+        try:
+            output = _run_stage(job, kind, options, profiles, conversations, analysis, run_id)
+            app_state["progress_message"] = _commit_stage(output)
+            return _job_result(output)
+        except Exception as e:
+            app_state["progress_message"] = f"Error in {kind.replace('_', ' ')}: {str(e)}"
+            raise
+        finally:
+            app_state["in_progress"] = False
+    
+    job = job_manager.submit(kind, run, params=options)
+    app_state["job_id"] = job.id
+    return jsonify({
+        "success": True,
+        "job_id": job.id,
+        "status_url": f"/api/jobs/{job.id}",
+        "events_url": f"/api/jobs/{job.id}/events",
+        "message": f"Started {kind.replace('_', ' ')} job"
+    }), 202
+
+@app.route('/api/add-profiles', methods=['POST'])
+def api_add_profiles():
+    """
+    Add profiles to the current pool. Only pairs involving the new profiles are
+    simulated and scored, and existing users' top matches are updated in place.
+    """
+    if app_state["in_progress"]:
+        return jsonify({"error": "Another operation is in progress"}), 409
+    
+    options = request.get_json(silent=True) or {}
+    if options.get("async"):
+        return _start_stage_job("add_profiles", options)
+    
+    # Start the operation
+    app_state["in_progress"] = True
+    app_state["progress_step"] = "add_profiles"
+    app_state["progress_message"] = "Adding user profiles..."
+    
+    try:
+        output = _run_stage(None, "add_profiles", options, app_state["profiles"], app_state["conversations"],
+                            _copy_analysis(app_state["sentiment_analyzed"]), run_id=app_state["run_id"])
+        message = _commit_stage(output)
         
         # Complete the operation
         app_state["in_progress"] = False
-        app_state["progress_message"] = "Sentiment analysis complete"
+        app_state["progress_message"] = message
         
         return jsonify({
             "success": True,
-            "results": user_matches,
-            "all_pairs": scored_pairs_sorted
+            **_job_result(output),
+            "message": message
         })
         
     except Exception as e:
         app_state["in_progress"] = False
-        app_state["progress_message"] = f"Error analyzing sentiment: {str(e)}"
+        app_state["progress_message"] = f"Error adding profiles: {str(e)}"
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    """
+    Start an independent background job. Body: {"type": one of JOB_TYPES, ...options}.
+    Inputs default to the current profiles/conversations but can be passed as
+    "profiles" and "conversations" (list of {userA_id, userB_id, messages}).
+    Results stay on the job and never touch the shared app state.
+    """
+    options = request.get_json(silent=True) or {}
+    kind = options.get("type")
+    if kind not in JOB_TYPES:
+        return jsonify({"error": f"Job type must be one of: {', '.join(JOB_TYPES)}"}), 400
+    
+    profiles = ProfileStore.of(options.get("profiles") or app_state["profiles"])
+    if "conversations" in options:
+        conversations = conversations_from_list(options["conversations"])
+    else:
+        conversations = app_state["conversations"]
+    
+    if kind in ("simulate_conversations", "analyze_sentiment") and not profiles:
+        return jsonify({"error": "No profiles available. Generate profiles or pass them in the request."}), 400
+    if kind == "analyze_sentiment" and not conversations:
+        return jsonify({"error": "No conversations available. Simulate conversations or pass them in the request."}), 400
+    
+    params = {key: value for key, value in options.items() if key not in ("profiles", "conversations")}
+    job = job_manager.submit(kind, lambda job: _job_result(_run_stage(job, kind, options, profiles, conversations,
+                                                                      source="job")), params=params)
+    return jsonify({
+        "success": True,
+        "job_id": job.id,
+        "status_url": f"/api/jobs/{job.id}",
+        "events_url": f"/api/jobs/{job.id}/events"
+    }), 202
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """List known jobs without their results"""
+    return jsonify({"jobs": [job.to_dict(include_result=False) for job in job_manager.list()]})
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Report a job's state, progress and (once finished) its result"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    include_result = request.args.get("include_result", "true").lower() != "false"
+    return jsonify(job.to_dict(include_result=include_result))
+
+@app.route('/api/candidates', methods=['GET'])
+def get_candidates():
+    """
+    Report how many pairs candidate pre-filtering with ?top_k=K would simulate,
+    and (once a full analysis exists) the share of true top matches it keeps.
+    """
+    if not app_state["profiles"]:
+        return jsonify({"error": "No profiles generated yet"}), 400
+    
+    top_k = request.args.get("top_k", 5, type=int)
+    if top_k < 1:
+        return jsonify({"error": "top_k must be at least 1"}), 400
+    
+    profiles = app_state["profiles"]
+    total_pairs = len(profiles) * (len(profiles) - 1) // 2
+    candidates = candidate_pair_ids(profiles, top_k)
+    response = {
+        "top_k": top_k,
+        "total_pairs": total_pairs,
+        "candidate_pairs": len(candidates),
+        "pruned_pairs": total_pairs - len(candidates)
+    }
+    analysis = app_state["sentiment_analyzed"]
+    if analysis and analysis.get('all_pairs') is not None and len(analysis['all_pairs']) == total_pairs:
+        # Recall only means something against a run that scored every pair
+        response["recall"] = candidate_recall(candidates, analysis['all_pairs'], k=request.args.get("k", 3, type=int))
+    return jsonify(response)
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def stream_job_events(job_id):
+    """
+    Stream a job's events as they happen: Server-Sent Events by default, or
+    newline-delimited JSON with ?format=ndjson. Events are "state",
+    "progress" (counts and ETA), "conversation" and "pair". ?types= limits
+    the stream to some of them, and ?since=<seq> (or SSE's Last-Event-ID)
+    resumes after a disconnect. The stream ends after the final state event.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    
+    ndjson = request.args.get("format") == "ndjson"
+    types = set(filter(None, request.args.get("types", "").split(",")))
+    since = request.args.get("since", type=int)
+    if since is None:
+        last_id = request.headers.get("Last-Event-ID")
+        since = int(last_id) + 1 if last_id and last_id.isdigit() else 0
+    
+    def generate():
+        seq = since
+        while True:
+            events, finished = job.events_since(seq, timeout=STREAM_HEARTBEAT)
+            for event in events:
+                seq = event["seq"] + 1
+                if types and event["type"] not in types:
+                    continue
+                if ndjson:
+                    yield json.dumps(event) + "\n"
+                else:
+                    yield f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+            if finished:
+                return
+            if not events and not ndjson:
+                yield ": keep-alive\n\n"
+    
+    return Response(generate(), mimetype="application/x-ndjson" if ndjson else "text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def _load_run(run_id, status=None):
+    """Make a stored run the current state; `status["stage"]` follows what is being loaded"""
+    status = status if status is not None else {}
+    status["stage"] = "profiles"
+    profiles = run_store.load_profiles(run_id)
+    status["stage"] = "conversations"
+    conversations = run_store.load_conversations(run_id)
+    status["stage"] = "analysis"
+    analysis = run_store.load_analysis(run_id)
+    pair_cache.clear()
+    app_state["profiles"] = ProfileStore(profiles) if profiles else None
+    app_state["conversations"] = conversations or None
+    app_state["sentiment_analyzed"] = analysis
+    app_state["run_id"] = run_id
+    app_state["progress_message"] = (f"Loaded run {run_id}: {len(profiles)} profiles, "
+                                     f"{len(conversations)} conversations")
+
+@app.route('/api/runs', methods=['GET'])
+def list_runs():
+    """List stored runs"""
+    if run_store is None:
+        return jsonify({"error": "Run store is disabled"}), 404
+    return jsonify({"runs": run_store.list_runs(), "current_run_id": app_state["run_id"]})
+
+@app.route('/api/runs/<int:run_id>', methods=['GET'])
+def get_run(run_id):
+    """Report a stored run's status and how many profiles, conversations and scores it holds"""
+    if run_store is None:
+        return jsonify({"error": "Run store is disabled"}), 404
+    run = run_store.get_run(run_id)
+    if run is None:
+        return jsonify({"error": "Run not found"}), 404
+    return jsonify(run)
+
+@app.route('/api/runs/<int:run_id>/load', methods=['POST'])
+def load_run(run_id):
+    """
+    Make a stored run current. A run whose simulation was interrupted can
+    then be finished with /api/simulate-conversations and {"resume": true}.
+    """
+    if run_store is None:
+        return jsonify({"error": "Run store is disabled"}), 404
+    if app_state["in_progress"]:
+        return jsonify({"error": "Another operation is in progress"}), 409
+    run = run_store.get_run(run_id)
+    if run is None:
+        return jsonify({"error": "Run not found"}), 404
+    _load_run(run_id)
+    return jsonify({"success": True, **run, "message": app_state["progress_message"]})
+
+@app.route('/api/export', methods=['GET'])
+def export_state():
+    """
+    Stream the current profiles, conversations, pair scores and matches.
+    format=ndjson (default) sends gzip NDJSON records, one per line, of the
+    tables listed in `tables` (default all). format=arrow sends one `table`
+    (default pairs) as an Arrow IPC stream, which needs pyarrow.
+    """
+    if not app_state["profiles"]:
+        return jsonify({"error": "No profiles generated yet"}), 400
+    if app_state["in_progress"]:
+        return jsonify({"error": "Another operation is in progress"}), 409
+    export_format = request.args.get("format", "ndjson")
+    # Snapshot the run now: the response streams after this returns, while a
+    # new stage may already be replacing or adding to the state
+    analysis = app_state["sentiment_analyzed"] or {}
+    scores = [((pair['userA_id'], pair['userB_id']), pair['sentiment_score']) for pair in analysis.get('all_pairs') or []]
+    results = {user_id: {'matches': data['matches']} for user_id, data in (analysis.get('results') or {}).items()}
+    records = run_records(list(app_state["profiles"]), list((app_state["conversations"] or {}).items()), scores,
+                          run={"run_id": app_state["run_id"]}, results=results)
+
+    try:
+        if export_format == "ndjson":
+            tables = request.args.get("tables", ",".join(TABLES)).split(",")
+            body = ndjson_gzip_chunks(select_tables(records, tables))
+            mimetype, filename = "application/gzip", "hinge-run.ndjson.gz"
+        elif export_format == "arrow":
+            table = request.args.get("table", "pairs")
+            if table not in TABLES:
+                raise ValueError(f"Unknown table '{table}'. Expected one of: {', '.join(TABLES)}")
+            body = arrow_stream_chunks(table, records)
+            # Fail here rather than mid-stream if pyarrow is missing
+            body = itertools.chain([next(body)], body)
+            mimetype, filename = "application/vnd.apache.arrow.stream", f"hinge-{table}.arrows"
+        else:
+            return jsonify({"error": f"Unknown format '{export_format}'. Expected ndjson or arrow"}), 400
+    except (ValueError, ImportError) as e:
+        return jsonify({"error": str(e)}), 400
+    return Response(body, mimetype=mimetype, headers={"Content-Disposition": f"attachment; filename={filename}"})
+
+@app.route('/api/import', methods=['POST'])
+def import_state():
+    """
+    Make an NDJSON export (gzip or plain, as the request body) the current
+    run. Imported pair scores are re-matched with the `top_k` query
+    parameter; with rescore=true the conversations are scored again instead.
+    """
+    if app_state["in_progress"]:
+        return jsonify({"error": "Another operation is in progress"}), 409
+    options = {"top_k": request.args.get("top_k", DEFAULT_TOP_K, type=int)}
+    rescore = request.args.get("rescore") == "true"
+
+    try:
+        profiles, conversations, scores = collect_records(read_ndjson(request.stream))
+        profiles = ProfileStore(profiles)
+    except (ValueError, TypeError, KeyError) as e:
+        # Malformed records (a missing field, a value of the wrong type) are the client's error
+        return jsonify({"error": f"Invalid import: {e}"}), 400
+    if not profiles:
+        return jsonify({"error": "The import has no profiles"}), 400
+
+    app_state["in_progress"] = True
+    app_state["progress_step"] = "import"
+    try:
+        output = {"profiles": profiles, "run_id": _new_run({"imported": True, **options}, profiles, conversations)}
+        if conversations:
+            output["conversations"] = conversations
+        if rescore and conversations:
+            output["analysis"] = run_analyze_sentiment(profiles, conversations, options)
+        elif scores:
+            output["analysis"] = run_match_scores(profiles, scores, options)
+        if "analysis" in output and output["run_id"] is not None:
+            run_store.save_analysis(output["run_id"], output["analysis"])
+        _commit_stage(output)
+        message = (f"Imported {len(profiles)} profiles, {len(conversations)} conversations "
+                   f"and {len(scores)} pair scores")
+        app_state["progress_message"] = message
+        return jsonify({"success": True, "run_id": app_state["run_id"], "num_profiles": len(profiles),
+                        "num_conversations": len(conversations), "num_pairs": len(scores),
+                        "analyzed": "analysis" in output, "message": message})
+    except Exception as e:
+        app_state["progress_message"] = f"Error importing run: {str(e)}"
+        return jsonify({"error": str(e)}), 500
+    finally:
+        app_state["in_progress"] = False
+
 @app.route('/api/results', methods=['GET'])
 def get_results():
-    """Get the final results"""
+    """
+    Get the final results. Matches and pairs reference conversations by
+    pair_id; fetch the messages from /api/conversation/<a>/<b>.
+    Query parameters: fields, limit and cursor (see _result_view).
+    """
     if not app_state["sentiment_analyzed"]:
         return jsonify({"error": "No sentiment analysis has been performed yet. Complete all steps first."}), 400
     
-    return jsonify(app_state["sentiment_analyzed"])
+    try:
+        view = _result_view(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(_results_payload(app_state["sentiment_analyzed"], view))
 
 @app.route('/api/reset', methods=['POST'])
 def reset_state():
@@ -283,58 +868,114 @@ def reset_state():
     app_state["in_progress"] = False
     app_state["progress_step"] = None
     app_state["progress_message"] = "Application reset"
+    app_state["job_id"] = None
+    app_state["run_id"] = None
+    pair_cache.clear()
     
     return jsonify({
         "success": True,
         "message": "Application reset successfully"
     })
 
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Return hit/miss counters for the LLM completion, message sentiment and pair conversation caches"""
+    cache = get_default_client().cache
+    completions = {"enabled": True, **cache.get_stats()} if cache is not None else {"enabled": False}
+    return jsonify({
+        "completions": completions,
+        "sentiment": sentiment_cache.get_stats(),
+        "conversations": pair_cache.get_stats()
+    })
+
+@app.route('/api/cache/clear', methods=['POST'])
+def clear_cache():
+    """Drop every cached LLM completion, message sentiment score and pair conversation"""
+    cache = get_default_client().cache
+    if cache is not None:
+        cache.clear()
+    sentiment_cache.clear()
+    pair_cache.clear()
+    return jsonify({"success": True, "message": "Caches cleared"})
+
+def _build_pair(user1, user2):
+    """(entry, store) for the conversation endpoint: the run's conversation for the pair, or a new one"""
+    conversations = app_state["conversations"] or {}
+    details = {}
+    if (user1.id, user2.id) in conversations:
+        conversation = conversations[(user1.id, user2.id)]
+    elif (user2.id, user1.id) in conversations:
+        conversation = conversations[(user2.id, user1.id)]
+    else:
+        # Generate a new conversation for this pair
+        conversation = simulate_conversation_with_ai(user1, user2, details=details)
+    
+    try:
+        # A placeholder standing in for a failed LLM call isn't cached, so the next request tries again
+        entry = {'conversation': conversation, 'sentiment_score': analyze_sentiment(conversation)}
+        return entry, not details.get("fallback")
+    except Exception as e:
+        logger.warning("Error analyzing sentiment: %s", e)
+        # Use neutral sentiment as fallback, and don't cache it so a later request can score it
+        return {'conversation': conversation, 'sentiment_score': 0.5}, False
+
 # Add a route to get detailed conversation for a specific pair
 @app.route('/api/conversation/<int:user1_id>/<int:user2_id>', methods=['GET'])
 def get_conversation(user1_id, user2_id):
+    """
+    A pair's conversation and sentiment score. Both are cached per pair
+    until the run changes, and concurrent requests for the same pair share
+    one simulation.
+    """
     if not app_state["profiles"]:
         return jsonify({"error": "No profiles generated yet"}), 400
     
-    profiles = app_state["profiles"]
-    user1 = next((p for p in profiles if p['id'] == user1_id), None)
-    user2 = next((p for p in profiles if p['id'] == user2_id), None)
+    user1 = app_state["profiles"].get(user1_id)
+    user2 = app_state["profiles"].get(user2_id)
     
     if not user1 or not user2:
         return jsonify({'error': 'User not found'}), 404
     
-    # Check if conversation exists in cached conversations
-    if app_state["conversations"]:
-        if (user1_id, user2_id) in app_state["conversations"]:
-            conversation = app_state["conversations"][(user1_id, user2_id)]
-        elif (user2_id, user1_id) in app_state["conversations"]:
-            conversation = app_state["conversations"][(user2_id, user1_id)]
-        else:
-            # Generate a new conversation for this pair
-            try:
-                conversation = simulate_conversation_with_ai(user1, user2)
-            except Exception as e:
-                return jsonify({'error': f'Error generating conversation: {str(e)}'}), 500
-    else:
-        # Generate a new conversation for this pair
-        try:
-            conversation = simulate_conversation_with_ai(user1, user2)
-        except Exception as e:
-            return jsonify({'error': f'Error generating conversation: {str(e)}'}), 500
-    
-    # Analyze sentiment
     try:
-        sentiment_score = analyze_sentiment(conversation)
+        entry = pair_cache.get_or_build(PairCache.key(user1_id, user2_id), lambda: _build_pair(user1, user2))
     except Exception as e:
-        print(f"Error analyzing sentiment: {str(e)}")
-        sentiment_score = 0.5  # Use neutral sentiment as fallback
+        return jsonify({'error': f'Error generating conversation: {str(e)}'}), 500
     
     return jsonify({
-        'user1': user1,
-        'user2': user2,
-        'conversation': conversation,
-        'sentiment_score': sentiment_score
+        'user1': user1.to_dict(),
+        'user2': user2.to_dict(),
+        'conversation': entry['conversation'],
+        'sentiment_score': entry['sentiment_score']
     })
 
+def _state_metrics():
+    """Gauges read from the caches, jobs and current run at scrape time"""
+    sentiment = sentiment_cache.get_stats()
+    jobs_by_state = dict.fromkeys(JOB_STATES, 0)
+    for job in job_manager.list():
+        jobs_by_state[job.state] += 1
+    profiles = app_state["profiles"]
+    conversations = app_state["conversations"]
+    samples = [
+        ("hinge_sentiment_cache_entries", "gauge", "Messages held in the sentiment cache",
+         [({}, sentiment["entries"])]),
+        ("hinge_jobs", "gauge", "Background jobs by state",
+         [({"state": state}, count) for state, count in jobs_by_state.items()]),
+        ("hinge_current_profiles", "gauge", "Profiles in the current run",
+         [({}, len(profiles) if profiles else 0)]),
+        ("hinge_current_conversations", "gauge", "Conversations in the current run",
+         [({}, len(conversations) if conversations else 0)]),
+    ]
+    # Cache lookup counters are registry counters (metrics.py), which /api/cache/clear doesn't reset
+    return samples
+
+registry.add_collector(_state_metrics)
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Timing spans, LLM counters and cache/job gauges in the Prometheus text format"""
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
 # Add an OPTIONS route handler for CORS preflight requests
 @app.route('/api/<path:path>', methods=['OPTIONS'])
 def handle_options(path):
@@ -344,5 +985,49 @@ def handle_options(path):
     response.headers.add('Access-Control-Allow-Methods', 'GET,POST,OPTIONS')
     return response
 
+def _restore_latest_run(run_id):
+    """Load the last process's current run; requests that change state wait with a 409 until it's in"""
+    try:
+        _load_run(run_id, restore_status)
+        restore_status["state"] = "done"
+    except Exception as e:
+        logger.exception("Failed to restore run %s", run_id)
+        restore_status["state"] = "failed"
+        restore_status["error"] = str(e)
+        app_state["progress_message"] = f"Failed to load run {run_id}: {e}"
+    finally:
+        restore_status["stage"] = None
+        app_state["in_progress"] = False
+        app_state["progress_step"] = None
+
+def start_restore():
+    """
+    Pick up the most recent run where the last process left off. A large run
+    takes a while to read back, so it loads on a thread while the server
+    already answers; /api/ready reports its progress.
+    """
+    run_id = run_store.latest_run_id() if run_store is not None else None
+    if run_id is None:
+        return None
+    restore_status.update(state="loading", run_id=run_id)
+    app_state["in_progress"] = True
+    app_state["progress_step"] = "restore"
+    app_state["progress_message"] = f"Loading run {run_id}"
+    thread = threading.Thread(target=_restore_latest_run, args=(run_id,), name="run-restore", daemon=True)
+    thread.start()
+    return thread
+
+# Start the scoring workers before the restore, warm-up, job and request threads
+# exist, so forking them can't copy a lock another thread holds
+if DEFAULT_SCORING_WORKERS > 1 and multiprocessing.parent_process() is None:
+    start_scoring_pool(DEFAULT_SCORING_WORKERS)
+start_restore()
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5001, debug=True) 
\ No newline at end of file
+    # With the debug reloader the parent process only watches files; warm up in the child that serves
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_warmup()
+    app.run(host='0.0.0.0', port=5001, debug=True)
+else:
+    # Imported by a WSGI server (or a test client)
+    start_warmup() 
\ No newline at end of file
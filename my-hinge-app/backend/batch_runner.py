@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# batch_runner.py - Run the whole pipeline without the HTTP server
+#
+# Generates profiles, simulates every pair's conversation and scores them,
+# checkpointing each stage to a run store in --checkpoint-dir and streaming
+# records (in the bulk_io format) to --output as they are produced. Running
+# the same command again after a crash or kill resumes the unfinished run
+# from its last checkpoint; once a run is complete, the next starts afresh.
+#
+#   python batch_runner.py --profiles 1000 --engine local --seed 7 --output run.ndjson.gz
+#   python batch_runner.py --profiles 200 --concurrency 16 --workers 4 --format parquet --output nightly/
+#   python batch_runner.py --profiles 50 --engine local | jq -c 'select(.type == "match")'
+
+import argparse
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from bulk_io import (run_record, profile_record, conversation_record, pair_record, match_records, write_export,
+                     EXPORT_FORMATS, DEFAULT_BATCH_ROWS)
+from conversation_simulator import ENGINES
+from pipeline import (run_generate_profiles, run_simulate_conversations, run_match_scores, analyze_in_chunks,
+                      DEFAULT_TOP_K, DEFAULT_CHUNK_SIZE)
+from run_store import RunStore
+from sentiment_analyzer import initialize_nlp, start_scoring_pool, shutdown_scoring_pool, DEFAULT_SCORING_WORKERS
+
+logger = logging.getLogger("batch_runner")
+
+DEFAULT_CHECKPOINT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "batch")
+
+# Options that decide a run's results; they are stored with the run and a
+# resumed run keeps them. The rest (concurrency, workers) may change between attempts.
+RUN_OPTIONS = ("num_profiles", "engine", "seed", "top_k", "candidate_k", "token_budget")
+
+# Records buffered between the pipeline and the output writer
+QUEUE_RECORDS = 10000
+
+def _progress_logger(stage, step=0.1):
+    """progress_callback logging a line each time another `step` of the stage is done"""
+    reported = [0]
+
+    def report(done, total):
+        if total and done / total < reported[0]:
+            # A new chunk of the stage started over
+            reported[0] = 0
+        if total and (done == total or done / total >= reported[0] + step):
+            reported[0] = done / total
+            logger.info("%s: %d/%d", stage, done, total)
+    return report
+
+def checkpoint_run(store, fresh=False):
+    """(run_id, run) of the unfinished run to resume, or (None, None)"""
+    run_id = None if fresh else store.latest_run_id()
+    run = store.get_run(run_id) if run_id is not None else None
+    if run is None or run["status"] == "analyzed":
+        return None, None
+    return run_id, run
+
+def run_batch(store, options, emit=None, fresh=False, chunk_size=DEFAULT_CHUNK_SIZE, checkpoint_rows=DEFAULT_BATCH_ROWS):
+    """
+    Run the pipeline into `store`, or finish its unfinished run.
+
+    Each stage is checkpointed as it goes: profiles once generated,
+    conversations and pair scores every `checkpoint_rows` rows. On resume,
+    stored conversations aren't simulated again and stored scores are
+    re-matched (run_match_scores) instead of re-scored, so the results are
+    the same as an uninterrupted run. Conversations are scored `chunk_size`
+    at a time from the store, keeping memory at one chunk plus users x K.
+    Pairs the token budget couldn't cover keep the run unfinished (status
+    "simulating", with matches from what was simulated), so the next run
+    simulates them with a fresh budget.
+
+    `emit(record)` sees the whole run as bulk_io records, in order: run
+    info, profiles, conversations, pair scores, then matches (checkpointed
+    rows first when resuming). It's called from the simulation workers.
+    Returns a summary of the run.
+    """
+    emit = emit or (lambda record: None)
+    run_id, run = checkpoint_run(store, fresh)
+    if run is None:
+        run_options = {key: options[key] for key in RUN_OPTIONS if options.get(key) is not None}
+        run_id = store.create_run(run_options)
+    else:
+        logger.info("Resuming run %d (%s) with its stored options", run_id, run["status"])
+        run_options = run["options"]
+    options = {**{key: value for key, value in options.items() if key not in RUN_OPTIONS}, **run_options,
+               "include_all_pairs": False}
+    summary = {"run_id": run_id, "resumed": run is not None}
+    emit(run_record({"run_id": run_id, "options": run_options}))
+
+    # Profiles: drawn from the seed, then saved in one go
+    profiles = store.load_profiles(run_id)
+    if not profiles:
+        random.seed(options.get("seed"))
+        profiles = run_generate_profiles(options, _progress_logger("Generated profiles"))
+        store.save_profiles(run_id, profiles)
+    for profile in profiles:
+        emit(profile_record(profile))
+    summary["profiles"] = len(profiles)
+
+    # Conversations: only pairs without a stored conversation are simulated
+    stored_pairs = set()
+    for pair, messages in store.iter_conversations(run_id):
+        stored_pairs.add(pair)
+        emit(conversation_record(pair, messages))
+    budget_skipped = 0
+    if run is None or run["status"] in ("profiles", "simulating"):
+        store.set_status(run_id, "simulating")
+        stats = {}
+        with store.conversation_writer(run_id, batch_size=checkpoint_rows) as writer:
+            def record(pair, messages):
+                writer.add(pair, messages)
+                emit(conversation_record(pair, messages))
+            # Conversations go straight to the store and the output; none are kept here
+            run_simulate_conversations(profiles, options, _progress_logger("Simulated conversations"), stats=stats,
+                                       result_callback=record, skip_pairs=stored_pairs, keep_results=False)
+        budget_skipped = stats.get("budget_skipped_pairs", 0)
+        if budget_skipped:
+            logger.warning("Token budget left %d pairs unsimulated; run again to simulate them", budget_skipped)
+        else:
+            store.set_status(run_id, "simulated")
+        summary["simulated"] = stats["simulated_pairs"] - budget_skipped - stats.get("failed_pairs", 0)
+        summary["budget_skipped"] = budget_skipped
+        summary["simulation_stats"] = stats
+
+    # Scores: stored ones are re-matched, the rest scored in chunks from the store. Stored
+    # scores are re-matched in conversation order, as they were scored, so ties rank the same
+    scored = {}
+    for pair, score in store.iter_scores(run_id, conversation_order=True):
+        scored[pair] = score
+        emit(pair_record(pair, score))
+    analysis = run_match_scores(profiles, scored.items(), options) if scored else None
+    pending = []
+
+    def save_pair(pair):
+        emit(pair_record((pair['userA_id'], pair['userB_id']), pair['sentiment_score']))
+        pending.append(pair)
+        if len(pending) >= checkpoint_rows:
+            store.save_scores(run_id, pending)
+            pending.clear()
+
+    unscored = ((pair, messages) for pair, messages in store.iter_conversations(run_id) if pair not in scored)
+    analysis = analyze_in_chunks(profiles, unscored, options, chunk_size, _progress_logger("Scored messages"),
+                                 pair_callback=save_pair, analysis=analysis)
+    if pending:
+        store.save_scores(run_id, pending)
+    store.save_results(run_id, analysis['results'])
+    if not budget_skipped:
+        store.set_status(run_id, "analyzed")
+    for record in match_records(analysis['results']):
+        emit(record)
+
+    summary["conversations"] = store.get_run(run_id)["num_conversations"]
+    summary["scored"] = summary["conversations"] - len(scored)
+    summary["matches"] = sum(len(data['matches']) for data in analysis['results'].values())
+    summary["sentiment_cache"] = analysis['sentiment_cache']
+    return summary
+
+_DONE = object()
+
+def _queued_records(records):
+    while True:
+        record = records.get()
+        if record is _DONE:
+            return
+        yield record
+
+def stream_batch(output, output_format, run):
+    """
+    Call run(emit) on a pipeline thread while this thread writes what it
+    emits to `output` ("-" for NDJSON on stdout). Returns run's result.
+    """
+    records = queue.Queue(maxsize=QUEUE_RECORDS)
+    outcome = {}
+
+    def work():
+        try:
+            outcome["result"] = run(records.put)
+        except BaseException as e:
+            outcome["error"] = e
+        finally:
+            records.put(_DONE)
+
+    # A daemon, so an interrupted write exits at once; the checkpoint has what was done
+    thread = threading.Thread(target=work, name="batch-pipeline", daemon=True)
+    thread.start()
+    if output == "-":
+        for record in _queued_records(records):
+            sys.stdout.write(json.dumps(record, separators=(",", ":")) + "\n")
+        sys.stdout.flush()
+    else:
+        write_export(output, _queued_records(records), output_format)
+    thread.join()
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the matching pipeline as a batch job, resuming from checkpoints")
+    parser.add_argument("--profiles", type=int, default=10, help="size of the profile pool")
+    parser.add_argument("--engine", default=None, choices=tuple(ENGINES),
+                        help="how conversations are written (default: CONVERSATION_ENGINE or single)")
+    parser.add_argument("--concurrency", type=int, default=None, help="LLM requests in flight (default: the client's limit)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_SCORING_WORKERS,
+                        help="sentiment scoring processes (1 scores in-process)")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the profile draw and the local engine")
+    parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K, help="matches kept per user")
+    parser.add_argument("--candidate-k", type=int, default=None, help="simulate only each user's top K candidates")
+    parser.add_argument("--token-budget", type=int, default=None, help="cap on the tokens spent simulating")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="conversations scored per chunk")
+    parser.add_argument("--checkpoint-dir", default=DEFAULT_CHECKPOINT_DIR, help="where runs are checkpointed")
+    parser.add_argument("--checkpoint-rows", type=int, default=DEFAULT_BATCH_ROWS,
+                        help="conversations or scores written per checkpoint")
+    parser.add_argument("--fresh", action="store_true", help="start a new run even if the last one is unfinished")
+    parser.add_argument("--format", default="ndjson", choices=EXPORT_FORMATS,
+                        help="gzip NDJSON file, or a directory of Parquet files")
+    parser.add_argument("--output", default="-", help="output path, or - for plain NDJSON on stdout")
+    parser.add_argument("--nlp-mode", default=None, help="spaCy pipeline mode (full or lean)")
+    parser.add_argument("--quiet", action="store_true", help="don't log progress")
+    parser.add_argument("--verbose", action="store_true", help="show the pipeline's own log output")
+    args = parser.parse_args()
+    if args.output == "-" and args.format != "ndjson":
+        parser.error("--format parquet needs an --output directory")
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format="%(asctime)s %(message)s")
+    logger.setLevel(logging.WARNING if args.quiet else logging.INFO)
+    options = {
+        "num_profiles": args.profiles,
+        "engine": args.engine,
+        "seed": args.seed,
+        "top_k": args.top_k,
+        "candidate_k": args.candidate_k,
+        "token_budget": args.token_budget,
+        "concurrency": args.concurrency,
+        "sentiment_workers": args.workers,
+    }
+
+    initialize_nlp(args.nlp_mode)
+    if args.workers > 1:
+        # Fork the scoring workers while the loaded model is shared and no other thread exists
+        start_scoring_pool(args.workers)
+    store = RunStore(os.path.join(args.checkpoint_dir, "runs.db"))
+    start = time.perf_counter()
+    try:
+        summary = stream_batch(args.output, args.format, lambda emit: run_batch(
+            store, options, emit, fresh=args.fresh, chunk_size=args.chunk_size, checkpoint_rows=args.checkpoint_rows))
+    finally:
+        shutdown_scoring_pool()
+        store.close()
+    summary["seconds"] = round(time.perf_counter() - start, 3)
+    print(json.dumps(summary), file=sys.stderr if args.output == "-" else sys.stdout)
+
+if __name__ == "__main__":
+    main()
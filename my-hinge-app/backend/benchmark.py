@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# benchmark.py - Reproducible benchmark of the matching pipeline against the local LLM stub
+#
+# Runs profile generation, conversation simulation, sentiment scoring and
+# match assembly at each pool size and reports throughput, p50/p95 latency
+# and peak memory per stage as JSON. Every LLM call goes to an
+# in-process StubLLMServer, so runs cost nothing and are deterministic for a
+# given seed.
+
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import random
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import zlib
+from llm_client import LLMClient
+from llm_stub_server import StubLLMServer, default_responder
+from profiles import generate_user_profiles
+from conversation_simulator import simulate_conversations, ENGINES, DEFAULT_ENGINE
+from profile_store import ProfileStore
+from pipeline import DEFAULT_TOP_K, _score_pairs, _select_matches
+from topk import TopKSelector
+import sentiment_analyzer
+from sentiment_analyzer import initialize_nlp, SentimentCache, DEFAULT_SCORING_WORKERS
+
+logger = logging.getLogger("benchmark")
+
+STAGES = ("generate_profiles", "simulate_conversations", "sentiment_scoring", "match_assembly")
+
+# How peak memory is measured:
+#   "rss"    - resident set size polled from /proc every few milliseconds; cheap,
+#              and covers native allocations (spaCy, sockets) too. Linux only.
+#   "traced" - tracemalloc's peak of Python allocations; exact but slows every
+#              stage several times over, so throughput isn't comparable.
+#   None     - don't measure
+MEMORY_MODES = ("rss", "traced")
+DEFAULT_MEMORY_MODE = "rss" if os.path.exists("/proc/self/statm") else "traced"
+
+class TimedClient(LLMClient):
+    """LLMClient that records each chat call's wall time, retries included"""
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.latencies = []
+        self._latency_lock = threading.Lock()
+
+    def chat(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().chat(*args, **kwargs)
+        finally:
+            with self._latency_lock:
+                self.latencies.append(time.perf_counter() - start)
+
+def percentile(samples, q):
+    """Nearest-rank percentile of `samples` (q in 0-100), or None if empty"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[max(1, math.ceil(q / 100 * len(ordered))) - 1]
+
+# Conversation lines the benchmark stub picks from, so scoring sees realistic
+# numbers of distinct texts rather than one template repeated for every pair
+OPENERS = ["Hey {0}!", "Hi {0},", "Hello {0}!", "Morning {0}!", "Oh hey {0},"]
+REMARKS = [
+    "your photos from the coast look amazing", "I can't believe you like pineapple on pizza",
+    "that hiking trail you mentioned sounds exhausting", "your taste in music is honestly great",
+    "I'm a bit nervous about first dates", "the cafe on my street is terrible lately",
+    "I just finished a really sad book", "my week has been wonderful so far",
+    "work has been stressful and boring", "I love trying new restaurants", "cooking is my favourite way to relax",
+    "I hate crowded bars", "board game nights are the best", "I'm not sure we have much in common",
+]
+QUESTIONS = ["What do you think?", "Any plans this weekend?", "Have you tried it?", "Sound good?", "Want to meet up?"]
+
+def varied_responder(messages):
+    """Stub responder whose conversations differ per pair, deterministically"""
+    prompt = messages[-1]["content"] if messages else ""
+    names = re.findall(r"User [12]: ([^,\n]+),", prompt)
+    if len(names) != 2:
+        return default_responder(messages)
+    rng = random.Random(zlib.crc32(prompt.encode("utf-8")))
+    lines = []
+    for turn in range(8):
+        speaker, other = (names[0], names[1]) if turn % 2 == 0 else (names[1], names[0])
+        line = f"{rng.choice(OPENERS).format(other)} {rng.choice(REMARKS)}. {rng.choice(QUESTIONS)}"
+        lines.append(f"{speaker}: {line}")
+    return "\n".join(lines)
+
+def _rss_bytes():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+class StageTimer:
+    """
+    Times one stage: wall time, per-item latency samples and the peak memory
+    in use above the level at stage start (see MEMORY_MODES).
+    """
+    def __init__(self, memory=DEFAULT_MEMORY_MODE, poll_interval=0.005):
+        self.memory = memory
+        self.poll_interval = poll_interval
+        self.samples = []
+        self.items = 0
+        self.last = None
+        self.peak_bytes = None
+
+    def _poll_rss(self):
+        while not self.stopped.wait(self.poll_interval):
+            self.peak_rss = max(self.peak_rss, _rss_bytes())
+
+    def __enter__(self):
+        if self.memory == "traced":
+            tracemalloc.reset_peak()
+            self.baseline = tracemalloc.get_traced_memory()[0]
+        elif self.memory == "rss":
+            self.baseline = self.peak_rss = _rss_bytes()
+            self.stopped = threading.Event()
+            self.poller = threading.Thread(target=self._poll_rss, daemon=True)
+            self.poller.start()
+        self.start = self.last = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.start
+        if self.memory == "traced":
+            self.peak_bytes = tracemalloc.get_traced_memory()[1] - self.baseline
+        elif self.memory == "rss":
+            self.stopped.set()
+            self.poller.join()
+            self.peak_bytes = max(self.peak_rss, _rss_bytes()) - self.baseline
+
+    def tick(self, *args):
+        """Record the time since the previous tick as one latency sample"""
+        now = time.perf_counter()
+        self.samples.append(now - self.last)
+        self.last = now
+
+    def report(self):
+        return {
+            "items": self.items,
+            "seconds": round(self.seconds, 4),
+            "throughput": round(self.items / self.seconds, 2) if self.seconds > 0 else None,
+            "latency_p50_ms": _ms(percentile(self.samples, 50)),
+            "latency_p95_ms": _ms(percentile(self.samples, 95)),
+            "peak_memory_mb": round(self.peak_bytes / 2**20, 3) if self.peak_bytes is not None else None,
+        }
+
+def _ms(seconds):
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+def run_size(num_profiles, client, options, seed=0, memory=DEFAULT_MEMORY_MODE):
+    """
+    Run every stage for one pool size and return {stage: report}.
+
+    Latency samples are per LLM request for generation and simulation, per
+    `batch_size` texts scored for sentiment, and per pair offered for match
+    assembly.
+    """
+    # The same seed draws the same profiles, and a cold cache makes every
+    # size score from scratch, so each size is reproducible
+    random.seed(seed)
+    sentiment_analyzer.sentiment_cache = SentimentCache(max_entries=sentiment_analyzer.sentiment_cache.max_entries,
+                                                        mask_names=sentiment_analyzer.sentiment_cache.mask_names)
+    stages = {}
+
+    # The "local" engine makes no LLM requests, so its samples are per profile and per pair instead
+    local = (options.get("engine") or DEFAULT_ENGINE) == "local"
+    client.latencies = []
+    with StageTimer(memory) as timer:
+        profiles = generate_user_profiles(num_profiles=num_profiles, batch_size=options.get("batch_size", 1),
+                                          client=client, local_answers=local)
+    timer.items = len(profiles)
+    if not local:
+        timer.samples = client.latencies
+    stages["generate_profiles"] = timer.report()
+
+    client.latencies = []
+    simulation_stats = {}
+    with StageTimer(memory) as timer:
+        conversations = simulate_conversations(profiles, client=client, candidate_k=options.get("candidate_k"),
+                                               stats=simulation_stats, engine=options.get("engine"),
+                                               progress_callback=timer.tick if local else None)
+    timer.items = len(conversations)
+    if not local:
+        timer.samples = client.latencies
+    stages["simulate_conversations"] = dict(timer.report(), **simulation_stats)
+
+    store = ProfileStore(profiles)
+    with StageTimer(memory) as timer:
+        cache_stats = {}
+        scored_pairs = list(_score_pairs(store, conversations, options, cache_stats, progress_callback=timer.tick))
+    timer.items = cache_stats.get("messages", 0)
+    stages["sentiment_scoring"] = dict(timer.report(), scored=cache_stats.get("scored", 0))
+
+    with StageTimer(memory) as timer:
+        user_matches = {profile.id: {'user': profile.to_dict(), 'matches': []} for profile in store}
+        all_pairs = []
+        selector = TopKSelector(options.get("top_k", DEFAULT_TOP_K))
+        _select_matches(user_matches, store, scored_pairs, selector, all_pairs, pair_callback=timer.tick)
+        all_pairs.sort(key=lambda x: x['sentiment_score'], reverse=True)
+    timer.items = len(scored_pairs)
+    stages["match_assembly"] = timer.report()
+    return stages
+
+def run_benchmark(sizes, latency=0.0, concurrency=8, seed=0, options=None, nlp_mode="lean", memory=DEFAULT_MEMORY_MODE):
+    """Benchmark each pool size against a fresh stub server and return the JSON-ready report"""
+    options = options or {}
+    initialize_nlp(nlp_mode)
+    report = {
+        "config": {
+            "sizes": sizes, "latency": latency, "concurrency": concurrency, "seed": seed,
+            "nlp_mode": nlp_mode, "memory": memory, "options": options,
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": [],
+    }
+
+    original_cache = sentiment_analyzer.sentiment_cache
+    if memory == "traced":
+        tracemalloc.start()
+    try:
+        for size in sizes:
+            with StubLLMServer(latency=latency, seed=seed, responder=varied_responder) as stub:
+                client = TimedClient(base_url=stub.base_url, api_key="stub", concurrency=concurrency)
+                stages = run_size(size, client, options, seed=seed, memory=memory)
+            report["results"].append({"size": size, "stages": stages, "llm": dict(client.stats)})
+            logger.info("Benchmarked %d profiles: %s", size, ", ".join(
+                f"{stage} {stats['throughput']}/s" for stage, stats in stages.items()))
+    finally:
+        sentiment_analyzer.sentiment_cache = original_cache
+        if memory == "traced":
+            tracemalloc.stop()
+    return report
+
+def compare(baseline, current, tolerance=0.2):
+    """
+    Compare two benchmark reports and return the regressions: stages whose
+    throughput dropped by more than `tolerance` (a fraction) at the same size.
+    """
+    baseline_stages = {result["size"]: result["stages"] for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        for stage, stats in result["stages"].items():
+            before = baseline_stages.get(result["size"], {}).get(stage)
+            if not before or not before.get("throughput") or stats.get("throughput") is None:
+                continue
+            change = stats["throughput"] / before["throughput"] - 1
+            if change < -tolerance:
+                regressions.append({"size": result["size"], "stage": stage, "baseline": before["throughput"],
+                                    "current": stats["throughput"], "change": round(change, 4)})
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the matching pipeline against a local LLM stub")
+    parser.add_argument("--sizes", default="10,100", help="comma-separated pool sizes, e.g. 10,100,1000")
+    parser.add_argument("--latency", type=float, default=0.0, help="stub seconds per LLM request")
+    parser.add_argument("--concurrency", type=int, default=8, help="LLM requests in flight")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--candidate-k", type=int, default=None, help="simulate only each user's top K candidates")
+    parser.add_argument("--engine", default=None, choices=tuple(ENGINES),
+                        help="conversation engine; \"local\" runs without LLM requests")
+    parser.add_argument("--sentiment-workers", type=int, default=DEFAULT_SCORING_WORKERS)
+    parser.add_argument("--nlp-mode", default="lean", choices=sentiment_analyzer.NLP_MODES)
+    parser.add_argument("--memory", default=DEFAULT_MEMORY_MODE, choices=MEMORY_MODES + ("off",),
+                        help="how to measure peak memory per stage")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="baseline JSON report; exit 1 if any stage's throughput regressed")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed throughput drop for --compare")
+    parser.add_argument("--verbose", action="store_true", help="show the pipeline's own log output")
+    args = parser.parse_args()
+    # Pipeline modules log every stage at INFO; show only the per-size summaries unless asked
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format="%(message)s")
+    logger.setLevel(logging.INFO)
+
+    options = {"sentiment_workers": args.sentiment_workers}
+    if args.candidate_k:
+        options["candidate_k"] = args.candidate_k
+    if args.engine:
+        options["engine"] = args.engine
+    report = run_benchmark(
+        [int(size) for size in args.sizes.split(",")],
+        latency=args.latency, concurrency=args.concurrency, seed=args.seed, options=options,
+        nlp_mode=args.nlp_mode, memory=None if args.memory == "off" else args.memory
+    )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}", file=sys.stderr)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report, args.tolerance)
+        for regression in regressions:
+            print(f"Regression at {regression['size']} profiles: {regression['stage']} "
+                  f"{regression['baseline']}/s -> {regression['current']}/s ({regression['change']:+.0%})", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+# bulk_io.py - Bulk export and import of runs
+#
+# Profiles, conversations and pair scores travel as gzip NDJSON (one typed
+# record per line) or as columnar Parquet files, one per table. Both are
+# written and read as streams, so archiving, re-scoring or re-matching a run
+# of 100k+ conversations never needs all of it in memory.
+#
+#   python bulk_io.py export --run-id 3 --output run3.ndjson.gz
+#   python bulk_io.py export --run-id 3 --format parquet --output run3/
+#   python bulk_io.py import run3.ndjson.gz --rescore --top-k 5
+
+import argparse
+import gzip
+import io
+import json
+import logging
+import os
+import sys
+import zlib
+from profile_store import ProfileStore
+from pipeline import analyze_in_chunks, run_match_scores, DEFAULT_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+# Record "type" -> the table it belongs to in columnar form
+RECORD_TABLES = {"profile": "profiles", "conversation": "conversations", "pair": "pairs", "match": "matches"}
+RECORD_TYPES = ("run",) + tuple(RECORD_TABLES)
+TABLES = tuple(RECORD_TABLES.values())
+EXPORT_FORMATS = ("ndjson", "parquet")
+
+# Rows per Parquet row group / Arrow record batch, and per run store write on import
+DEFAULT_BATCH_ROWS = 5000
+
+def run_record(run=None):
+    return {"type": "run", "format_version": FORMAT_VERSION, **(run or {})}
+
+def profile_record(profile):
+    return {"type": "profile", "data": profile.to_dict() if hasattr(profile, "to_dict") else profile}
+
+def conversation_record(pair, messages):
+    return {"type": "conversation", "userA_id": pair[0], "userB_id": pair[1], "messages": messages}
+
+def pair_record(pair, score):
+    return {"type": "pair", "userA_id": pair[0], "userB_id": pair[1], "sentiment_score": score}
+
+def match_records(results):
+    """One record per selected match, best first for each user, from an analysis's results"""
+    for user_id, data in results.items():
+        for rank, match in enumerate(data['matches'], 1):
+            yield {"type": "match", "user_id": int(user_id), "rank": rank, "partner_id": match['partner_id'],
+                   "sentiment_score": match['sentiment_score']}
+
+def run_records(profiles=(), conversations=(), scores=(), run=None, results=None):
+    """
+    A run as typed records, in import order: run info, profiles,
+    conversations, pair scores, then each user's matches. `conversations`
+    and `scores` are ((userA_id, userB_id), value) items, e.g. dict.items()
+    or a run store iterator, and are only read as the records are consumed.
+    """
+    yield run_record(run)
+    for profile in profiles:
+        yield profile_record(profile)
+    for pair, messages in conversations:
+        yield conversation_record(pair, messages)
+    for pair, score in scores:
+        yield pair_record(pair, score)
+    if results:
+        yield from match_records(results)
+
+def store_records(store, run_id):
+    """Records of a stored run, reading conversations and scores in batches"""
+    run = store.get_run(run_id)
+    if run is None:
+        raise ValueError(f"Run {run_id} not found")
+    return run_records(store.load_profiles(run_id), store.iter_conversations(run_id), store.iter_scores(run_id),
+                       run={key: run[key] for key in ("run_id", "status", "options")},
+                       results=store.load_results(run_id))
+
+def select_tables(records, tables):
+    """Only the records of `tables` (plus the run record)"""
+    for table in tables:
+        if table not in TABLES:
+            raise ValueError(f"Unknown table '{table}'. Expected some of: {', '.join(TABLES)}")
+    return (record for record in records if record["type"] == "run" or RECORD_TABLES[record["type"]] in tables)
+
+# NDJSON
+
+def ndjson_gzip_chunks(records, compresslevel=6, flush_bytes=1 << 16):
+    """gzip-compressed NDJSON of `records` as a stream of byte chunks, e.g. for an HTTP response"""
+    # wbits=31 writes a gzip header and trailer around the deflate stream
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, 31)
+    pending = []
+    size = 0
+    for record in records:
+        line = json.dumps(record, separators=(",", ":")).encode("utf-8") + b"\n"
+        pending.append(line)
+        size += len(line)
+        if size >= flush_bytes:
+            chunk = compressor.compress(b"".join(pending))
+            pending, size = [], 0
+            if chunk:
+                yield chunk
+    yield compressor.compress(b"".join(pending)) + compressor.flush()
+
+def write_ndjson(path, records):
+    with open(path, "wb") as f:
+        for chunk in ndjson_gzip_chunks(records):
+            f.write(chunk)
+
+def read_ndjson(source):
+    """
+    Records from NDJSON at a path or in a binary stream (such as a request
+    body), gzip-compressed or not, parsed one line at a time
+    """
+    stream = open(source, "rb") if isinstance(source, (str, os.PathLike)) else source
+    try:
+        buffered = stream if hasattr(stream, "peek") else io.BufferedReader(stream)
+        if buffered.peek(2)[:2] == b"\x1f\x8b":
+            buffered = gzip.GzipFile(fileobj=buffered)
+        for number, line in enumerate(buffered, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"Line {number} is not valid JSON: {e}") from e
+            if not isinstance(record, dict) or record.get("type") not in RECORD_TYPES:
+                raise ValueError(f"Line {number} is not a {'/'.join(RECORD_TYPES)} record")
+            yield record
+    finally:
+        if stream is not source:
+            stream.close()
+
+# Columnar (Parquet files, or an Arrow IPC stream over HTTP)
+
+def _require_pyarrow():
+    # Optional: only the columnar format needs it
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError("The columnar format needs pyarrow (pip install pyarrow)") from e
+    return pyarrow
+
+def _schemas(pa):
+    # Profiles keep their JSON (they are few, and may carry extra fields)
+    return {
+        "profiles": pa.schema([("profile_id", pa.int64()), ("data", pa.string())]),
+        "conversations": pa.schema([("userA_id", pa.int64()), ("userB_id", pa.int64()),
+                                    ("messages", pa.list_(pa.string()))]),
+        "pairs": pa.schema([("userA_id", pa.int64()), ("userB_id", pa.int64()), ("sentiment_score", pa.float64())]),
+        "matches": pa.schema([("user_id", pa.int64()), ("rank", pa.int64()), ("partner_id", pa.int64()),
+                              ("sentiment_score", pa.float64())]),
+    }
+
+def _columns(table, schema, records):
+    if table == "profiles":
+        return {"profile_id": [record["data"]["id"] for record in records],
+                "data": [json.dumps(record["data"]) for record in records]}
+    return {name: [record[name] for record in records] for name in schema.names}
+
+def _records(table, rows):
+    if table == "profiles":
+        return ({"type": "profile", "data": json.loads(row["data"])} for row in rows)
+    kind = next(kind for kind, name in RECORD_TABLES.items() if name == table)
+    return ({"type": kind, **row} for row in rows)
+
+def write_parquet(directory, records, batch_rows=DEFAULT_BATCH_ROWS):
+    """
+    Write records as <table>.parquet files (plus run.json) in `directory`,
+    one row group per `batch_rows` rows, so only one batch per table is
+    held in memory
+    """
+    pa = _require_pyarrow()
+    import pyarrow.parquet as pq
+    schemas = _schemas(pa)
+    os.makedirs(directory, exist_ok=True)
+    writers = {}
+    buffers = {table: [] for table in TABLES}
+
+    def flush(table):
+        if not buffers[table]:
+            return
+        if table not in writers:
+            writers[table] = pq.ParquetWriter(os.path.join(directory, f"{table}.parquet"), schemas[table])
+        columns = _columns(table, schemas[table], buffers[table])
+        writers[table].write_table(pa.Table.from_pydict(columns, schema=schemas[table]))
+        buffers[table] = []
+
+    try:
+        for record in records:
+            if record["type"] == "run":
+                with open(os.path.join(directory, "run.json"), "w") as f:
+                    json.dump(record, f)
+                continue
+            table = RECORD_TABLES[record["type"]]
+            buffers[table].append(record)
+            if len(buffers[table]) >= batch_rows:
+                flush(table)
+        for table in TABLES:
+            flush(table)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+def read_parquet(directory, batch_rows=DEFAULT_BATCH_ROWS):
+    """Records from a write_parquet directory, read one row group batch at a time"""
+    _require_pyarrow()
+    import pyarrow.parquet as pq
+    run_path = os.path.join(directory, "run.json")
+    if os.path.exists(run_path):
+        with open(run_path) as f:
+            yield json.load(f)
+    for table in TABLES:
+        path = os.path.join(directory, f"{table}.parquet")
+        if os.path.exists(path):
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_rows):
+                yield from _records(table, batch.to_pylist())
+
+def arrow_stream_chunks(table, records, batch_rows=DEFAULT_BATCH_ROWS):
+    """One table of `records` as an Arrow IPC stream, yielded in byte chunks of `batch_rows` rows"""
+    pa = _require_pyarrow()
+    schema = _schemas(pa)[table]
+    sink = io.BytesIO()
+
+    def drain():
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    rows = []
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for record in records:
+            if RECORD_TABLES.get(record["type"]) != table:
+                continue
+            rows.append(record)
+            if len(rows) >= batch_rows:
+                writer.write_table(pa.Table.from_pydict(_columns(table, schema, rows), schema=schema))
+                rows = []
+                yield drain()
+        if rows:
+            writer.write_table(pa.Table.from_pydict(_columns(table, schema, rows), schema=schema))
+    yield drain()
+
+def write_export(path, records, format="ndjson"):
+    if format == "ndjson":
+        write_ndjson(path, records)
+    elif format == "parquet":
+        write_parquet(path, records)
+    else:
+        raise ValueError(f"Unknown export format '{format}'. Expected one of: {', '.join(EXPORT_FORMATS)}")
+
+def read_records(path):
+    """Records from an export: a Parquet directory or an NDJSON file"""
+    return read_parquet(path) if os.path.isdir(path) else read_ndjson(path)
+
+# Import
+
+def _messages(record):
+    """A conversation record's messages, checked to be a list of strings"""
+    messages = record["messages"]
+    if not isinstance(messages, list) or not all(isinstance(message, str) for message in messages):
+        raise ValueError(f"Conversation {record['userA_id']}-{record['userB_id']}: messages must be a list of strings")
+    return messages
+
+def collect_records(records):
+    """
+    (profiles, conversations, scores) from records, all in memory (for the
+    server's in-memory state). Match records are left out; matches are
+    picked again from the scores.
+    """
+    profiles = []
+    conversations = {}
+    scores = []
+    for record in records:
+        if record["type"] == "profile":
+            profiles.append(record["data"])
+        elif record["type"] == "conversation":
+            conversations[(record["userA_id"], record["userB_id"])] = _messages(record)
+        elif record["type"] == "pair":
+            scores.append(((record["userA_id"], record["userB_id"]), record["sentiment_score"]))
+    return profiles, conversations, scores
+
+def import_run(store, records, options=None, rescore=False, chunk_size=DEFAULT_CHUNK_SIZE, batch_rows=DEFAULT_BATCH_ROWS):
+    """
+    Load records into a new run of `store` as they are read; profiles must
+    come before conversations and pairs, as in an export.
+
+    With `rescore`, the conversations are scored again chunk by chunk
+    (analyze_in_chunks) and the imported pair scores are ignored. Otherwise
+    imported pair scores, if any, are re-matched (run_match_scores); match
+    records are skipped either way. `options` (e.g. "top_k") apply, and
+    pair scores and results are written as they are produced. Returns the
+    run id and record counts.
+    """
+    options = dict(options or {}, include_all_pairs=False)
+    run_id = store.create_run({key: value for key, value in options.items() if key != "include_all_pairs"})
+    summary = {"run_id": run_id, "profiles": 0, "conversations": 0, "pairs": 0}
+    profiles = ProfileStore()
+    pending_profiles = []
+    scores = []
+    pending_pairs = []
+
+    def flush_profiles():
+        if pending_profiles:
+            store.save_profiles(run_id, pending_profiles)
+            pending_profiles.clear()
+
+    def conversations(writer):
+        # Profiles and pairs are handled on the way; only conversations are yielded
+        for record in records:
+            if record["type"] == "profile":
+                profiles.add([record["data"]])
+                pending_profiles.append(record["data"])
+                summary["profiles"] += 1
+                if len(pending_profiles) >= batch_rows:
+                    flush_profiles()
+            elif record["type"] == "conversation":
+                flush_profiles()
+                key = (record["userA_id"], record["userB_id"])
+                messages = _messages(record)
+                writer.add(key, messages)
+                summary["conversations"] += 1
+                yield key, messages
+            elif record["type"] == "pair":
+                summary["pairs"] += 1
+                if not rescore:
+                    scores.append(((record["userA_id"], record["userB_id"]), record["sentiment_score"]))
+        flush_profiles()
+
+    def save_pair(pair):
+        pending_pairs.append(pair)
+        if len(pending_pairs) >= batch_rows:
+            store.save_scores(run_id, pending_pairs)
+            pending_pairs.clear()
+
+    with store.conversation_writer(run_id, batch_size=batch_rows) as writer:
+        if rescore:
+            # `profiles` fills up as the stream is read, before the first conversation is scored
+            analysis = analyze_in_chunks(profiles, conversations(writer), options, chunk_size, pair_callback=save_pair)
+        else:
+            for _ in conversations(writer):
+                pass
+            analysis = run_match_scores(profiles, scores, options, pair_callback=save_pair) if scores else None
+    if pending_pairs:
+        store.save_scores(run_id, pending_pairs)
+
+    if analysis is not None:
+        store.save_results(run_id, analysis['results'])
+        store.set_status(run_id, "analyzed")
+        summary["analyzed"] = True
+    else:
+        store.set_status(run_id, "simulated" if summary["conversations"] else "profiles")
+        summary["analyzed"] = False
+    return summary
+
+def main():
+    from run_store import RunStore, run_store_from_env
+
+    parser = argparse.ArgumentParser(description="Export or import runs in bulk")
+    parser.add_argument("--store", help="run store database (default: RUN_STORE_PATH or data/runs.db)")
+    parser.add_argument("--verbose", action="store_true", help="show the pipeline's own log output")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="write a stored run to a file (ndjson) or directory (parquet)")
+    export.add_argument("--run-id", type=int, help="run to export (default: the latest)")
+    export.add_argument("--format", default="ndjson", choices=EXPORT_FORMATS)
+    export.add_argument("--tables", default=",".join(TABLES), help="comma-separated tables to include")
+    export.add_argument("--output", required=True)
+
+    load = commands.add_parser("import", help="load an export into a new run")
+    load.add_argument("input", help="NDJSON file (gzip or plain) or Parquet directory")
+    load.add_argument("--rescore", action="store_true", help="score the conversations again instead of using imported scores")
+    load.add_argument("--top-k", type=int, default=None, help="matches kept per user")
+    load.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="conversations scored per chunk")
+    load.add_argument("--nlp-mode", default=None, help="spaCy pipeline mode for --rescore (full or lean)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format="%(message)s")
+    store = RunStore(args.store) if args.store else run_store_from_env()
+    if store is None:
+        parser.error("the run store is disabled (RUN_STORE=off); pass --store")
+
+    if args.command == "export":
+        run_id = args.run_id if args.run_id is not None else store.latest_run_id()
+        records = select_tables(store_records(store, run_id), args.tables.split(","))
+        write_export(args.output, records, args.format)
+        print(f"Exported run {run_id} to {args.output}", file=sys.stderr)
+    else:
+        options = {"top_k": args.top_k} if args.top_k else {}
+        if args.rescore:
+            from sentiment_analyzer import initialize_nlp
+            initialize_nlp(args.nlp_mode)
+        summary = import_run(store, read_records(args.input), options, rescore=args.rescore, chunk_size=args.chunk_size)
+        print(json.dumps(summary))
+
+if __name__ == "__main__":
+    main()
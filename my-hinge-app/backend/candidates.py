@@ -0,0 +1,104 @@
+# candidates.py
+# Cheap candidate generation so only promising pairs are sent to the LLM
+import heapq
+from profiles import PERSONALITY_PROMPTS
+
+# Short labels for PERSONALITY_PROMPTS, in the same order
+PERSONALITY_TYPES = [
+    "adventurer", "analyst", "free_spirit", "professional", "empath",
+    "comedian", "seeker", "homebody", "activist", "aesthete"
+]
+
+# Pairings that tend to click (or clash); anything else is neutral
+COMPATIBLE_TYPES = {
+    ("adventurer", "free_spirit"), ("adventurer", "comedian"), ("analyst", "professional"),
+    ("analyst", "seeker"), ("free_spirit", "seeker"), ("free_spirit", "comedian"),
+    ("professional", "aesthete"), ("empath", "homebody"), ("empath", "seeker"),
+    ("empath", "activist"), ("comedian", "homebody"), ("activist", "seeker"),
+}
+CLASHING_TYPES = {
+    ("adventurer", "homebody"), ("adventurer", "analyst"), ("free_spirit", "professional"),
+    ("activist", "aesthete"), ("homebody", "free_spirit"),
+}
+
+# Weights of the candidate score components
+INTEREST_WEIGHT = 0.5
+AGE_WEIGHT = 0.2
+PERSONALITY_WEIGHT = 0.3
+
+# Age gap (years) at which the age component reaches zero
+MAX_AGE_GAP = 15
+
+def personality_type(profile):
+    """Label of a profile's personality, or None for custom personalities"""
+    try:
+        return PERSONALITY_TYPES[PERSONALITY_PROMPTS.index(profile.get('personality'))]
+    except ValueError:
+        return None
+
+def personality_compatibility(type_a, type_b):
+    """0-1 compatibility of two personality labels"""
+    if type_a is None or type_b is None:
+        return 0.5
+    pair = (type_a, type_b)
+    if pair in COMPATIBLE_TYPES or pair[::-1] in COMPATIBLE_TYPES:
+        return 0.9
+    if pair in CLASHING_TYPES or pair[::-1] in CLASHING_TYPES:
+        return 0.2
+    return 0.6 if type_a == type_b else 0.5
+
+def _features(profile):
+    """The profile fields candidate scoring uses"""
+    return set(profile.get('interests') or []), profile.get('age', 0), personality_type(profile)
+
+def _features_score(features_a, features_b):
+    interests_a, age_a, type_a = features_a
+    interests_b, age_b, type_b = features_b
+    union = interests_a | interests_b
+    interest_score = len(interests_a & interests_b) / len(union) if union else 0.0
+    age_score = max(0.0, 1 - abs(age_a - age_b) / MAX_AGE_GAP)
+    personality_score = personality_compatibility(type_a, type_b)
+    return (INTEREST_WEIGHT * interest_score) + (AGE_WEIGHT * age_score) + (PERSONALITY_WEIGHT * personality_score)
+
+def candidate_score(userA, userB):
+    """
+    0-1 estimate of how well two users will get on, from profile data only:
+    shared interests (Jaccard), age gap and personality compatibility.
+    """
+    return _features_score(_features(userA), _features(userB))
+
+def candidate_pair_ids(profiles, top_k):
+    """
+    Set of unordered id pairs (as frozensets) made of each user's `top_k`
+    highest-scoring partners. A pair is kept if either user ranks the other.
+    """
+    features = [_features(p) for p in profiles]
+    candidates = set()
+    for i, userA in enumerate(profiles):
+        scored = (
+            (_features_score(features[i], features[j]), -j, userB['id'])
+            for j, userB in enumerate(profiles) if j != i
+        )
+        # Earlier profiles win ties so the selection is deterministic
+        for _, _, partner_id in heapq.nlargest(top_k, scored):
+            candidates.add(frozenset((userA['id'], partner_id)))
+    return candidates
+
+def candidate_recall(candidates, all_pairs, k=3):
+    """
+    Fraction of each user's true top-k matches from a full run that the
+    candidate set kept. `all_pairs` is a full run's scored pairs, best first.
+    """
+    top_matches = {}
+    for pair in all_pairs:
+        for user_id, partner_id in ((pair['userA_id'], pair['userB_id']), (pair['userB_id'], pair['userA_id'])):
+            matches = top_matches.setdefault(user_id, [])
+            if len(matches) < k:
+                matches.append(partner_id)
+
+    total = sum(len(matches) for matches in top_matches.values())
+    found = sum(
+        1 for user_id, matches in top_matches.items()
+        for partner_id in matches if frozenset((user_id, partner_id)) in candidates
+    )
+    return found / total if total else 1.0
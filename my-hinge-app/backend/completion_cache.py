@@ -0,0 +1,205 @@
+# completion_cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from metrics import completion_cache_lookups
+
+def completion_key(model, messages, temperature, max_tokens, seed=None):
+    """Content hash identifying a completion request"""
+    payload = json.dumps({
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "seed": seed
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class MemoryLRUCache:
+    """
+    In-memory LRU of key -> completion text, bounded by entry count and
+    total characters, with entries expiring `ttl` seconds after they were stored.
+    """
+    def __init__(self, max_entries=10000, max_chars=50_000_000, ttl=None):
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (stored_at, text)
+        self.chars = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            stored_at, text = entry
+            if self.ttl is not None and time.time() - stored_at > self.ttl:
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return text
+
+    def set(self, key, text, stored_at=None):
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (stored_at or time.time(), text)
+            self.chars += len(text)
+            while self.entries and (len(self.entries) > self.max_entries or self.chars > self.max_chars):
+                self._remove(next(iter(self.entries)))
+
+    def _remove(self, key):
+        _, text = self.entries.pop(key)
+        self.chars -= len(text)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.chars = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+class SQLiteCacheBackend:
+    """
+    Persistent key -> completion text store in a SQLite file. Like
+    MemoryLRUCache it holds at most `max_entries` (the least recently used
+    go first) and drops entries older than `ttl`; both are enforced every
+    `prune_every` writes, so the file doesn't grow without bound.
+    """
+    def __init__(self, path, ttl=None, max_entries=100000, prune_every=100):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.prune_every = prune_every
+        self.writes = 0
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS completions "
+            "(key TEXT PRIMARY KEY, text TEXT NOT NULL, stored_at REAL NOT NULL, used_at REAL NOT NULL DEFAULT 0)"
+        )
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(completions)")]
+        if "used_at" not in columns:
+            # Caches written before entries were bounded
+            self.connection.execute("ALTER TABLE completions ADD COLUMN used_at REAL NOT NULL DEFAULT 0")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS completions_used_at ON completions (used_at)")
+        self.connection.commit()
+
+    def get(self, key):
+        with self.lock:
+            row = self.connection.execute("SELECT text, stored_at FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            text, stored_at = row
+            if self.ttl is not None and time.time() - stored_at > self.ttl:
+                return None
+            self.connection.execute("UPDATE completions SET used_at = ? WHERE key = ?", (time.time(), key))
+            self.connection.commit()
+        return text, stored_at
+
+    def set(self, key, text):
+        with self.lock:
+            now = time.time()
+            self.connection.execute(
+                "INSERT OR REPLACE INTO completions (key, text, stored_at, used_at) VALUES (?, ?, ?, ?)",
+                (key, text, now, now)
+            )
+            self.writes += 1
+            if self.writes % self.prune_every == 0:
+                self._prune(now)
+            self.connection.commit()
+
+    def _prune(self, now):
+        """Delete expired entries, then the least recently used beyond max_entries"""
+        if self.ttl is not None:
+            self.connection.execute("DELETE FROM completions WHERE stored_at < ?", (now - self.ttl,))
+        self.connection.execute(
+            "DELETE FROM completions WHERE key IN "
+            "(SELECT key FROM completions ORDER BY used_at DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+    def clear(self):
+        with self.lock:
+            self.connection.execute("DELETE FROM completions")
+            self.connection.commit()
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+
+class CompletionCache:
+    """
+    Two-level completion cache: an in-memory LRU in front of an optional
+    persistent backend (anything with get/set/clear, e.g. SQLiteCacheBackend).
+    Backend hits are promoted into memory.
+    """
+    def __init__(self, memory=None, backend=None):
+        self.memory = memory if memory is not None else MemoryLRUCache()
+        self.backend = backend
+        self.stats = {"hits": 0, "memory_hits": 0, "backend_hits": 0, "misses": 0, "stores": 0}
+        self.lock = threading.Lock()
+
+    def _count(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.stats[key] += 1
+
+    def get(self, key):
+        text = self.memory.get(key)
+        if text is not None:
+            self._count("hits", "memory_hits")
+        elif self.backend is not None and (entry := self.backend.get(key)) is not None:
+            text, stored_at = entry
+            self.memory.set(key, text, stored_at=stored_at)
+            self._count("hits", "backend_hits")
+        else:
+            self._count("misses")
+        completion_cache_lookups.inc(result="miss" if text is None else "hit")
+        return text
+
+    def set(self, key, text):
+        self.memory.set(key, text)
+        if self.backend is not None:
+            self.backend.set(key, text)
+        self._count("stores")
+
+    def clear(self):
+        self.memory.clear()
+        if self.backend is not None:
+            self.backend.clear()
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["memory_entries"] = len(self.memory)
+        if self.backend is not None:
+            stats["backend_entries"] = len(self.backend)
+        return stats
+
+def cache_from_env():
+    """
+    Build the completion cache described by LLM_CACHE_* environment variables,
+    or None unless LLM_CACHE is "on". Off by default: conversations and
+    answers are sampled at temperature 0.8, and replaying cached completions
+    would make every rerun repeat the same "random" output.
+    """
+    if os.environ.get("LLM_CACHE", "off").lower() not in ("1", "on", "true", "yes"):
+        return None
+    ttl = os.environ.get("LLM_CACHE_TTL")
+    ttl = float(ttl) if ttl else None
+    memory = MemoryLRUCache(max_entries=int(os.environ.get("LLM_CACHE_MAX_ENTRIES", 10000)), ttl=ttl)
+    path = os.environ.get("LLM_CACHE_PATH")
+    backend = SQLiteCacheBackend(path, ttl=ttl, max_entries=int(os.environ.get("LLM_CACHE_PATH_MAX_ENTRIES", 100000))) \
+        if path else None
+    return CompletionCache(memory=memory, backend=backend)
@@ -6,67 +6,67 @@ import time
 import json
 from sentiment_analyzer import initialize_nlp, analyze_sentiment
 
+# Test cases with varying sentiment
+TEST_CASES = [
+    {
+        "name": "Positive Conversation",
+        "conversation": [
+            "Alex: I really enjoyed our time together yesterday!",
+            "Sam: Me too! It was so much fun. We should do it again soon.",
+            "Alex: Definitely! How about this weekend?",
+            "Sam: That sounds perfect! I'm looking forward to it."
+        ]
+    },
+    {
+        "name": "Negative Conversation",
+        "conversation": [
+            "Alex: I didn't like that movie at all.",
+            "Sam: It was terrible. What a waste of time and money.",
+            "Alex: The acting was awful and the plot made no sense.",
+            "Sam: I agree. Let's never watch anything by that director again."
+        ]
+    },
+    {
+        "name": "Mixed Conversation",
+        "conversation": [
+            "Alex: I had a rough day at work today.",
+            "Sam: I'm sorry to hear that. What happened?",
+            "Alex: My project got rejected, but at least my boss was understanding.",
+            "Sam: That's good. Tomorrow will be better!"
+        ]
+    },
+    {
+        "name": "Empty Conversation",
+        "conversation": []
+    },
+    {
+        "name": "Single Message Conversation",
+        "conversation": ["Alex: Hello there!"]
+    },
+    {
+        "name": "Long Conversation",
+        "conversation": [
+            "Alex: Hey there! How's it going?",
+            "Sam: Pretty good, thanks for asking! How about you?",
+            "Alex: I'm doing great. Just got back from a vacation.",
+            "Sam: Oh nice! Where did you go?",
+            "Alex: I went to Hawaii. It was amazing - beautiful beaches and perfect weather.",
+            "Sam: That sounds incredible! I've always wanted to go there.",
+            "Alex: You definitely should. The food was fantastic too.",
+            "Sam: What was your favorite thing you did there?",
+            "Alex: Probably the snorkeling. Saw so many colorful fish and even a sea turtle!",
+            "Sam: Wow! That must have been an unforgettable experience."
+        ]
+    }
+]
+
 def test_standalone_sentiment_analyzer():
     """Test the sentiment analyzer directly"""
     print("\n========== TESTING STANDALONE SENTIMENT ANALYZER ==========")
     
     initialize_nlp()
     
-    # Test cases with varying sentiment
-    test_cases = [
-        {
-            "name": "Positive Conversation",
-            "conversation": [
-                "Alex: I really enjoyed our time together yesterday!",
-                "Sam: Me too! It was so much fun. We should do it again soon.",
-                "Alex: Definitely! How about this weekend?",
-                "Sam: That sounds perfect! I'm looking forward to it."
-            ]
-        },
-        {
-            "name": "Negative Conversation",
-            "conversation": [
-                "Alex: I didn't like that movie at all.",
-                "Sam: It was terrible. What a waste of time and money.",
-                "Alex: The acting was awful and the plot made no sense.",
-                "Sam: I agree. Let's never watch anything by that director again."
-            ]
-        },
-        {
-            "name": "Mixed Conversation",
-            "conversation": [
-                "Alex: I had a rough day at work today.",
-                "Sam: I'm sorry to hear that. What happened?",
-                "Alex: My project got rejected, but at least my boss was understanding.",
-                "Sam: That's good. Tomorrow will be better!"
-            ]
-        },
-        {
-            "name": "Empty Conversation",
-            "conversation": []
-        },
-        {
-            "name": "Single Message Conversation",
-            "conversation": ["Alex: Hello there!"]
-        },
-        {
-            "name": "Long Conversation",
-            "conversation": [
-                "Alex: Hey there! How's it going?",
-                "Sam: Pretty good, thanks for asking! How about you?",
-                "Alex: I'm doing great. Just got back from a vacation.",
-                "Sam: Oh nice! Where did you go?",
-                "Alex: I went to Hawaii. It was amazing - beautiful beaches and perfect weather.",
-                "Sam: That sounds incredible! I've always wanted to go there.",
-                "Alex: You definitely should. The food was fantastic too.",
-                "Sam: What was your favorite thing you did there?",
-                "Alex: Probably the snorkeling. Saw so many colorful fish and even a sea turtle!",
-                "Sam: Wow! That must have been an unforgettable experience."
-            ]
-        }
-    ]
-    
-    for test_case in test_cases:
+    for test_case in TEST_CASES:
         print(f"\nTesting: {test_case['name']}")
         conversation = test_case['conversation']
         
@@ -1,22 +1,37 @@
 # conversation_simulator.py
 import random
-import openai
 import os
 import time
-from dotenv import load_dotenv
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from llm_client import get_default_client, TokenBudget, TokenBudgetExceeded
+from candidates import candidate_pair_ids
+from metrics import timed, fallbacks
+from turn_engine import simulate_conversation_turns
+from local_generator import simulate_conversation_local
 
-# Load environment variables from .env file
-load_dotenv()
+logger = logging.getLogger(__name__)
 
-# Set your OpenAI API key from environment variable
-openai.api_key = os.environ.get("OPENAI_API_KEY")
+def _placeholder_conversation(userA, userB):
+    """Simple scripted conversation used when the API can't produce one"""
+    return [
+        f"{userA['name']}: Hey {userB['name']}, how's it going?",
+        f"{userB['name']}: Hey {userA['name']}, I'm good! How are you?",
+        f"{userA['name']}: Doing pretty well. I saw you're into {userA['interests'][0] if userA['interests'] else 'cool stuff'}?",
+        f"{userB['name']}: Yeah! Been into that for a while. Do you like {userB['interests'][0] if userB['interests'] else 'anything fun'}?",
+        f"{userA['name']}: Absolutely! We should hang out sometime.",
+        f"{userB['name']}: Sounds good to me!"
+    ]
 
-def simulate_conversations(profiles):
+def _conversation_pairs(profiles, new_ids=None):
     """
-    Simulates conversations between all pairs of users.
-    Returns a dict of: (userA_id, userB_id) -> list of messages (strings)
+    All unordered pairs of users, in the order they are simulated. With
+    `new_ids`, only the pairs involving at least one of those users.
     """
-    conversation_results = {}
+    profiles = list(profiles)
+    pairs = []
+    seen = set()
     
     # Ensure all pairs of users talk to each other
     for i in range(len(profiles)):
@@ -29,32 +44,156 @@ def simulate_conversations(profiles):
             userB = profiles[j]
             
             # Only process each pair once (avoid duplicates)
-            if (userB['id'], userA['id']) in conversation_results:
+            if (userB['id'], userA['id']) in seen:
                 continue
             
-            try:
-                print(f"Simulating conversation between {userA['name']} and {userB['name']}...")
-                conversation = simulate_conversation_with_ai(userA, userB)
-                conversation_results[(userA['id'], userB['id'])] = conversation
-            except Exception as e:
-                print(f"Error with OpenAI API: {e}")
-                # Create a simple placeholder conversation instead of using the basic function
-                conversation = [
-                    f"{userA['name']}: Hey {userB['name']}, how's it going?",
-                    f"{userB['name']}: Hey {userA['name']}, I'm good! How are you?",
-                    f"{userA['name']}: Doing pretty well. I saw you're into {userA['interests'][0] if userA['interests'] else 'cool stuff'}?",
-                    f"{userB['name']}: Yeah! Been into that for a while. Do you like {userB['interests'][0] if userB['interests'] else 'anything fun'}?",
-                    f"{userA['name']}: Absolutely! We should hang out sometime.",
-                    f"{userB['name']}: Sounds good to me!"
-                ]
-                conversation_results[(userA['id'], userB['id'])] = conversation
+            # In incremental mode, pairs of existing users are already simulated
+            if new_ids is not None and userA['id'] not in new_ids and userB['id'] not in new_ids:
+                continue
+            seen.add((userA['id'], userB['id']))
+            pairs.append((userA, userB))
+    return pairs
+
+def simulate_conversations(profiles, concurrency=None, client=None, progress_callback=None, new_ids=None,
+                           candidate_k=None, stats=None, result_callback=None, skip_pairs=None, engine=None,
+                           engine_options=None, token_budget=None, keep_results=True):
+    """
+    Simulates conversations between all pairs of users.
+    Returns a dict of: (userA_id, userB_id) -> list of messages (strings)
+    
+    Pairs are simulated on a thread pool of `concurrency` workers (defaults to
+    the LLM client's concurrency limit); the client bounds in-flight requests,
+    retries rate limits and applies the RPM/TPM budgets.
+    
+    `progress_callback(done, total)` is called as each pair finishes, after
+    `result_callback((userA_id, userB_id), messages)`.
+    
+    Pass the ids of newly added profiles as `new_ids` to simulate only the
+    new x existing and new x new pairs.
+    
+    With `candidate_k`, pairs are first ranked from profile data (see
+    candidates.py) and only each user's top `candidate_k` candidates are
+    simulated. Pass a dict as `stats` to get the pair and pruning counts.
+    
+    `skip_pairs` holds (userA_id, userB_id) keys that already have a
+    conversation, e.g. when resuming an interrupted run; they are left out
+    of the result.
     
+    `engine` picks how each conversation is written (see ENGINES; default
+    "single"), with `engine_options` passed through as keyword arguments.
+    `token_budget` caps the tokens the whole call may spend: once it can't
+    cover another conversation, the remaining pairs are left out of the
+    result (a later resume can fill them in). Pairs whose engine gave up
+    before two messages (see simulate_conversation_turns) are left out too,
+    and counted as "failed_pairs" in `stats`.
+    
+    With keep_results=False, conversations only go to `result_callback` and
+    an empty dict is returned, so memory doesn't grow with the pair count.
+    """
+    engine = engine or DEFAULT_ENGINE
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown conversation engine '{engine}'. Expected one of: {', '.join(ENGINES)}")
+    simulate_one = ENGINES[engine]
+    engine_options = engine_options or {}
+    budget = TokenBudget(token_budget) if token_budget else None
+    client = client or get_default_client()
+    concurrency = concurrency or client.concurrency
+    pairs = _conversation_pairs(profiles, new_ids=new_ids)
+    total_pairs = len(pairs)
+    if candidate_k:
+        candidates = candidate_pair_ids(profiles, candidate_k)
+        pairs = [(userA, userB) for userA, userB in pairs if frozenset((userA['id'], userB['id'])) in candidates]
+        logger.info("Candidate filter kept %d of %d pairs (top %d per user)", len(pairs), total_pairs, candidate_k)
+    candidate_pairs = len(pairs)
+    if skip_pairs:
+        pairs = [(userA, userB) for userA, userB in pairs
+                 if (userA['id'], userB['id']) not in skip_pairs and (userB['id'], userA['id']) not in skip_pairs]
+    if stats is not None:
+        stats.update({
+            "total_pairs": total_pairs,
+            "simulated_pairs": len(pairs),
+            "pruned_pairs": total_pairs - candidate_pairs
+        })
+        if skip_pairs:
+            stats["skipped_pairs"] = candidate_pairs - len(pairs)
+    
+    stop_reasons = {}
+    failed = [0]
+    stats_lock = threading.Lock()
+    
+    def simulate_pair(pair):
+        userA, userB = pair
+        try:
+            logger.debug("Simulating conversation between %s and %s...", userA['name'], userB['name'])
+            details = {}
+            conversation = simulate_one(userA, userB, client=client, budget=budget, details=details, **engine_options)
+            with stats_lock:
+                if "stop_reason" in details:
+                    stop_reasons[details["stop_reason"]] = stop_reasons.get(details["stop_reason"], 0) + 1
+                if conversation is None:
+                    # Ended before two messages: the pair didn't talk, so it isn't stored or scored
+                    failed[0] += 1
+            return conversation
+        except TokenBudgetExceeded:
+            # Out of budget: leave the pair unsimulated rather than fake it
+            return None
+        except Exception as e:
+            logger.warning("Error with OpenAI API: %s", e)
+            fallbacks.inc(site="conversation")
+            # Create a simple placeholder conversation instead of using the basic function
+            return _placeholder_conversation(userA, userB)
+    
+    completed = [0]
+    completed_lock = threading.Lock()
+    
+    def simulate_and_report(pair):
+        conversation = simulate_pair(pair)
+        if result_callback and conversation is not None:
+            userA, userB = pair
+            result_callback((userA['id'], userB['id']), conversation)
+        if progress_callback:
+            with completed_lock:
+                completed[0] += 1
+                progress_callback(completed[0], len(pairs))
+        return conversation if keep_results else conversation is not None
+    
+    conversation_results = {}
+    simulated = 0
+    
+    def collect(outcomes):
+        nonlocal simulated
+        for (userA, userB), outcome in zip(pairs, outcomes):
+            if keep_results and outcome is not None:
+                conversation_results[(userA['id'], userB['id'])] = outcome
+                simulated += 1
+            elif outcome is True:
+                simulated += 1
+    
+    if engine in OFFLINE_ENGINES:
+        # Nothing to wait on, so a thread pool would only add overhead
+        collect(map(simulate_and_report, pairs))
+    else:
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            collect(executor.map(simulate_and_report, pairs))
+    
+    if stats is not None:
+        if failed[0]:
+            stats["failed_pairs"] = failed[0]
+        if budget is not None:
+            stats.update(budget.get_stats())
+            stats["budget_skipped_pairs"] = len(pairs) - simulated - failed[0]
+        if stop_reasons:
+            stats["stop_reasons"] = stop_reasons
+            stats["early_stopped_pairs"] = sum(count for reason, count in stop_reasons.items() if reason != "completed")
     return conversation_results
 
-def simulate_conversation_with_ai(userA, userB):
+@timed("simulate_conversation")
+def simulate_conversation_with_ai(userA, userB, client=None, budget=None, details=None):
     """
     Simulates conversation using OpenAI API with improved context handling
-    and more casual conversation style.
+    and more casual conversation style. The whole conversation comes back
+    from one completion, charged to `budget` if given. When the placeholder
+    conversation stands in for the API's, `details["fallback"]` is set.
     """
     try:
         # Prepare a more detailed system prompt to guide conversation style
@@ -94,44 +233,49 @@ def simulate_conversation_with_ai(userA, userB):
         Format each message as "Name: message text"
         """
         
-        response = openai.chat.completions.create(
-            model="chatgpt-4o-latest",
+        client = client or get_default_client()
+        ai_conversation_text = client.chat(
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
             ],
             max_tokens=600,
             temperature=0.8,
+            budget=budget
         )
         
-        # Extract and format the conversation
-        ai_conversation_text = response.choices[0].message.content.strip()
-        
         # Split into lines and clean up
         conversation = [line.strip() for line in ai_conversation_text.split('\n') if line.strip() and ':' in line]
         
         # Ensure we have at least two messages
         if len(conversation) < 2:
             # Create a simple placeholder conversation
-            conversation = [
-                f"{userA['name']}: Hey {userB['name']}, how's it going?",
-                f"{userB['name']}: Hey {userA['name']}, I'm good! How are you?",
-                f"{userA['name']}: Doing pretty well. I saw you're into {userA['interests'][0] if userA['interests'] else 'cool stuff'}?",
-                f"{userB['name']}: Yeah! Been into that for a while. Do you like {userB['interests'][0] if userB['interests'] else 'anything fun'}?",
-                f"{userA['name']}: Absolutely! We should hang out sometime.",
-                f"{userB['name']}: Sounds good to me!"
-            ]
+            fallbacks.inc(site="conversation")
+            conversation = _placeholder_conversation(userA, userB)
+            if details is not None:
+                details["fallback"] = True
             
         return conversation
+    except TokenBudgetExceeded:
+        raise
     except Exception as e:
-        print(f"Error using OpenAI API: {e}")
+        logger.warning("Error using OpenAI API: %s", e)
         # Create a simple placeholder conversation
-        conversation = [
-            f"{userA['name']}: Hey {userB['name']}, how's it going?",
-            f"{userB['name']}: Hey {userA['name']}, I'm good! How are you?",
-            f"{userA['name']}: Doing pretty well. I saw you're into {userA['interests'][0] if userA['interests'] else 'cool stuff'}?",
-            f"{userB['name']}: Yeah! Been into that for a while. Do you like {userB['interests'][0] if userB['interests'] else 'anything fun'}?",
-            f"{userA['name']}: Absolutely! We should hang out sometime.",
-            f"{userB['name']}: Sounds good to me!"
-        ]
-        return conversation 
\ No newline at end of file
+        fallbacks.inc(site="conversation")
+        if details is not None:
+            details["fallback"] = True
+        return _placeholder_conversation(userA, userB)
+
+# How each conversation is written:
+#   "single" - one completion returns the whole 8-message conversation
+#   "turns"  - one completion per message, each written by that persona, with
+#              early stopping (see turn_engine.py)
+#   "local"  - seeded templates, no LLM calls (see local_generator.py); for
+#              load tests and offline runs
+ENGINES = {
+    "single": simulate_conversation_with_ai,
+    "turns": simulate_conversation_turns,
+    "local": simulate_conversation_local,
+}
+OFFLINE_ENGINES = ("local",)
+DEFAULT_ENGINE = os.environ.get("CONVERSATION_ENGINE", "single")
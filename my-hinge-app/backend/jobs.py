@@ -0,0 +1,183 @@
+# jobs.py
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from metrics import span
+
+logger = logging.getLogger(__name__)
+
+JOB_STATES = ("queued", "running", "succeeded", "failed")
+
+# Events kept per job for streaming clients; older ones are dropped
+MAX_JOB_EVENTS = 20000
+
+class Job:
+    """
+    A unit of background work with progress counters and a result. State
+    changes, progress and per-item results are also recorded as numbered
+    events that clients can follow with events_since().
+    """
+    def __init__(self, kind, params=None, max_events=MAX_JOB_EVENTS):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params or {}
+        self.state = "queued"
+        self.stage = None
+        self.done = 0
+        self.total = None
+        self.message = "Queued"
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.stage_started_at = None
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.events = deque(maxlen=max_events)
+        self.next_seq = 0
+
+    def update(self, done=None, total=None, stage=None, message=None):
+        """Record progress; pass only the fields that changed"""
+        with self.lock:
+            if stage is not None and stage != self.stage:
+                # A new stage starts its own counters
+                self.stage = stage
+                self.done = 0
+                self.total = None
+                self.stage_started_at = time.time()
+            if done is not None:
+                self.done = done
+            if total is not None:
+                self.total = total
+            if message is not None:
+                self.message = message
+            self._append_event("progress", self._progress())
+
+    def _eta(self):
+        """Seconds left in the current stage, extrapolated from its rate so far"""
+        if not self.done or not self.total or self.stage_started_at is None:
+            return None
+        elapsed = time.time() - self.stage_started_at
+        return elapsed / self.done * max(0, self.total - self.done)
+
+    def _progress(self):
+        return {"stage": self.stage, "done": self.done, "total": self.total,
+                "eta_seconds": self._eta(), "message": self.message}
+
+    def _append_event(self, event_type, data):
+        # Callers hold self.lock
+        self.events.append({"seq": self.next_seq, "type": event_type, "data": data})
+        self.next_seq += 1
+        self.changed.notify_all()
+
+    def emit(self, event_type, data=None):
+        """Record an event for streaming clients"""
+        with self.lock:
+            self._append_event(event_type, data)
+
+    def events_since(self, seq, timeout=None):
+        """
+        Events numbered `seq` or later, waiting up to `timeout` seconds for one
+        if there are none yet and the job is still active. Returns
+        (events, finished); events dropped from the bounded log are skipped.
+        """
+        with self.lock:
+            if self.next_seq <= seq and not self.finished:
+                self.changed.wait(timeout)
+            first_seq = self.events[0]["seq"] if self.events else self.next_seq
+            events = list(self.events)[max(0, seq - first_seq):]
+            return events, self.finished
+
+    def progress_callback(self, stage, message_format=None):
+        """Callback for the pipeline stages' progress_callback(done, total) hook"""
+        self.update(done=0, stage=stage)
+
+        def report(done, total):
+            message = message_format.format(done=done, total=total) if message_format else None
+            self.update(done=done, total=total, message=message)
+        return report
+
+    @property
+    def finished(self):
+        return self.state in ("succeeded", "failed")
+
+    def to_dict(self, include_result=True):
+        with self.lock:
+            data = {
+                "job_id": self.id,
+                "type": self.kind,
+                "state": self.state,
+                "stage": self.stage,
+                "progress": {"done": self.done, "total": self.total},
+                "eta_seconds": self._eta(),
+                "message": self.message,
+                "error": self.error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at
+            }
+            if include_result and self.state == "succeeded":
+                data["result"] = self.result
+        return data
+
+class JobManager:
+    """
+    Runs jobs on a fixed-size worker pool and keeps them addressable by id.
+    Only the most recent `max_finished` finished jobs are retained.
+    """
+    def __init__(self, max_workers=4, max_finished=100):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self.max_finished = max_finished
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, kind, fn, params=None):
+        """Queue fn(job) and return the Job; fn's return value becomes job.result"""
+        job = Job(kind, params)
+        with self.lock:
+            self.jobs[job.id] = job
+            self._prune()
+        self.executor.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job, fn):
+        with job.lock:
+            job.state = "running"
+            job.started_at = time.time()
+            job.message = "Running"
+            job._append_event("state", {"state": job.state})
+        try:
+            with span("job", kind=job.kind):
+                result = fn(job)
+        except Exception as e:
+            logger.exception("Job %s (%s) failed: %s", job.id, job.kind, e)
+            with job.lock:
+                job.state = "failed"
+                job.error = str(e)
+                job.message = f"Failed: {e}"
+                job.finished_at = time.time()
+                job._append_event("state", {"state": job.state, "error": job.error})
+            return
+        with job.lock:
+            job.result = result
+            job.state = "succeeded"
+            job.message = "Completed"
+            job.finished_at = time.time()
+            job._append_event("state", {"state": job.state})
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.jobs[job_id]
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        with self.lock:
+            return list(self.jobs.values())
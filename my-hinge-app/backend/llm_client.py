@@ -0,0 +1,288 @@
+# llm_client.py
+import logging
+import os
+import random
+import threading
+import time
+from dotenv import load_dotenv
+from completion_cache import cache_from_env, completion_key
+from metrics import span, llm_calls, llm_retries, llm_failures, llm_cache_hits, llm_tokens
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables from .env file
+load_dotenv()
+
+DEFAULT_MODEL = "chatgpt-4o-latest"
+
+def _retryable_errors():
+    """
+    Errors worth retrying: rate limits, server-side failures and transport problems.
+    The openai SDK takes about half a second to import, so it is only
+    imported once a client is actually used.
+    """
+    import openai
+    return (
+        openai.RateLimitError,
+        openai.InternalServerError,
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+    )
+
+def _env_number(name, default, cast=int):
+    """Read a numeric setting from the environment, falling back to default"""
+    value = os.environ.get(name)
+    if value in (None, ""):
+        return default
+    return cast(value)
+
+class TokenBucket:
+    """
+    Thread-safe token bucket that refills continuously at `per_minute` tokens
+    per minute. Used for both requests-per-minute and tokens-per-minute limits.
+    """
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1):
+        """Block until `amount` tokens are available, then take them"""
+        # A single request larger than the bucket would otherwise wait forever
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def refund(self, amount):
+        """Return unused tokens, e.g. when a reservation overestimated usage"""
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+class TokenBudgetExceeded(Exception):
+    """Raised instead of making a call that could take a run past its token budget"""
+
+class TokenBudget:
+    """
+    Thread-safe cap on the tokens one run may spend. Each call reserves an
+    estimate (prompt at ~4 characters per token, plus max_tokens) before it
+    is sent and settles to the reported usage afterwards, so no call starts
+    once the estimates no longer fit. The prompt estimate can run low, so
+    the reported usage may pass the cap, by at most what the calls in
+    flight (one per worker) under-estimated.
+    """
+    def __init__(self, max_tokens):
+        self.max_tokens = max_tokens
+        self.used = 0
+        self.reserved = 0
+        self.refused = 0
+        self.lock = threading.Lock()
+
+    def reserve(self, amount):
+        """Set aside `amount` tokens; False (and nothing reserved) if they don't fit"""
+        with self.lock:
+            if self.used + self.reserved + amount > self.max_tokens:
+                self.refused += 1
+                return False
+            self.reserved += amount
+            return True
+
+    def settle(self, reserved, used):
+        """Release a reservation and charge what the call actually used"""
+        with self.lock:
+            self.reserved -= reserved
+            self.used += used
+
+    def get_stats(self):
+        with self.lock:
+            return {"token_budget": self.max_tokens, "tokens_used": self.used,
+                    "tokens_remaining": self.max_tokens - self.used, "budget_refusals": self.refused}
+
+class LLMClient:
+    """
+    Bounded OpenAI chat client shared by all simulation threads.
+
+    - at most `concurrency` requests are in flight at once
+    - each request is cut off after `timeout` seconds
+    - rate limits (429), 5xx errors and timeouts are retried up to
+      `max_retries` times with jittered exponential backoff
+    - optional token buckets cap requests and tokens per minute
+    - an optional CompletionCache answers repeated requests without a call
+    """
+    def __init__(self, model=DEFAULT_MODEL, concurrency=8, timeout=60.0, max_retries=4,
+                 backoff_base=0.5, backoff_max=20.0, requests_per_minute=None,
+                 tokens_per_minute=None, base_url=None, api_key=None, cache=None):
+        self.model = model
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.base_url = base_url or os.environ.get("OPENAI_BASE_URL")
+        self.api_key = api_key or os.environ.get("OPENAI_API_KEY")
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.cache = cache
+        self.stats = {"calls": 0, "retries": 0, "failures": 0}
+        self._stats_lock = threading.Lock()
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    def _get_client(self):
+        # Created lazily so a missing API key surfaces as a call error the
+        # callers already handle, rather than an import-time failure
+        with self._client_lock:
+            if self._client is None:
+                import openai
+                self._client = openai.OpenAI(
+                    api_key=self.api_key,
+                    base_url=self.base_url,
+                    timeout=self.timeout,
+                    max_retries=0  # retries are handled here so they respect the rate limiters
+                )
+            return self._client
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _backoff(self, attempt, error):
+        """Seconds to wait before retry number `attempt` (0-based)"""
+        # Honour the server's Retry-After hint when there is one
+        response = getattr(error, "response", None)
+        if response is not None:
+            retry_after = response.headers.get("retry-after")
+            if retry_after:
+                try:
+                    return min(float(retry_after), self.backoff_max)
+                except ValueError:
+                    pass
+        # Full jitter keeps concurrent workers from retrying in lockstep
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def chat(self, messages, max_tokens=500, temperature=0.7, model=None, seed=None, use_cache=True, usage=None,
+             budget=None):
+        """
+        Run one chat completion and return the message text.
+        
+        Pass a dict as `usage` to receive the call's prompt/completion/total
+        token counts (zero when answered from the cache). With a TokenBudget
+        as `budget`, the call is charged to it, and TokenBudgetExceeded is
+        raised instead of sending a call the budget can't cover.
+        """
+        model = model or self.model
+        cache_key = None
+        if self.cache is not None and use_cache:
+            cache_key = completion_key(model, messages, temperature, max_tokens, seed)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                llm_cache_hits.inc()
+                if usage is not None:
+                    usage.update(prompt_tokens=0, completion_tokens=0, total_tokens=0)
+                return cached
+
+        # Rough token estimate (~4 characters per token) reserved against the TPM budget
+        estimated_tokens = sum(len(m["content"]) for m in messages) // 4 + max_tokens
+        if budget is not None and not budget.reserve(estimated_tokens):
+            raise TokenBudgetExceeded(f"Token budget of {budget.max_tokens} exhausted")
+        try:
+            text, response_usage = self._complete(messages, max_tokens, temperature, model, seed, estimated_tokens)
+        except BaseException:
+            if budget is not None:
+                budget.settle(estimated_tokens, 0)
+            raise
+        
+        total_tokens = response_usage.total_tokens if response_usage is not None else estimated_tokens
+        if budget is not None:
+            budget.settle(estimated_tokens, total_tokens)
+        if usage is not None:
+            usage.update(
+                prompt_tokens=response_usage.prompt_tokens if response_usage is not None else 0,
+                completion_tokens=response_usage.completion_tokens if response_usage is not None else 0,
+                total_tokens=total_tokens
+            )
+        if cache_key is not None:
+            self.cache.set(cache_key, text)
+        return text
+
+    def _complete(self, messages, max_tokens, temperature, model, seed, estimated_tokens):
+        """Send the request with rate limiting and retries; returns (text, usage or None)"""
+        attempt = 0
+        while True:
+            if self.request_bucket:
+                self.request_bucket.acquire(1)
+            if self.token_bucket:
+                self.token_bucket.acquire(estimated_tokens)
+
+            try:
+                with self.slots, span("llm_request"):
+                    self._count("calls")
+                    llm_calls.inc()
+                    request = {
+                        "model": model,
+                        "messages": messages,
+                        "max_tokens": max_tokens,
+                        "temperature": temperature,
+                    }
+                    if seed is not None:
+                        request["seed"] = seed
+                    response = self._get_client().chat.completions.create(**request)
+            except _retryable_errors() as e:
+                if attempt >= self.max_retries:
+                    self._count("failures")
+                    llm_failures.inc(error=type(e).__name__)
+                    raise
+                delay = self._backoff(attempt, e)
+                self._count("retries")
+                llm_retries.inc(error=type(e).__name__)
+                logger.warning("LLM call failed (%s), retrying in %.2fs...", type(e).__name__, delay)
+                attempt += 1
+                time.sleep(delay)
+                continue
+            except Exception as e:
+                self._count("failures")
+                llm_failures.inc(error=type(e).__name__)
+                raise
+
+            # Give back whatever part of the token reservation wasn't used
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                llm_tokens.inc(usage.prompt_tokens or 0, kind="prompt")
+                llm_tokens.inc(usage.completion_tokens or 0, kind="completion")
+            if self.token_bucket and usage is not None and usage.total_tokens < estimated_tokens:
+                self.token_bucket.refund(estimated_tokens - usage.total_tokens)
+
+            return response.choices[0].message.content.strip(), usage
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+def get_default_client():
+    """Shared client configured from LLM_* environment variables"""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = LLMClient(
+                model=os.environ.get("LLM_MODEL", DEFAULT_MODEL),
+                concurrency=_env_number("LLM_CONCURRENCY", 8),
+                timeout=_env_number("LLM_TIMEOUT", 60.0, float),
+                max_retries=_env_number("LLM_MAX_RETRIES", 4),
+                requests_per_minute=_env_number("LLM_REQUESTS_PER_MINUTE", None),
+                tokens_per_minute=_env_number("LLM_TOKENS_PER_MINUTE", None),
+                cache=cache_from_env()
+            )
+        return _default_client
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# llm_stub_server.py - Local OpenAI-compatible server for tests and load runs
+#
+# Emulates /v1/chat/completions with configurable latency and injected
+# rate-limit (429) / server (500) errors, so the simulation engine can be
+# exercised without network access or API spend.
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from profiles import HINGE_PROMPTS
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    # Concurrent clients open many connections at once; the default backlog of 5 refuses some
+    request_queue_size = 128
+    daemon_threads = True
+
+# Turn-by-turn replies. About 3 in 10 pairs (chosen from their names) go cold
+# and one persona eventually leaves, so early stopping has something to catch.
+WARM_TURNS = [
+    "Hey {partner}! Your profile made me smile",
+    "Haha that's great, I love that too!",
+    "That sounds amazing, tell me more",
+    "We should totally grab coffee sometime",
+    "I'd really like that, how about Saturday?",
+    "Perfect, can't wait!",
+]
+COLD_TURNS = [
+    "hey",
+    "I don't really like any of that, sorry",
+    "This is pretty awkward and dull",
+    "Yeah no, this is terrible",
+]
+
+def turn_responder(name, partner, turn):
+    """Next message for `name` on their `turn`-th message (0-based) to `partner`"""
+    if zlib.crc32("|".join(sorted((name, partner))).encode("utf-8")) % 10 < 3:
+        return COLD_TURNS[turn] if turn < len(COLD_TURNS) else "[END]"
+    return WARM_TURNS[turn % len(WARM_TURNS)].format(partner=partner)
+
+def default_responder(messages):
+    """Build a plausible reply for the prompts this app sends"""
+    prompt = messages[-1]["content"] if messages else ""
+
+    # Turn-by-turn prompt: one persona's next message
+    system = messages[0]["content"] if messages and messages[0].get("role") == "system" else ""
+    persona = re.search(r"You are ([^,\n]+), .*?\nYour match is ([^,\n]+),", system, re.S)
+    if persona:
+        turn = sum(1 for m in messages if m.get("role") == "assistant")
+        return turn_responder(persona.group(1), persona.group(2), turn)
+
+    # Conversation simulation prompt: alternate between the two named users
+    names = re.findall(r"User [12]: ([^,\n]+),", prompt)
+    if len(names) == 2:
+        lines = [
+            "{0}: Hey {1}! Your profile made me smile",
+            "{1}: Haha thanks {0}, yours too! What are you up to this weekend?",
+            "{0}: Probably a hike if the weather holds up. You?",
+            "{1}: That sounds great, I love being outdoors",
+            "{0}: We should go together sometime!",
+            "{1}: I'd really like that",
+            "{0}: Awesome, how about Saturday morning?",
+            "{1}: Perfect, it's a date",
+        ]
+        return "\n".join(line.format(*names) for line in lines)
+
+    # Profile prompt answers: echo the requested prompts back as a JSON array,
+    # or as a JSON object of arrays keyed by profile number for batched requests
+    answers = {}
+    profile_number = None
+    for line in prompt.split("\n"):
+        line = line.strip()
+        if re.fullmatch(r"Profile \d+", line):
+            profile_number = line.split()[1]
+        elif line in HINGE_PROMPTS:
+            answers.setdefault(profile_number, []).append({"prompt": line, "answer": "Honestly, ask me in person!"})
+    if profile_number is None:
+        return json.dumps(answers.get(None, []))
+    return json.dumps(answers)
+
+class StubLLMServer:
+    """
+    Threaded local chat-completions server.
+
+    latency        - seconds each request sleeps before answering
+    rate_limit_first / error_first
+                   - the first N requests get a 429 / 500 response
+    rate_limit_rate / error_rate
+                   - probability of a 429 / 500 on any later request
+    responder      - function(messages) -> reply text
+    """
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, rate_limit_first=0, rate_limit_rate=0.0,
+                 error_first=0, error_rate=0.0, retry_after=None, responder=default_responder, seed=0):
+        self.latency = latency
+        self.rate_limit_first = rate_limit_first
+        self.rate_limit_rate = rate_limit_rate
+        self.error_first = error_first
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.responder = responder
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "rate_limited": 0, "errors": 0, "completed": 0, "in_flight": 0, "max_in_flight": 0}
+        self.httpd = _StubHTTPServer((host, port), self._make_handler())
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _pick_status(self):
+        with self.lock:
+            self.stats["requests"] += 1
+            count = self.stats["requests"]
+            if count <= self.rate_limit_first or self.random.random() < self.rate_limit_rate:
+                self.stats["rate_limited"] += 1
+                return 429
+            if count <= self.rate_limit_first + self.error_first or self.random.random() < self.error_rate:
+                self.stats["errors"] += 1
+                return 500
+            return 200
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, body, headers=None):
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": "Not found"}})
+                    return
+
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+
+                with server.lock:
+                    server.stats["in_flight"] += 1
+                    server.stats["max_in_flight"] = max(server.stats["max_in_flight"], server.stats["in_flight"])
+                try:
+                    if server.latency:
+                        time.sleep(server.latency)
+                    status = server._pick_status()
+                    if status == 429:
+                        headers = {"retry-after": str(server.retry_after)} if server.retry_after is not None else {}
+                        self._send_json(429, {"error": {"message": "Rate limit reached", "type": "rate_limit_error"}}, headers)
+                        return
+                    if status == 500:
+                        self._send_json(500, {"error": {"message": "Internal server error", "type": "server_error"}})
+                        return
+
+                    messages = request.get("messages", [])
+                    content = server.responder(messages)
+                    prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+                    completion_tokens = len(content) // 4
+                    with server.lock:
+                        server.stats["completed"] += 1
+                    self._send_json(200, {
+                        "id": f"chatcmpl-stub-{server.stats['requests']}",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": request.get("model", "stub"),
+                        "choices": [{
+                            "index": 0,
+                            "message": {"role": "assistant", "content": content},
+                            "finish_reason": "stop"
+                        }],
+                        "usage": {
+                            "prompt_tokens": prompt_tokens,
+                            "completion_tokens": completion_tokens,
+                            "total_tokens": prompt_tokens + completion_tokens
+                        }
+                    })
+                finally:
+                    with server.lock:
+                        server.stats["in_flight"] -= 1
+
+        return Handler
+
+    def start(self):
+        """Serve in a background thread and return self"""
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local OpenAI-compatible stub server")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per request")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    args = parser.parse_args()
+
+    stub = StubLLMServer(port=args.port, latency=args.latency,
+                         rate_limit_rate=args.rate_limit_rate, error_rate=args.error_rate)
+    print(f"Stub LLM server listening on {stub.base_url}")
+    print(f"Point the backend at it with OPENAI_BASE_URL={stub.base_url} OPENAI_API_KEY=stub")
+    try:
+        stub.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,161 @@
+# local_generator.py
+# Seeded, template-based stand-in for the LLM: prompt answers and whole
+# conversations built from HINGE_PROMPTS, PERSONALITY_PROMPTS and the
+# profiles' interests. Fast enough to simulate every pair of a 10k+ profile
+# pool offline, for load tests of sentiment, matching and storage.
+import os
+import random
+import zlib
+from metrics import timed
+from profiles import PERSONALITY_PROMPTS
+
+# Base seed mixed into every pair's generator; change it to get a different but
+# equally reproducible set of conversations
+DEFAULT_SEED = int(os.environ.get("LOCAL_GENERATOR_SEED", 0))
+
+# Per personality (same order as PERSONALITY_PROMPTS): a trait, things they'd
+# suggest doing, and a typical aside
+PERSONALITY_STYLES = [
+    {"trait": "spontaneous", "plans": ["go skydiving", "take a last-minute road trip", "try the climbing gym"], "aside": "I say yes to everything, it's a problem"},
+    {"trait": "thoughtful", "plans": ["find a quiet wine bar", "go to a bookstore and trade picks", "see a documentary"], "aside": "I'd rather have one real conversation than ten small talks"},
+    {"trait": "creative", "plans": ["check out a weird gallery opening", "go to a pottery class", "wander a flea market"], "aside": "I collect strange postcards"},
+    {"trait": "driven", "plans": ["grab an early coffee before work", "do a sunrise run", "try that new rooftop place"], "aside": "my calendar is color-coded"},
+    {"trait": "caring", "plans": ["cook dinner together", "volunteer at the animal shelter", "have a picnic in the park"], "aside": "I always remember birthdays"},
+    {"trait": "funny", "plans": ["go to a comedy night", "do the worst karaoke in town", "play mini golf badly"], "aside": "I laugh at my own jokes first"},
+    {"trait": "mindful", "plans": ["do a sunset yoga class", "walk the botanical garden", "try a sound bath"], "aside": "I journal every morning"},
+    {"trait": "easygoing", "plans": ["have a movie night in", "bake something together", "walk to the farmers market"], "aside": "my couch is my happy place"},
+    {"trait": "passionate", "plans": ["go to a community meetup", "help at a park cleanup", "catch a talk at the library"], "aside": "I will absolutely talk your ear off about local politics"},
+    {"trait": "refined", "plans": ["try the new tasting menu downtown", "go to the symphony", "visit a wine bar with a real sommelier"], "aside": "I have opinions about olive oil"},
+]
+GENERIC_STYLE = {"trait": "curious", "plans": ["grab a coffee", "go for a walk", "get tacos"], "aside": "I'm always up for something new"}
+_STYLE_BY_PERSONALITY = dict(zip(PERSONALITY_PROMPTS, PERSONALITY_STYLES))
+
+# Answer templates per Hinge prompt; {interest}, {plan}, {trait} and {aside}
+# come from the profile
+PROMPT_ANSWERS = {
+    "A shower thought I recently had...": ["Why is {interest} so much better at 2am?", "If you're {trait} enough, every weekend is a long weekend."],
+    "My most irrational fear is...": ["Being asked to give up {interest} for a month.", "Waving back at someone who wasn't waving at me."],
+    "I get along best with people who...": ["Don't mind when I talk about {interest} too much.", "Want to {plan} on a random Tuesday."],
+    "Dating me is like...": ["A {trait} surprise every week. Bring snacks.", "Signing up for {interest} lessons you didn't know you needed."],
+    "The hallmark of a good relationship is...": ["Being able to {plan} and still have things to talk about.", "Laughing at the same dumb things."],
+    "Don't hate me if I...": ["Turn every date into a {interest} lesson.", "Honestly, {aside}."],
+    "Truth or dare?": ["Dare. Let's {plan}.", "Truth: {aside}."],
+    "I go crazy for...": ["Anything to do with {interest}.", "People who want to {plan} with zero notice."],
+    "I know the best spot in town for...": ["{interest}, and I'll only tell you in person.", "A place where we could {plan}."],
+    "My love language is...": ["Planning a day to {plan} for you.", "Sending you {interest} recommendations at odd hours."],
+    "One thing I'll never do again...": ["Try to {plan} without checking the weather first.", "Skip {interest} for a whole summer."],
+    "Let's make sure to...": ["{plan} on our first date.", "Argue about {interest} at least once."],
+    "I'm overly competitive about...": ["{interest}. Don't test me.", "Board games, and I'm not sorry."],
+    "The last time I cried...": ["Was at the end of a movie about {interest}, no shame.", "Was laughing, because {aside}."],
+    "My ideal weekend includes...": ["{interest} in the morning, then we {plan}.", "Sleeping in and then trying to {plan}."],
+    "I want someone who...": ["Is into {interest} or willing to learn.", "Wants to {plan} with me."],
+    "I'm known for...": ["Being the {trait} friend.", "My {interest} phase that never ended."],
+    "My biggest date fail...": ["Trying to {plan} and getting completely lost.", "Talking about {interest} for two hours straight."],
+    "Change my mind about...": ["{interest} being the best hobby there is.", "Pineapple on pizza (it's great)."],
+    "Unusual skills:": ["Way too good at {interest}.", "I can plan a day to {plan} in five minutes."],
+    "Green flags I look for...": ["Someone who gets excited about {interest}.", "Being kind to waiters and {trait} about life."],
+    "The way to win me over is...": ["Ask me to {plan}.", "Know something about {interest} that I don't."],
+    "My greatest strength...": ["Being {trait}, even on a Monday.", "I'm honestly great at {interest}."],
+    "Most spontaneous thing I've done...": ["Decided to {plan} the same morning.", "Picked up {interest} on a whim and never stopped."],
+    "We'll get along if...": ["You like {interest}, or at least tolerate it.", "You're down to {plan}."],
+}
+GENERIC_ANSWERS = ["Ask me about {interest}!", "Let's {plan} and find out."]
+
+# Conversation lines by tone. The tone of each pair is drawn from their shared
+# interests and a seeded coin, so sentiment scores spread out like real chats.
+OPENERS = {
+    "warm": ["Hey {partner}! Your \"{hook}\" answer made me laugh", "Hi {partner}, I love that you're into {interest}!",
+             "{partner}! Okay I have to ask about your \"{hook}\" answer"],
+    "neutral": ["Hey {partner}, how's your week going?", "Hi {partner}, saw you like {interest}", "Hey, what's up?"],
+    "cold": ["hey", "hi", "sup"],
+}
+REPLIES = {
+    "warm": ["Haha thank you! I'm a total {trait} person, {aside}", "That's so great, I've been into {interest} for years",
+             "Oh I love that. Honestly {interest} is my favorite thing", "Same! We clearly have great taste",
+             "Wait that's amazing, tell me more", "You seem really fun, I like your vibe"],
+    "neutral": ["Not bad, pretty busy with work", "Yeah it's okay, I do some {interest} on weekends",
+                "Sure, I guess it's fine", "Hmm, maybe, I haven't really tried that", "Cool, what else do you do?",
+                "It's alright, kind of a long week"],
+    "cold": ["Ok", "not really my thing, sorry", "I don't know, that sounds kind of boring", "meh",
+             "I'm pretty busy honestly", "that's a weird thing to say"],
+}
+QUESTIONS = {
+    "warm": ["Have you ever tried {interest}?", "What's the best {interest} spot you know?", "What got you into {interest}?"],
+    "neutral": ["Do you like {interest}?", "What do you do for fun?", "How long have you been on here?"],
+    "cold": ["why?", "so what?", "is that it?"],
+}
+CLOSERS = {
+    "warm": ["We should {plan} this weekend!", "I'd love to {plan} with you sometime", "Okay, we have to {plan} soon"],
+    "neutral": ["Maybe we could grab a coffee sometime", "Could be fun to hang out at some point", "Let's see, I'm free next week maybe"],
+    "cold": ["I don't think this is going to work, sorry", "Yeah I'm gonna pass, good luck though", "Bye"],
+}
+
+def _rng(seed, *ids):
+    """Generator for one profile or pair, independent of call order and thread"""
+    value = seed
+    for item in ids:
+        # crc32 rather than hash(), which is salted per process for strings
+        value = value * 1_000_003 + (item if isinstance(item, int) else zlib.crc32(str(item).encode()))
+    return random.Random(value)
+
+def _pick(rng, items):
+    # Same distribution as rng.choice at a fraction of its cost, which matters
+    # at tens of thousands of conversations per second
+    return items[int(rng.random() * len(items))]
+
+def _style(profile):
+    return _STYLE_BY_PERSONALITY.get(profile.get('personality'), GENERIC_STYLE)
+
+def _fill(template, rng, style, interests, **extra):
+    """Format a template with a random interest and plan for the speaker"""
+    interest = _pick(rng, interests).lower() if interests and "{interest}" in template else "trying new things"
+    plan = _pick(rng, style["plans"]) if "{plan}" in template else ""
+    text = template.format(interest=interest, plan=plan, trait=style["trait"], aside=style["aside"], **extra)
+    return text[0].upper() + text[1:]
+
+def local_prompt_answers(personality, selected_prompts, interests=None, seed=DEFAULT_SEED, profile_id=0):
+    """Prompt answers in the shape of generate_prompt_answers, from templates"""
+    rng = _rng(seed, "answers", profile_id)
+    style = _STYLE_BY_PERSONALITY.get(personality, GENERIC_STYLE)
+    return [
+        {"prompt": prompt, "answer": _fill(_pick(rng, PROMPT_ANSWERS.get(prompt, GENERIC_ANSWERS)), rng, style, interests)}
+        for prompt in selected_prompts
+    ]
+
+def _tone(rng, userA, userB):
+    shared = len(set(userA.get('interests') or []) & set(userB.get('interests') or []))
+    roll = rng.random() + 0.15 * shared
+    if roll < 0.25:
+        return "cold"
+    return "neutral" if roll < 0.6 else "warm"
+
+@timed("simulate_conversation", engine="local")
+def simulate_conversation_local(userA, userB, client=None, budget=None, details=None, seed=None, num_messages=8):
+    """
+    Write a conversation from templates, alternating from userA, in the
+    "Name: message" format of simulate_conversation_with_ai. The same seed
+    and pair always give the same conversation; no LLM (so no `client` or
+    token `budget`) is involved.
+    """
+    rng = _rng(DEFAULT_SEED if seed is None else seed, userA['id'], userB['id'])
+    tone = _tone(rng, userA, userB)
+    # (name, style, interests) of each speaker, with the partner's name and prompt answers
+    speakers = [
+        (userA['name'], _style(userA), userA.get('interests'), userB['name'], userB.get('prompt_answers')),
+        (userB['name'], _style(userB), userB.get('interests'), userA['name'], userA.get('prompt_answers')),
+    ]
+    conversation = []
+    for turn in range(num_messages):
+        name, style, interests, partner_name, answers = speakers[turn % 2]
+        if turn == 0:
+            templates = OPENERS[tone]
+        elif turn == num_messages - 1:
+            templates = CLOSERS[tone]
+        else:
+            templates = QUESTIONS[tone] if turn % 3 == 2 else REPLIES[tone]
+        template = _pick(rng, templates)
+        hook = _pick(rng, answers)['prompt'] if answers and "{hook}" in template else "your profile"
+        conversation.append(f"{name}: {_fill(template, rng, style, interests, partner=partner_name, hook=hook)}")
+    if details is not None:
+        details.update(tone=tone)
+    return conversation
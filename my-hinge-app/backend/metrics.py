@@ -0,0 +1,177 @@
+# metrics.py
+# In-process counters, timing histograms and spans, rendered in the
+# Prometheus text exposition format for /api/metrics
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the span histogram buckets: from sub-millisecond
+# NLP batches up to slow LLM calls with retries
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+def _format_labels(label_key):
+    if not label_key:
+        return ""
+    escape = lambda value: str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in label_key) + "}"
+
+class Counter:
+    """Monotonic count per label set"""
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self.lock:
+            return self.values.get(_label_key(labels), 0)
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, key, value) for key, value in sorted(self.values.items())]
+
+class Histogram:
+    """Bucketed observations (e.g. durations) per label set, with their sum and count"""
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.values = {}  # label key -> [count per bucket..., observation count, sum]
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            state = self.values.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+            state[-2] += 1
+            state[-1] += value
+
+    def count(self, **labels):
+        with self.lock:
+            state = self.values.get(_label_key(labels))
+            return state[-2] if state else 0
+
+    def samples(self):
+        with self.lock:
+            result = []
+            for key, state in sorted(self.values.items()):
+                for bound, count in zip(self.buckets, state):
+                    result.append((f"{self.name}_bucket", key + (("le", repr(bound)),), count))
+                result.append((f"{self.name}_bucket", key + (("le", "+Inf"),), state[-2]))
+                result.append((f"{self.name}_count", key, state[-2]))
+                result.append((f"{self.name}_sum", key, state[-1]))
+            return result
+
+class MetricsRegistry:
+    """
+    Named metrics plus collectors: functions called at render time that return
+    (name, kind, help, [(labels dict, value), ...]) for values owned elsewhere,
+    such as cache sizes.
+    """
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, help_text, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, help_text, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric '{name}' is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, help_text=""):
+        return self._get_or_create(Counter, name, help_text)
+
+    def histogram(self, name, help_text="", buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, help_text, buckets=buckets)
+
+    def add_collector(self, collector):
+        with self.lock:
+            self.collectors.append(collector)
+
+    def render(self):
+        """All metrics in the Prometheus text format (version 0.0.4)"""
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda metric: metric.name)
+            collectors = list(self.collectors)
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(f"{name}{_format_labels(key)} {value}" for name, key, value in metric.samples())
+        for collector in collectors:
+            for name, kind, help_text, samples in collector():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(f"{name}{_format_labels(_label_key(labels))} {value}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+# Process-wide registry used by the pipeline modules and /api/metrics
+registry = MetricsRegistry()
+
+span_seconds = registry.histogram("hinge_span_seconds", "Time spent in instrumented pipeline spans")
+llm_calls = registry.counter("hinge_llm_calls_total", "LLM chat completion requests sent, retries included")
+llm_retries = registry.counter("hinge_llm_retries_total", "LLM requests retried after a rate limit, server error or timeout")
+llm_failures = registry.counter("hinge_llm_failures_total", "LLM calls that failed after exhausting retries")
+llm_cache_hits = registry.counter("hinge_llm_cache_hits_total", "LLM calls answered from the completion cache")
+llm_tokens = registry.counter("hinge_llm_tokens_total", "Tokens reported by the LLM API, by kind (prompt/completion)")
+fallbacks = registry.counter("hinge_fallbacks_total", "Placeholder output used because the LLM call or its parsing failed")
+# Cache lookups by result. Clearing a cache doesn't reset these (its own get_stats() may)
+sentiment_cache_lookups = registry.counter("hinge_sentiment_cache_lookups_total", "Sentiment cache lookups by result")
+pair_cache_lookups = registry.counter("hinge_pair_cache_lookups_total", "Conversation endpoint cache lookups by result")
+completion_cache_lookups = registry.counter("hinge_llm_cache_lookups_total", "Completion cache lookups by result")
+
+@contextmanager
+def span(name, **labels):
+    """
+    Time a block into hinge_span_seconds{span=name, ...}. Failed blocks are
+    recorded with outcome="error" so slow failures don't skew the successes.
+    """
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        span_seconds.observe(elapsed, span=name, outcome=outcome, **labels)
+        logger.debug("span %s %s took %.4fs", name, outcome, elapsed)
+
+def timed(name, **labels):
+    """Decorator recording every call of the function as a span"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def render_metrics():
+    return registry.render()
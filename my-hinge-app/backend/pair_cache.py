@@ -0,0 +1,95 @@
+# pair_cache.py
+# Cache for the single-pair conversation endpoint: each pair's conversation
+# and score are built once, and concurrent requests for a pair that is still
+# being built wait for that build instead of starting their own.
+import threading
+from collections import OrderedDict
+from metrics import pair_cache_lookups
+
+class _Flight:
+    """One in-progress build that later requests for the same key wait on"""
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+class PairCache:
+    """
+    Bounded LRU of pair key -> value with single-flight builds.
+
+    clear() drops the cached values and detaches builds still in flight, so
+    a build that started before a new run was loaded can't store its result.
+    """
+    def __init__(self, max_entries=5000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.in_flight = {}
+        self.generation = 0
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(user1_id, user2_id):
+        """Order-independent key, so A/B and B/A share one entry"""
+        return (min(user1_id, user2_id), max(user1_id, user2_id))
+
+    def get_or_build(self, key, build):
+        """
+        The cached value for `key`, or the result of `build()`, which must
+        return (value, store). Only one build per key runs at a time; callers
+        arriving meanwhile get its value (or its exception). Values built with
+        store=False (e.g. fallbacks) are returned but not cached.
+        """
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.stats["hits"] += 1
+                pair_cache_lookups.inc(result="hit")
+                return self.entries[key]
+            flight = self.in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.in_flight[key] = _Flight()
+                generation = self.generation
+                self.stats["misses"] += 1
+            else:
+                self.stats["coalesced"] += 1
+        pair_cache_lookups.inc(result="miss" if leader else "coalesced")
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value, store = build()
+        except BaseException as e:
+            flight.error = e
+            raise
+        else:
+            with self.lock:
+                if store and generation == self.generation and self.max_entries > 0:
+                    self.entries[key] = flight.value
+                    while len(self.entries) > self.max_entries:
+                        self.entries.popitem(last=False)
+            return flight.value
+        finally:
+            with self.lock:
+                if self.in_flight.get(key) is flight:
+                    del self.in_flight[key]
+            flight.done.set()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.in_flight.clear()
+            self.generation += 1
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats, entries=len(self.entries), in_flight=len(self.in_flight),
+                         max_entries=self.max_entries)
+        lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
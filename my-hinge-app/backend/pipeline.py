@@ -0,0 +1,333 @@
+# pipeline.py
+# Stages of the matching pipeline, shared by the HTTP endpoints and background jobs
+import heapq
+import logging
+import time
+from profiles import generate_user_profiles
+from conversation_simulator import simulate_conversations, DEFAULT_ENGINE
+from turn_engine import TURN_OPTIONS
+from sentiment_analyzer import analyze_sentiment_batch, DEFAULT_BATCH_SIZE, DEFAULT_N_PROCESS, DEFAULT_SCORING_WORKERS
+from profile_store import ProfileStore
+from topk import TopKSelector
+from metrics import span, span_seconds, fallbacks
+
+logger = logging.getLogger(__name__)
+
+# Matches kept per user unless the "top_k" option says otherwise
+DEFAULT_TOP_K = 3
+
+# Conversations scored per update_analysis call when analyzing a stream
+DEFAULT_CHUNK_SIZE = 10000
+
+def run_generate_profiles(options, progress_callback=None, start_id=0):
+    """Generate profiles as configured by request options; the "local" engine also writes their prompt answers"""
+    return generate_user_profiles(
+        num_profiles=options.get("num_profiles", 10),
+        concurrency=options.get("concurrency"),
+        batch_size=options.get("batch_size", 1),
+        progress_callback=progress_callback,
+        start_id=start_id,
+        local_answers=(options.get("engine") or DEFAULT_ENGINE) == "local"
+    )
+
+def run_simulate_conversations(profiles, options, progress_callback=None, new_ids=None, stats=None,
+                               result_callback=None, skip_pairs=None, keep_results=True):
+    """
+    Simulate conversations for every pair of profiles (or only pairs involving
+    new_ids), restricted to each user's top `candidate_k` candidates if set.
+    `result_callback((userA_id, userB_id), messages)` sees each conversation as it finishes;
+    with keep_results=False that is the only place they go.
+    The "engine" option picks how conversations are written ("turns" also
+    reads the TURN_OPTIONS, "local" the "seed"), and "token_budget" caps the
+    tokens spent.
+    """
+    engine_options = {}
+    if options.get("engine") == "turns":
+        engine_options = {key: options[key] for key in TURN_OPTIONS if key in options}
+    elif options.get("engine") == "local" and options.get("seed") is not None:
+        engine_options = {"seed": options["seed"]}
+    return simulate_conversations(
+        profiles,
+        concurrency=options.get("concurrency"),
+        progress_callback=progress_callback,
+        new_ids=new_ids,
+        candidate_k=options.get("candidate_k"),
+        stats=stats,
+        result_callback=result_callback,
+        skip_pairs=skip_pairs,
+        engine=options.get("engine"),
+        engine_options=engine_options,
+        token_budget=options.get("token_budget"),
+        keep_results=keep_results
+    )
+
+def pair_id(userA_id, userB_id):
+    """
+    Reference to a conversation used in results instead of embedding its
+    messages; the messages are served by /api/conversation/<userA_id>/<userB_id>
+    """
+    return f"{userA_id}-{userB_id}"
+
+def _batch_scores(conversations, options, stats, progress_callback=None, details=None):
+    """
+    analyze_sentiment_batch over `conversations`. If the batch fails, each
+    conversation is scored again on its own so one bad conversation doesn't
+    fail the stage: the ones that still fail get a neutral 0.5.
+    """
+    batch_options = {
+        "batch_size": options.get("batch_size", DEFAULT_BATCH_SIZE),
+        "n_process": options.get("n_process", DEFAULT_N_PROCESS),
+        "workers": options.get("sentiment_workers", DEFAULT_SCORING_WORKERS)
+    }
+    try:
+        return analyze_sentiment_batch(conversations, stats=stats, progress_callback=progress_callback,
+                                       details=details, **batch_options)
+    except Exception as e:
+        logger.warning("Batch sentiment scoring failed (%s); scoring %d conversations one at a time",
+                       e, len(conversations))
+    
+    scores = {}
+    retry_stats = {}
+    for key, conversation in conversations.items():
+        one_stats = {}
+        try:
+            scores.update(analyze_sentiment_batch({key: conversation}, stats=one_stats, details=details, **batch_options))
+        except Exception as e:
+            logger.warning("Error analyzing sentiment for pair %s: %s", key, e)
+            fallbacks.inc(site="sentiment")
+            scores[key] = 0.5  # Neutral score as fallback
+        for name in ("messages", "scored", "cache_hits"):
+            retry_stats[name] = retry_stats.get(name, 0) + one_stats.get(name, 0)
+    if stats is not None:
+        retry_stats["hit_rate"] = retry_stats["cache_hits"] / retry_stats["messages"] if retry_stats["messages"] else 0.0
+        stats.update(retry_stats)
+    if progress_callback:
+        progress_callback(retry_stats["scored"], retry_stats["scored"])
+    return scores
+
+def _score_pairs(store, conversations, options, stats, progress_callback=None, details=None):
+    """
+    Score conversations in one batched NLP pass and yield scored pair entries
+    in conversation order
+    """
+    # Score every conversation in one batched NLP pass
+    with span("score_conversations"):
+        sentiment_scores = _batch_scores(conversations, options, stats, progress_callback, details)
+    
+    # Process all conversation pairs
+    for userA_id, userB_id in conversations:
+        # Get user names for output
+        userA = store.get(userA_id)
+        userB = store.get(userB_id)
+        
+        if not userA or not userB:
+            continue
+        
+        yield {
+            'userA_id': userA_id,
+            'userB_id': userB_id,
+            'userA_name': userA.name,
+            'userB_name': userB.name,
+            'sentiment_score': sentiment_scores[(userA_id, userB_id)],
+            'pair_id': pair_id(userA_id, userB_id)
+        }
+
+def _offer_pair(selector, store, pair):
+    """Offer a scored pair to both users' top K; match entries are only built when kept"""
+    score = pair['sentiment_score']
+    for user_id, partner_id in ((pair['userA_id'], pair['userB_id']), (pair['userB_id'], pair['userA_id'])):
+        if selector.accepts(user_id, score):
+            selector.offer(user_id, score, {
+                'partner_id': partner_id,
+                'partner_name': store.name_of(partner_id),
+                'sentiment_score': score,
+                'pair_id': pair['pair_id']
+            })
+
+def _select_matches(user_matches, store, scored_pairs, selector, all_pairs=None, pair_callback=None):
+    """
+    Stream scored pairs through the top-K selector and store each user's
+    matches. Pairs are also collected into `all_pairs` when a list is given
+    and passed to `pair_callback` as they are scored.
+    
+    The time spent selecting (not scoring, which happens inside the
+    `scored_pairs` generator, or in the callback) is recorded as the
+    match_assembly span.
+    """
+    assembly_seconds = 0.0
+    for pair in scored_pairs:
+        start = time.perf_counter()
+        _offer_pair(selector, store, pair)
+        if all_pairs is not None:
+            all_pairs.append(pair)
+        assembly_seconds += time.perf_counter() - start
+        if pair_callback:
+            pair_callback(pair)
+    start = time.perf_counter()
+    for user_id in selector.keys():
+        user_matches[user_id]['matches'] = selector.top(user_id)
+    span_seconds.observe(assembly_seconds + time.perf_counter() - start, span="match_assembly", outcome="ok")
+
+def run_analyze_sentiment(profiles, conversations, options, progress_callback=None, pair_callback=None,
+                          message_details=None):
+    """
+    Score every conversation and pick each user's top K matches (option
+    "top_k", default 3).
+    Returns {"results": user -> matches, "all_pairs": scored pairs best first,
+    "sentiment_cache": cache counters for this run}.
+    `profiles` may be a ProfileStore or a list of profile dicts.
+    
+    With the option "include_all_pairs": false, all_pairs is left out and
+    memory stays O(users x K) instead of O(pairs).
+    `pair_callback(pair)` sees each scored pair entry, in conversation order.
+    Pass a dict or a SentimentDetails as `message_details` to collect
+    per-message sentiment (see analyze_sentiment_batch).
+    """
+    store = ProfileStore.of(profiles)
+    
+    # Initialize user-match structure
+    user_matches = {}
+    for profile in store:
+        user_matches[profile.id] = {
+            'user': profile.to_dict(),
+            'matches': []
+        }
+    
+    cache_stats = {}
+    all_pairs = [] if options.get("include_all_pairs", True) else None
+    selector = TopKSelector(options.get("top_k", DEFAULT_TOP_K))
+    scored_pairs = _score_pairs(store, conversations, options, cache_stats, progress_callback, message_details)
+    _select_matches(user_matches, store, scored_pairs, selector, all_pairs, pair_callback)
+    
+    analysis = {
+        'results': user_matches,
+        'sentiment_cache': cache_stats
+    }
+    if all_pairs is not None:
+        # Sort by sentiment score (highest first); the sort is stable so ties keep conversation order
+        with span("rank_pairs"):
+            all_pairs.sort(key=lambda x: x['sentiment_score'], reverse=True)
+        analysis['all_pairs'] = all_pairs
+    return analysis
+
+def update_analysis(analysis, profiles, new_conversations, options, progress_callback=None, pair_callback=None,
+                    message_details=None, changes=None):
+    """
+    Fold newly simulated conversations into an existing run_analyze_sentiment
+    result in place: only the new pairs are scored, they are merged into
+    all_pairs, and the top K lists of the users involved are updated. The
+    result matches re-analyzing the old and new conversations together.
+    Pass a dict as `changes` to get the new pair entries ("pairs", best
+    first) and the ids of users whose results changed ("users").
+    """
+    store = ProfileStore.of(profiles)
+    user_matches = analysis['results']
+    previous = {user_id: data['matches'] for user_id, data in user_matches.items()}
+    for profile in store:
+        if profile.id not in user_matches:
+            user_matches[profile.id] = {
+                'user': profile.to_dict(),
+                'matches': []
+            }
+    
+    # Seed the selector with the current matches so they win ties against new pairs
+    selector = TopKSelector(options.get("top_k", DEFAULT_TOP_K))
+    for user_id, data in user_matches.items():
+        for match in data['matches']:
+            selector.offer(user_id, match['sentiment_score'], match)
+    
+    cache_stats = {}
+    keep_all_pairs = analysis.get('all_pairs') is not None
+    new_pairs = [] if keep_all_pairs or changes is not None else None
+    scored_pairs = _score_pairs(store, new_conversations, options, cache_stats, progress_callback, message_details)
+    _select_matches(user_matches, store, scored_pairs, selector, new_pairs, pair_callback)
+    
+    if new_pairs is not None:
+        # Linear merge of two best-first lists; existing pairs win ties like a stable sort would
+        with span("rank_pairs"):
+            new_pairs.sort(key=lambda x: x['sentiment_score'], reverse=True)
+            if keep_all_pairs:
+                analysis['all_pairs'] = list(heapq.merge(analysis['all_pairs'], new_pairs,
+                                                         key=lambda x: x['sentiment_score'], reverse=True))
+    if changes is not None:
+        changes['pairs'] = new_pairs
+        changes['users'] = [user_id for user_id, data in user_matches.items()
+                            if user_id not in previous or data['matches'] != previous[user_id]]
+    analysis['sentiment_cache'] = cache_stats
+    return analysis
+
+def run_match_scores(profiles, scores, options, pair_callback=None):
+    """
+    Pick each user's top K matches from pair scores computed earlier, given
+    as ((userA_id, userB_id), score) items, without scoring anything again
+    (e.g. to re-match an imported run with a different "top_k").
+    Returns the same shape as run_analyze_sentiment, without cache counters.
+    """
+    store = ProfileStore.of(profiles)
+    user_matches = {profile.id: {'user': profile.to_dict(), 'matches': []} for profile in store}
+    all_pairs = [] if options.get("include_all_pairs", True) else None
+    selector = TopKSelector(options.get("top_k", DEFAULT_TOP_K))
+    scored_pairs = ({
+        'userA_id': userA_id,
+        'userB_id': userB_id,
+        'userA_name': store.name_of(userA_id),
+        'userB_name': store.name_of(userB_id),
+        'sentiment_score': score,
+        'pair_id': pair_id(userA_id, userB_id)
+    } for (userA_id, userB_id), score in scores if store.get(userA_id) and store.get(userB_id))
+    _select_matches(user_matches, store, scored_pairs, selector, all_pairs, pair_callback)
+    
+    analysis = {'results': user_matches}
+    if all_pairs is not None:
+        with span("rank_pairs"):
+            all_pairs.sort(key=lambda x: x['sentiment_score'], reverse=True)
+        analysis['all_pairs'] = all_pairs
+    return analysis
+
+def analyze_in_chunks(profiles, conversation_items, options, chunk_size=DEFAULT_CHUNK_SIZE, progress_callback=None,
+                      pair_callback=None, analysis=None):
+    """
+    run_analyze_sentiment for a stream of ((userA_id, userB_id), messages)
+    items, scored `chunk_size` conversations at a time with update_analysis,
+    so only one chunk of conversations is in memory. The matches are the
+    same as scoring everything at once; with "include_all_pairs": false,
+    memory stays O(users x K) however long the stream is.
+    Pass an earlier result as `analysis` to continue it in place, e.g. one
+    rebuilt by run_match_scores from the scores saved before a crash.
+    """
+    store = ProfileStore.of(profiles)
+    if analysis is None:
+        analysis = {'results': {}, 'all_pairs': [] if options.get("include_all_pairs", True) else None}
+    cache_stats = {}
+    
+    def score_chunk(chunk):
+        update_analysis(analysis, store, chunk, options, progress_callback, pair_callback)
+        for key, value in analysis['sentiment_cache'].items():
+            if key != "hit_rate":
+                cache_stats[key] = cache_stats.get(key, 0) + value
+    
+    chunk = {}
+    for key, messages in conversation_items:
+        chunk[key] = messages
+        if len(chunk) >= chunk_size:
+            score_chunk(chunk)
+            chunk = {}
+    if chunk or not analysis['results']:
+        score_chunk(chunk)
+    
+    cache_stats["hit_rate"] = cache_stats["cache_hits"] / cache_stats["messages"] if cache_stats.get("messages") else 0.0
+    analysis['sentiment_cache'] = cache_stats
+    if analysis.get('all_pairs') is None:
+        analysis.pop('all_pairs', None)
+    return analysis
+
+def conversations_to_list(conversations):
+    """JSON-friendly form of a (userA_id, userB_id) -> messages dict"""
+    return [
+        {'userA_id': userA_id, 'userB_id': userB_id, 'messages': messages}
+        for (userA_id, userB_id), messages in conversations.items()
+    ]
+
+def conversations_from_list(items):
+    """Inverse of conversations_to_list"""
+    return {(item['userA_id'], item['userB_id']): item['messages'] for item in items}
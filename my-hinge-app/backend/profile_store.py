@@ -0,0 +1,112 @@
+# profile_store.py
+# Compact profile records with O(1) lookup by id and by name
+from dataclasses import dataclass, fields
+
+@dataclass(slots=True)
+class Profile:
+    """
+    One user profile. Supports the dict-style reads (profile['name'],
+    profile.get('age')) the rest of the backend uses; fields that were never
+    set behave like missing keys.
+    """
+    id: int
+    name: str
+    age: int = None
+    bio: str = None
+    interests: list = None
+    personality: str = None
+    prompt_answers: list = None
+    extra: dict = None  # keys outside the standard profile fields
+
+    @classmethod
+    def from_dict(cls, data):
+        known = {field.name for field in fields(cls)} - {"extra"}
+        extra = {key: value for key, value in data.items() if key not in known}
+        return cls(**{key: value for key, value in data.items() if key in known}, extra=extra or None)
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key, default=None):
+        if key != "extra" and key in PROFILE_FIELDS:
+            value = getattr(self, key)
+        else:
+            value = (self.extra or {}).get(key)
+        return default if value is None else value
+
+    def to_dict(self):
+        """Plain dict form for JSON responses, omitting unset fields"""
+        data = {key: getattr(self, key) for key in PROFILE_FIELDS if getattr(self, key) is not None}
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+PROFILE_FIELDS = tuple(field.name for field in fields(Profile) if field.name != "extra")
+
+class ProfileStore:
+    """
+    Ordered collection of Profiles indexed by id and by name. Iterating yields
+    profiles in insertion order, so it can stand in for the old list of dicts.
+    """
+    def __init__(self, profiles=()):
+        self.profiles = []
+        self.by_id = {}
+        self.by_name = {}
+        self.add(profiles)
+
+    @classmethod
+    def of(cls, profiles):
+        """`profiles` as a ProfileStore, wrapping a list of dicts if needed"""
+        return profiles if isinstance(profiles, cls) else cls(profiles or ())
+
+    def add(self, profiles):
+        """Append profiles (dicts or Profiles); returns the added Profiles"""
+        added = []
+        for profile in profiles:
+            if not isinstance(profile, Profile):
+                profile = Profile.from_dict(profile)
+            if profile.id in self.by_id:
+                raise ValueError(f"Duplicate profile id {profile.id}")
+            self.profiles.append(profile)
+            self.by_id[profile.id] = profile
+            self.by_name.setdefault(profile.name, profile)
+            added.append(profile)
+        return added
+
+    def get(self, profile_id):
+        return self.by_id.get(profile_id)
+
+    def get_by_name(self, name):
+        return self.by_name.get(name)
+
+    def name_of(self, profile_id):
+        """Display name for an id, with a placeholder for unknown users"""
+        profile = self.by_id.get(profile_id)
+        return profile.name if profile is not None else f"User {profile_id}"
+
+    def next_id(self):
+        return max(self.by_id) + 1 if self.by_id else 0
+
+    def copy(self):
+        return ProfileStore(self.profiles)
+
+    def to_list(self):
+        return [profile.to_dict() for profile in self.profiles]
+
+    def __contains__(self, profile_id):
+        return profile_id in self.by_id
+
+    def __iter__(self):
+        return iter(self.profiles)
+
+    def __len__(self):
+        return len(self.profiles)
+
+    def __bool__(self):
+        return bool(self.profiles)
@@ -1,9 +1,15 @@
 # profiles.py
 import random
-import openai
 import os
 import json
-from typing import List, Dict, Any
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Tuple
+from llm_client import get_default_client
+from metrics import timed, fallbacks
+
+logger = logging.getLogger(__name__)
 
 # Define the Hinge prompts
 HINGE_PROMPTS = [
@@ -48,17 +54,28 @@ PERSONALITY_PROMPTS = [
     "Refined aesthete with expensive taste and appreciation for luxury. Cultured and sophisticated with high standards. Knows quality and isn't afraid to be selective."
 ]
 
-def generate_prompt_answers(personality: str, selected_prompts: List[str]) -> List[Dict[str, str]]:
-    """Generate answers to Hinge prompts based on personality using OpenAI."""
-    try:
-        # Prepare the system prompt
-        system_prompt = """
+PROMPT_ANSWERS_SYSTEM_PROMPT = """
         You are creating dating profile answers for a dating app like Hinge.
         Create authentic, interesting responses based on the personality description provided.
         Keep responses relatively brief (1-3 sentences) and conversational, as if written by the user themselves.
         Make sure the answers reflect the personality traits described and feel like they come from the same person.
         Add subtle humor or authenticity where appropriate.
         """
+
+def _fallback_answers(selected_prompts: List[str]) -> List[Dict[str, str]]:
+    """Placeholder answers used when the API can't provide any"""
+    return [
+        {"prompt": selected_prompts[0], "answer": "I'll answer this soon!"},
+        {"prompt": selected_prompts[1], "answer": "Still thinking about this one..."},
+        {"prompt": selected_prompts[2], "answer": "Ask me about this!"}
+    ]
+
+@timed("generate_prompt_answers")
+def generate_prompt_answers(personality: str, selected_prompts: List[str], client=None) -> List[Dict[str, str]]:
+    """Generate answers to Hinge prompts based on personality using OpenAI."""
+    try:
+        # Prepare the system prompt
+        system_prompt = PROMPT_ANSWERS_SYSTEM_PROMPT
         
         # Prepare the user prompt
         user_prompt = f"""
@@ -72,8 +89,8 @@ def generate_prompt_answers(personality: str, selected_prompts: List[str]) -> Li
         Format your response as a JSON array of objects with 'prompt' and 'answer' fields.
         """
         
-        response = openai.chat.completions.create(
-            model="chatgpt-4o-latest",
+        client = client or get_default_client()
+        answer_text = client.chat(
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
@@ -82,9 +99,6 @@ def generate_prompt_answers(personality: str, selected_prompts: List[str]) -> Li
             temperature=0.7,
         )
         
-        # Extract and parse the response
-        answer_text = response.choices[0].message.content.strip()
-        
         # Try to extract JSON
         try:
             # Find JSON array in the text if it's not formatted perfectly
@@ -116,15 +130,79 @@ def generate_prompt_answers(personality: str, selected_prompts: List[str]) -> Li
             return fallback_answers
             
     except Exception as e:
-        print(f"Error generating prompt answers: {e}")
+        logger.warning("Error generating prompt answers: %s", e)
         # Provide fallback answers if OpenAI fails
-        return [
-            {"prompt": selected_prompts[0], "answer": "I'll answer this soon!"},
-            {"prompt": selected_prompts[1], "answer": "Still thinking about this one..."},
-            {"prompt": selected_prompts[2], "answer": "Ask me about this!"}
-        ]
+        fallbacks.inc(site="prompt_answers")
+        return _fallback_answers(selected_prompts)
 
-def generate_user_profiles(num_profiles=10):
+@timed("generate_prompt_answers", batched="true")
+def generate_prompt_answers_batch(requests: List[Tuple[str, List[str]]], client=None) -> List[List[Dict[str, str]]]:
+    """
+    Generate prompt answers for several profiles in a single completion.
+    
+    `requests` is a list of (personality, selected_prompts). The model is asked
+    for one JSON object keyed by profile number, which is split back into one
+    answer list per request. Profiles missing from the reply get fallback answers.
+    """
+    try:
+        profile_sections = []
+        for index, (personality, selected_prompts) in enumerate(requests):
+            prompt_lines = "\n".join(selected_prompts)
+            profile_sections.append(f"Profile {index}\nPersonality description: {personality}\nPrompts:\n{prompt_lines}")
+        
+        # Prepare the user prompt
+        sections = "\n\n".join(profile_sections)
+        user_prompt = f"""
+        Please write responses to the prompts for each of these {len(requests)} dating profiles.
+        Each profile is a different person, so keep their voices distinct.
+
+{sections}
+
+        Format your response as a JSON object whose keys are the profile numbers ("0", "1", ...)
+        and whose values are JSON arrays of objects with 'prompt' and 'answer' fields.
+        """
+        
+        client = client or get_default_client()
+        answer_text = client.chat(
+            messages=[
+                {"role": "system", "content": PROMPT_ANSWERS_SYSTEM_PROMPT},
+                {"role": "user", "content": user_prompt}
+            ],
+            max_tokens=500 * len(requests),
+            temperature=0.7,
+        )
+        
+        # Find the JSON object in the text if it's not formatted perfectly
+        start_idx = answer_text.find('{')
+        end_idx = answer_text.rfind('}') + 1
+        parsed = json.loads(answer_text[start_idx:end_idx]) if start_idx >= 0 and end_idx > start_idx else {}
+    except Exception as e:
+        logger.warning("Error generating batched prompt answers: %s", e)
+        parsed = {}
+    
+    results = []
+    for index, (_, selected_prompts) in enumerate(requests):
+        answers = parsed.get(str(index)) if isinstance(parsed, dict) else None
+        if isinstance(answers, list) and answers and all(isinstance(a, dict) and "answer" in a for a in answers):
+            results.append(answers)
+        else:
+            fallbacks.inc(site="prompt_answers")
+            results.append(_fallback_answers(selected_prompts))
+    return results
+
+def generate_user_profiles(num_profiles=10, concurrency=None, batch_size=1, client=None, progress_callback=None, start_id=0,
+                           local_answers=False):
+    """
+    Generate `num_profiles` profiles with ids start_id..start_id+num_profiles-1.
+    
+    Prompt answers are generated in parallel (up to `concurrency` requests,
+    defaulting to the LLM client's limit). With batch_size > 1 each request
+    asks for the answers of several profiles at once. `progress_callback(done, total)`
+    is called as profiles get their answers.
+    
+    With `local_answers`, the answers come from the seeded templates in
+    local_generator.py instead of the LLM.
+    """
     names = ["Alex", "Sam", "Jordan", "Taylor", "Casey", "Morgan", "Drew", "Jesse", "Quinn", "Dana"]
     bios = [
         "Love traveling and cooking", 
@@ -142,8 +220,6 @@ def generate_user_profiles(num_profiles=10):
         "Volunteering", "Astronomy", "Gardening", "Podcasts"
     ]
     
-    profiles = []
-    
     # Ensure we don't run out of personalities if num_profiles > len(PERSONALITY_PROMPTS)
     personalities = PERSONALITY_PROMPTS.copy()
     if num_profiles > len(personalities):
@@ -154,7 +230,11 @@ def generate_user_profiles(num_profiles=10):
     # Shuffle personalities to ensure variety
     random.shuffle(personalities)
     
-    for i in range(num_profiles):
+    # Draw every random choice up front, in id order, so the profiles are the
+    # same for a given random seed however the answers are generated
+    profiles = []
+    prompt_requests = []
+    for i in range(start_id, start_id + num_profiles):
         # Randomly select 3-5 interests for each user
         user_interests = random.sample(interests_pool, random.randint(3, 5))
         
@@ -164,9 +244,6 @@ def generate_user_profiles(num_profiles=10):
         # Select 3 random prompts from the list
         selected_prompts = random.sample(HINGE_PROMPTS, 3)
         
-        # Generate answers to the prompts
-        prompt_answers = generate_prompt_answers(personality, selected_prompts)
-        
         profile = {
             'id': i,
             'name': names[i % len(names)] + str(i),
@@ -174,8 +251,46 @@ def generate_user_profiles(num_profiles=10):
             'bio': random.choice(bios),
             'interests': user_interests,
             'personality': personality,
-            'prompt_answers': prompt_answers
+            'prompt_answers': None
         }
         profiles.append(profile)
+        prompt_requests.append((personality, selected_prompts))
+    
+    if local_answers:
+        from local_generator import local_prompt_answers
+        for profile, (personality, selected_prompts) in zip(profiles, prompt_requests):
+            profile['prompt_answers'] = local_prompt_answers(personality, selected_prompts, profile['interests'],
+                                                             profile_id=profile['id'])
+        if progress_callback:
+            progress_callback(num_profiles, num_profiles)
+        return profiles
+    
+    # Generate answers to the prompts, `batch_size` profiles per completion
+    # and up to `concurrency` completions at once
+    client = client or get_default_client()
+    batch_size = max(1, batch_size)
+    batches = [prompt_requests[i:i + batch_size] for i in range(0, len(prompt_requests), batch_size)]
+    
+    completed = [0]
+    completed_lock = threading.Lock()
+    
+    def answer_batch(batch):
+        if len(batch) == 1:
+            personality, selected_prompts = batch[0]
+            answers = [generate_prompt_answers(personality, selected_prompts, client=client)]
+        else:
+            answers = generate_prompt_answers_batch(batch, client=client)
+        if progress_callback:
+            with completed_lock:
+                completed[0] += len(batch)
+                progress_callback(completed[0], num_profiles)
+        return answers
+    
+    with ThreadPoolExecutor(max_workers=max(1, concurrency or client.concurrency)) as executor:
+        answered = [answers for batch_answers in executor.map(answer_batch, batches) for answers in batch_answers]
+    
+    # executor.map keeps batch order, so answers line up with profile ids
+    for profile, prompt_answers in zip(profiles, answered):
+        profile['prompt_answers'] = prompt_answers
     
-    return profiles 
\ No newline at end of file
+    return profiles
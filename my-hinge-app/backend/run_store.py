@@ -0,0 +1,394 @@
+# run_store.py
+# Persistent storage of pipeline runs: profiles, conversations and sentiment scores
+import json
+import os
+import sqlite3
+import threading
+import time
+
+RUN_STATUSES = ("profiles", "simulating", "simulated", "analyzed")
+
+# Who started a run: the app's current state, or an independent /api/jobs job
+# (never loaded as the current run)
+RUN_SOURCES = ("app", "job")
+
+# Tables derived from a run's conversations by sentiment analysis
+ANALYSIS_TABLES = ("pair_scores", "message_sentiment", "results")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    status TEXT NOT NULL,
+    options TEXT NOT NULL,
+    source TEXT NOT NULL DEFAULT 'app',
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS profiles (
+    run_id INTEGER NOT NULL,
+    profile_id INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (run_id, profile_id)
+);
+CREATE TABLE IF NOT EXISTS conversations (
+    run_id INTEGER NOT NULL,
+    userA_id INTEGER NOT NULL,
+    userB_id INTEGER NOT NULL,
+    messages TEXT NOT NULL,
+    position INTEGER,
+    PRIMARY KEY (run_id, userA_id, userB_id)
+);
+CREATE TABLE IF NOT EXISTS pair_scores (
+    run_id INTEGER NOT NULL,
+    userA_id INTEGER NOT NULL,
+    userB_id INTEGER NOT NULL,
+    sentiment_score REAL NOT NULL,
+    PRIMARY KEY (run_id, userA_id, userB_id)
+);
+CREATE TABLE IF NOT EXISTS message_sentiment (
+    run_id INTEGER NOT NULL,
+    userA_id INTEGER NOT NULL,
+    userB_id INTEGER NOT NULL,
+    message_index INTEGER NOT NULL,
+    speaker TEXT NOT NULL,
+    polarity REAL NOT NULL,
+    subjectivity REAL NOT NULL,
+    PRIMARY KEY (run_id, userA_id, userB_id, message_index)
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (run_id, user_id)
+);
+"""
+
+class RunStore:
+    """
+    SQLite store of pipeline runs (WAL mode, one connection shared under a
+    lock). Rows are written with executemany in a single transaction per
+    call, so batches of thousands of conversations commit at once.
+
+    Conversations are read back in the order recorded by
+    set_conversation_order (then insertion order), and pair scores in
+    insertion order, since that order decides ties when matches are selected.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        # WAL with synchronous=NORMAL is durable across process crashes and much faster to commit
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(runs)")]
+        if "source" not in columns:
+            # Databases created before runs had a source
+            self.connection.execute("ALTER TABLE runs ADD COLUMN source TEXT NOT NULL DEFAULT 'app'")
+        self.connection.commit()
+
+    def _write(self, statements):
+        """Run (sql, rows) pairs in one transaction"""
+        with self.lock:
+            with self.connection:
+                for sql, rows in statements:
+                    self.connection.executemany(sql, rows)
+
+    def _query(self, sql, params=()):
+        with self.lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    def _iter_query(self, sql, params=(), batch_size=1000):
+        """
+        Yield rows `batch_size` at a time from a separate read connection, so
+        a large export neither holds every row nor blocks writers (WAL).
+        """
+        connection = sqlite3.connect(self.path)
+        try:
+            cursor = connection.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            connection.close()
+
+    # Runs
+
+    def create_run(self, options=None, status="profiles", source="app"):
+        """Start a new run (see RUN_SOURCES) and return its id"""
+        if source not in RUN_SOURCES:
+            raise ValueError(f"Unknown run source '{source}'. Expected one of: {', '.join(RUN_SOURCES)}")
+        now = time.time()
+        with self.lock:
+            with self.connection:
+                cursor = self.connection.execute(
+                    "INSERT INTO runs (status, options, source, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    (status, json.dumps(options or {}), source, now, now)
+                )
+        return cursor.lastrowid
+
+    def set_status(self, run_id, status):
+        self._write([("UPDATE runs SET status = ?, updated_at = ? WHERE id = ?", [(status, time.time(), run_id)])])
+
+    def _run_dict(self, row):
+        run_id, status, options, source, created_at, updated_at = row
+        return {"run_id": run_id, "status": status, "options": json.loads(options), "source": source,
+                "created_at": created_at, "updated_at": updated_at}
+
+    def get_run(self, run_id):
+        """Run metadata with row counts, or None"""
+        rows = self._query("SELECT id, status, options, source, created_at, updated_at FROM runs WHERE id = ?", (run_id,))
+        if not rows:
+            return None
+        run = self._run_dict(rows[0])
+        for table in ("profiles", "conversations", "pair_scores"):
+            run[f"num_{table}"] = self._query(f"SELECT COUNT(*) FROM {table} WHERE run_id = ?", (run_id,))[0][0]
+        return run
+
+    def list_runs(self):
+        rows = self._query("SELECT id, status, options, source, created_at, updated_at FROM runs ORDER BY id")
+        return [self._run_dict(row) for row in rows]
+
+    def latest_run_id(self, source="app"):
+        """Id of the most recent run started by `source` (None for any), or None"""
+        if source is None:
+            rows = self._query("SELECT MAX(id) FROM runs")
+        else:
+            rows = self._query("SELECT MAX(id) FROM runs WHERE source = ?", (source,))
+        return rows[0][0]
+
+    def _clear_statements(self, run_id, tables):
+        return [(f"DELETE FROM {table} WHERE run_id = ?", [(run_id,)]) for table in tables]
+
+    def clear_conversations(self, run_id):
+        """Drop a run's conversations and everything scored from them"""
+        self._write(self._clear_statements(run_id, ("conversations",) + ANALYSIS_TABLES))
+
+    def clear_analysis(self, run_id):
+        """Drop a run's scores and results, e.g. when its conversations change"""
+        self._write(self._clear_statements(run_id, ANALYSIS_TABLES))
+
+    def delete_run(self, run_id):
+        self._write(self._clear_statements(run_id, ("profiles", "conversations") + ANALYSIS_TABLES) +
+                    [("DELETE FROM runs WHERE id = ?", [(run_id,)])])
+
+    # Profiles
+
+    def save_profiles(self, run_id, profiles):
+        """Insert or replace profiles (dicts or Profile records)"""
+        rows = []
+        for profile in profiles:
+            data = profile.to_dict() if hasattr(profile, "to_dict") else profile
+            rows.append((run_id, data["id"], json.dumps(data)))
+        self._write([("INSERT OR REPLACE INTO profiles (run_id, profile_id, data) VALUES (?, ?, ?)", rows)])
+
+    def load_profiles(self, run_id):
+        rows = self._query("SELECT data FROM profiles WHERE run_id = ? ORDER BY profile_id", (run_id,))
+        return [json.loads(data) for data, in rows]
+
+    # Conversations
+
+    def save_conversations(self, run_id, conversations):
+        """Insert or update a (userA_id, userB_id) -> messages dict (or iterable of such items)"""
+        items = conversations.items() if isinstance(conversations, dict) else conversations
+        rows = [(run_id, userA_id, userB_id, json.dumps(messages)) for (userA_id, userB_id), messages in items]
+        # Upsert keeps an existing row's position in insertion order
+        self._write([(
+            "INSERT INTO conversations (run_id, userA_id, userB_id, messages) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (run_id, userA_id, userB_id) DO UPDATE SET messages = excluded.messages",
+            rows
+        )])
+
+    def set_conversation_order(self, run_id, keys, first_position=0):
+        """Record the order of a run's conversations, given their (userA_id, userB_id) keys"""
+        self._write([(
+            "UPDATE conversations SET position = ? WHERE run_id = ? AND userA_id = ? AND userB_id = ?",
+            [(position, run_id, userA_id, userB_id) for position, (userA_id, userB_id) in enumerate(keys, first_position)]
+        )])
+
+    def load_conversations(self, run_id):
+        # Conversations from an interrupted simulation have no position yet and come last
+        rows = self._query(
+            "SELECT userA_id, userB_id, messages FROM conversations WHERE run_id = ? "
+            "ORDER BY position IS NULL, position, rowid", (run_id,))
+        return {(userA_id, userB_id): json.loads(messages) for userA_id, userB_id, messages in rows}
+
+    def iter_conversations(self, run_id, batch_size=1000):
+        """((userA_id, userB_id), messages) items in load_conversations order, read in batches"""
+        rows = self._iter_query(
+            "SELECT userA_id, userB_id, messages FROM conversations WHERE run_id = ? "
+            "ORDER BY position IS NULL, position, rowid", (run_id,), batch_size)
+        for userA_id, userB_id, messages in rows:
+            yield (userA_id, userB_id), json.loads(messages)
+
+    def get_conversation(self, run_id, userA_id, userB_id):
+        """Messages for a pair in either order, or None"""
+        rows = self._query(
+            "SELECT messages FROM conversations WHERE run_id = ? AND "
+            "((userA_id = ? AND userB_id = ?) OR (userA_id = ? AND userB_id = ?))",
+            (run_id, userA_id, userB_id, userB_id, userA_id)
+        )
+        return json.loads(rows[0][0]) if rows else None
+
+    def conversation_writer(self, run_id, batch_size=500):
+        """Buffered writer for conversations that arrive one at a time"""
+        return ConversationWriter(self, run_id, batch_size)
+
+    # Scores and results
+
+    def _score_statements(self, run_id, pairs, message_details=None):
+        statements = [(
+            "INSERT OR REPLACE INTO pair_scores (run_id, userA_id, userB_id, sentiment_score) VALUES (?, ?, ?, ?)",
+            [(run_id, pair['userA_id'], pair['userB_id'], pair['sentiment_score']) for pair in pairs]
+        )]
+        if message_details:
+            statements.append((
+                "INSERT OR REPLACE INTO message_sentiment "
+                "(run_id, userA_id, userB_id, message_index, speaker, polarity, subjectivity) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(run_id, userA_id, userB_id, index, speaker, polarity, subjectivity)
+                 for (userA_id, userB_id), messages in message_details.items()
+                 for index, (speaker, polarity, subjectivity) in enumerate(messages)]
+            ))
+        return statements
+
+    def save_scores(self, run_id, pairs, message_details=None):
+        """
+        Store scored pair entries and, optionally, per-message sentiment as
+        (userA_id, userB_id) -> [(speaker, polarity, subjectivity), ...]
+        or a SentimentDetails
+        """
+        self._write(self._score_statements(run_id, pairs, message_details))
+
+    def load_scores(self, run_id):
+        """(userA_id, userB_id) -> sentiment score, in insertion order"""
+        rows = self._query(
+            "SELECT userA_id, userB_id, sentiment_score FROM pair_scores WHERE run_id = ? ORDER BY rowid", (run_id,))
+        return {(userA_id, userB_id): score for userA_id, userB_id, score in rows}
+
+    def iter_scores(self, run_id, batch_size=1000, conversation_order=False):
+        """
+        ((userA_id, userB_id), score) items in insertion order, read in
+        batches. With conversation_order, they come in iter_conversations
+        order instead, which is the order they were scored in, so re-matching
+        them breaks ties the same way as the original scoring.
+        """
+        if conversation_order:
+            sql = ("SELECT s.userA_id, s.userB_id, s.sentiment_score FROM pair_scores s "
+                   "LEFT JOIN conversations c ON c.run_id = s.run_id AND c.userA_id = s.userA_id AND c.userB_id = s.userB_id "
+                   "WHERE s.run_id = ? ORDER BY c.rowid IS NULL, c.position IS NULL, c.position, c.rowid, s.rowid")
+        else:
+            sql = "SELECT userA_id, userB_id, sentiment_score FROM pair_scores WHERE run_id = ? ORDER BY rowid"
+        rows = self._iter_query(sql, (run_id,), batch_size)
+        for userA_id, userB_id, score in rows:
+            yield (userA_id, userB_id), score
+
+    def load_message_sentiment(self, run_id, userA_id, userB_id):
+        rows = self._query(
+            "SELECT speaker, polarity, subjectivity FROM message_sentiment "
+            "WHERE run_id = ? AND userA_id = ? AND userB_id = ? ORDER BY message_index",
+            (run_id, userA_id, userB_id)
+        )
+        return [tuple(row) for row in rows]
+
+    def _results_statements(self, run_id, results, replace=True):
+        statements = [("DELETE FROM results WHERE run_id = ?", [(run_id,)])] if replace else []
+        statements.append(("INSERT OR REPLACE INTO results (run_id, user_id, data) VALUES (?, ?, ?)",
+                           [(run_id, user_id, json.dumps(data)) for user_id, data in results.items()]))
+        return statements
+
+    def save_results(self, run_id, results):
+        """Store each user's selected matches, replacing the run's previous results"""
+        self._write(self._results_statements(run_id, results))
+
+    def load_results(self, run_id):
+        rows = self._query("SELECT user_id, data FROM results WHERE run_id = ? ORDER BY user_id", (run_id,))
+        return {user_id: json.loads(data) for user_id, data in rows}
+
+    def save_analysis(self, run_id, analysis, message_details=None, changes=None):
+        """
+        Store a run_analyze_sentiment result in one transaction; all_pairs is
+        stored as pair scores. For an incremental update, pass the `changes`
+        that update_analysis filled in: only the new pairs and their message
+        sentiment are added and only the changed users' results rewritten.
+        """
+        if changes is None:
+            statements = self._clear_statements(run_id, ANALYSIS_TABLES)
+            statements += self._score_statements(run_id, analysis.get('all_pairs') or [], message_details)
+            statements += self._results_statements(run_id, analysis['results'])
+        else:
+            # New pairs rank after stored ones on equal scores, as in update_analysis's merge
+            statements = self._score_statements(run_id, changes['pairs'], message_details)
+            statements += self._results_statements(
+                run_id, {user_id: analysis['results'][user_id] for user_id in changes['users']}, replace=False)
+        statements.append(("UPDATE runs SET status = ?, updated_at = ? WHERE id = ?", [("analyzed", time.time(), run_id)]))
+        self._write(statements)
+
+    def load_analysis(self, run_id):
+        """Rebuild a stored analysis ({'results', 'all_pairs'}), or None if the run wasn't analyzed"""
+        results = self.load_results(run_id)
+        if not results:
+            return None
+        names = {user_id: data['user'].get('name') for user_id, data in results.items()}
+        all_pairs = [{
+            'userA_id': userA_id,
+            'userB_id': userB_id,
+            'userA_name': names.get(userA_id),
+            'userB_name': names.get(userB_id),
+            'sentiment_score': score,
+            'pair_id': f"{userA_id}-{userB_id}"
+        } for (userA_id, userB_id), score in self.load_scores(run_id).items()]
+        # Stored in best-first order already; the stable sort only guards against partial writes
+        all_pairs.sort(key=lambda x: x['sentiment_score'], reverse=True)
+        return {'results': results, 'all_pairs': all_pairs}
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+class ConversationWriter:
+    """
+    Collects conversations and writes them in batches, so a long simulation
+    persists its progress without one transaction per conversation.
+    Thread-safe; call flush() (or use it as a context manager) at the end.
+    """
+    def __init__(self, store, run_id, batch_size=500):
+        self.store = store
+        self.run_id = run_id
+        self.batch_size = batch_size
+        self.pending = []
+        self.lock = threading.Lock()
+
+    def add(self, pair, messages):
+        with self.lock:
+            self.pending.append((pair, messages))
+            if len(self.pending) < self.batch_size:
+                return
+            batch, self.pending = self.pending, []
+        self.store.save_conversations(self.run_id, batch)
+
+    def flush(self):
+        with self.lock:
+            batch, self.pending = self.pending, []
+        if batch:
+            self.store.save_conversations(self.run_id, batch)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+def run_store_from_env():
+    """
+    The run store at RUN_STORE_PATH (default data/runs.db next to this
+    file), or None when RUN_STORE is set to "off"
+    """
+    if os.environ.get("RUN_STORE", "on").lower() in ("0", "off", "false", "no"):
+        return None
+    path = os.environ.get("RUN_STORE_PATH") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "runs.db")
+    return RunStore(path)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# sample_data.py - Profile and conversation factories shared by the tests
+
+import random
+from local_generator import simulate_conversation_local
+from profiles import generate_user_profiles, PERSONALITY_PROMPTS
+
+INTERESTS = ["hiking", "cooking", "reading", "travel", "music", "art", "yoga", "gaming", "film", "running"]
+
+LINES = [
+    "I love that, sounds amazing!",
+    "Hmm, not sure about that.",
+    "That was a terrible idea honestly.",
+    "Cool.",
+    "We should definitely hang out, this is great",
+    "Boring, but okay",
+]
+
+def make_profiles(count, start=0, seed=3):
+    """
+    Minimal profiles with ids start..start+count-1 and the fields the prompts
+    and candidate scoring read. A profile's fields depend only on its id and
+    the seed, so profiles made in several calls match those made in one.
+    """
+    profiles = []
+    for i in range(start, start + count):
+        rng = random.Random(seed * 1000003 + i)
+        profiles.append({
+            'id': i,
+            'name': f"User{i}",
+            'age': rng.randint(21, 45),
+            'bio': "Just here to meet people",
+            'personality': rng.choice(PERSONALITY_PROMPTS),
+            'interests': rng.sample(INTERESTS, 4)
+        })
+    return profiles
+
+def make_conversations(pairs, rng=None, turns=4):
+    """Short conversations for (userA, userB) profile pairs; the small line pool produces plenty of tied scores"""
+    rng = rng or random.Random(0)
+    return {
+        (userA['id'], userB['id']): [
+            f"{(userA if turn % 2 == 0 else userB)['name']}: {rng.choice(LINES)}" for turn in range(turns)
+        ]
+        for userA, userB in pairs
+    }
+
+def local_profiles(num_profiles, seed=0):
+    """Full profiles from the seeded local generator"""
+    random.seed(seed)
+    return generate_user_profiles(num_profiles=num_profiles, local_answers=True)
+
+def sample_run(num_profiles=10, seed=0):
+    """Local profiles and a locally written conversation for every pair; returns (profiles, conversations)"""
+    profiles = local_profiles(num_profiles, seed)
+    conversations = {(a['id'], b['id']): simulate_conversation_local(a, b)
+                     for i, a in enumerate(profiles) for b in profiles[i + 1:]}
+    return profiles, conversations
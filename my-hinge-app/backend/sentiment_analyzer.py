@@ -1,88 +1,340 @@
 # sentiment_analyzer.py
-import spacy
-from spacy.tokens import Doc, Span
-from spacytextblob.spacytextblob import SpacyTextBlob
+# spaCy and spacytextblob are imported by load_nlp(), so importing this
+# module stays cheap until a model is actually needed
+import numpy as np
 import re
+import os
+import logging
+import threading
+import time
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from metrics import registry, span, sentiment_cache_lookups
+from sentiment_details import SentimentDetails
+
+logger = logging.getLogger(__name__)
+
+sentiment_messages = registry.counter("hinge_sentiment_messages_total",
+                                      "Messages scored for sentiment, by source (cache or nlp)")
 
 # Load spaCy model
 nlp = None
+nlp_mode = None
+_nlp_lock = threading.Lock()
 
-def initialize_nlp():
-    """Initialize spaCy model with spacytextblob extension"""
-    global nlp
-    try:
-        # Check if the model is already loaded
-        if nlp is None:
-            nlp = spacy.load("en_core_web_sm")
-            # Add the TextBlob sentiment component
-            if "spacytextblob" not in nlp.pipe_names:
-                nlp.add_pipe("spacytextblob")
-            print("NLP model loaded successfully")
-    except Exception as e:
-        print(f"Error loading spaCy model: {e}")
-        print("Please make sure you have downloaded the model with:")
-        print("python -m spacy download en_core_web_sm")
-
-def analyze_sentiment(conversation):
+# Loading progress of the shared pipeline, for readiness checks:
+# state is "cold", "loading", "ready" or "failed"
+nlp_status = {"state": "cold", "mode": None, "error": None, "load_seconds": None}
+
+# Pipeline modes:
+#   "full" - en_core_web_sm with every component plus spacytextblob
+#   "lean" - tokenizer-only English pipeline feeding spacytextblob. Sentiment
+#            only reads doc._.blob, which TextBlob computes from the raw text,
+#            so scores are identical without loading tagger/parser/NER.
+NLP_MODES = ("full", "lean")
+DEFAULT_NLP_MODE = os.environ.get("NLP_MODE", "full")
+
+# Defaults for nlp.pipe() when scoring conversations in bulk
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_N_PROCESS = 1
+
+# Worker processes that score distinct message texts in parallel; 1 scores in-process
+DEFAULT_SCORING_WORKERS = int(os.environ.get("SENTIMENT_WORKERS", 1))
+
+class SentimentCache:
     """
-    Returns an average polarity for the entire conversation.
-    Polarity range: -1.0 (most negative) to +1.0 (most positive).
-    Also includes detailed sentiment breakdown by user and message.
+    Bounded LRU of normalized message text -> (polarity, subjectivity).
+    
+    With mask_names on, the speakers' names inside a message are replaced by a
+    placeholder before lookup (and scoring), so "Hey Alex0, how's it going?"
+    and "Hey Sam3, how's it going?" share one entry. Names are not in the
+    sentiment lexicon, so masking only changes a score when a name is itself
+    a sentiment word (e.g. "Joy").
     """
-    # Make sure NLP is initialized
-    initialize_nlp()
+    NAME_PLACEHOLDER = "NAME"
+
+    def __init__(self, max_entries=50000, mask_names=False):
+        self.max_entries = max_entries
+        self.mask_names = mask_names
+        self.entries = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0}
+        self.lock = threading.Lock()
+
+    def key(self, content, names=()):
+        """Normalized (and optionally name-masked) text used as cache key and scored"""
+        text = " ".join(content.split())
+        if self.mask_names:
+            for name in names:
+                text = re.sub(rf"\b{re.escape(name)}\b", self.NAME_PLACEHOLDER, text)
+        return text
+
+    def get(self, key):
+        with self.lock:
+            scores = self.entries.get(key)
+            if scores is None:
+                self.stats["misses"] += 1
+            else:
+                self.entries.move_to_end(key)
+                self.stats["hits"] += 1
+        sentiment_cache_lookups.inc(result="miss" if scores is None else "hit")
+        return scores
+
+    def set(self, key, scores):
+        if self.max_entries <= 0:
+            return
+        with self.lock:
+            self.entries[key] = scores
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.stats = {"hits": 0, "misses": 0}
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats, entries=len(self.entries), max_entries=self.max_entries, mask_names=self.mask_names)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+# Shared per-message score cache, sized by SENTIMENT_CACHE_SIZE (0 disables it)
+sentiment_cache = SentimentCache(
+    max_entries=int(os.environ.get("SENTIMENT_CACHE_SIZE", 50000)),
+    mask_names=os.environ.get("SENTIMENT_CACHE_MASK_NAMES", "false").lower() in ("1", "true", "yes", "on")
+)
+
+def load_nlp(mode="full"):
+    """Build a spaCy pipeline for the given mode with the spacytextblob component added"""
+    if mode not in NLP_MODES:
+        raise ValueError(f"Unknown NLP mode '{mode}'. Expected one of: {', '.join(NLP_MODES)}")
+    
+    import spacy
+    # Registers the "spacytextblob" pipeline factory
+    import spacytextblob.spacytextblob  # noqa: F401
+    
+    if mode == "lean":
+        pipeline = spacy.blank("en")
+    else:
+        pipeline = spacy.load("en_core_web_sm")
+    
+    # Add the TextBlob sentiment component
+    if "spacytextblob" not in pipeline.pipe_names:
+        pipeline.add_pipe("spacytextblob")
+    return pipeline
+
+def initialize_nlp(mode=None):
+    """
+    Initialize spaCy model with spacytextblob extension.
     
+    Safe to call from several threads: one caller loads the model while the
+    others wait for it, e.g. a request arriving during the startup warm-up.
+    """
+    global nlp, nlp_mode
+    mode = mode or nlp_mode or DEFAULT_NLP_MODE
+    if nlp is not None and nlp_mode == mode:
+        return
+    with _nlp_lock:
+        # Check if the model is already loaded in the requested mode
+        if nlp is not None and nlp_mode == mode:
+            return
+        nlp_status.update(state="loading", mode=mode, error=None)
+        start = time.perf_counter()
+        try:
+            nlp = load_nlp(mode)
+            nlp_mode = mode
+            nlp_status.update(state="ready", load_seconds=round(time.perf_counter() - start, 3))
+            logger.info("NLP model loaded successfully (%s mode) in %.2fs", mode, nlp_status["load_seconds"])
+        except Exception as e:
+            nlp_status.update(state="failed", error=str(e))
+            logger.error("Error loading spaCy model: %s", e)
+            if mode == "full":
+                logger.error("Please make sure you have downloaded the model with: python -m spacy download en_core_web_sm "
+                             "(or set NLP_MODE=lean to use the tokenizer-only pipeline)")
+
+def start_nlp_warmup(mode=None):
+    """Load the model on a background thread so startup doesn't wait for it; returns the thread"""
+    thread = threading.Thread(target=initialize_nlp, args=(mode,), name="nlp-warmup", daemon=True)
+    thread.start()
+    return thread
+
+def get_nlp_status():
+    return dict(nlp_status)
+
+def _split_message(message):
+    """Split a "Name: text" message into (name, content), or None if malformed/empty"""
+    name_end = message.find(':')
+    if name_end <= 0:
+        return None
+        
+    name = message[:name_end].strip()
+    content = message[name_end+1:].strip()
+    
+    # Skip empty messages
+    if not content:
+        return None
+    return name, content
+
+def _doc_sentiment(doc, content):
+    """Read (polarity, subjectivity) from a processed spaCy doc"""
+    # In spacytextblob, blob property contains TextBlob object
+    try:
+        return doc._.blob.polarity, doc._.blob.subjectivity
+    except AttributeError:
+        # Fallback if attributes aren't available
+        logger.warning("Unable to access sentiment attributes for message: %s", content)
+        return 0, 0.5
+
+def _pipe_docs(texts, batch_size=DEFAULT_BATCH_SIZE, n_process=DEFAULT_N_PROCESS):
+    """Stream texts through the pipeline, yielding docs in order"""
+    if n_process > 1 and "spacytextblob" in nlp.pipe_names:
+        # TextBlob objects can't be serialized back from worker processes, so the
+        # workers run the rest of the pipeline and the blob is attached here
+        textblob_pipe = nlp.get_pipe("spacytextblob")
+        return (textblob_pipe(doc) for doc in nlp.pipe(texts, batch_size=batch_size, n_process=n_process, disable=["spacytextblob"]))
+    return nlp.pipe(texts, batch_size=batch_size, n_process=n_process)
+
+# Process pool shared by every analysis; workers keep their model between runs
+_scoring_pool = None
+_scoring_pool_lock = threading.Lock()
+
+def _init_scoring_worker():
+    """
+    Process pool initializer: keep a pipeline inherited from the parent, or
+    load the lean one (sentiment scores are the same in either mode)
+    """
     if nlp is None:
-        print("Warning: NLP model not initialized. Returning neutral sentiment.")
-        return 0.0
+        initialize_nlp("lean")
+
+def _score_texts(texts):
+    """Score a chunk of texts in a worker, returning (polarity, subjectivity) tuples"""
+    return [_doc_sentiment(doc, text) for text, doc in zip(texts, nlp.pipe(texts, batch_size=len(texts)))]
+
+def _create_scoring_pool(workers, method):
+    global _scoring_pool
+    _scoring_pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context(method),
+        initializer=_init_scoring_worker
+    )
+    logger.info("Started %d sentiment scoring workers (%s)", workers, method)
+    return _scoring_pool
+
+def start_scoring_pool(workers=DEFAULT_SCORING_WORKERS):
+    """
+    Create the shared scoring pool and start its workers now. Call it from
+    the main thread before any other thread starts (ideally after
+    initialize_nlp): the workers are then forked, sharing a loaded model's
+    pages copy-on-write, without inheriting locks held by other threads.
+    """
+    with _scoring_pool_lock:
+        if _scoring_pool is not None:
+            return _scoring_pool
+        method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        pool = _create_scoring_pool(workers, method)
+    # A fork pool starts all its workers on the first task
+    pool.submit(int).result()
+    return pool
+
+def get_scoring_pool(workers):
+    """
+    Return the shared scoring pool, creating it with `workers` processes if
+    start_scoring_pool didn't. A pool created here (on a request or job
+    thread, say) never forks this multi-threaded process: its workers come
+    from a fork server, or are spawned, and load the lean pipeline.
+    """
+    with _scoring_pool_lock:
+        if _scoring_pool is not None:
+            return _scoring_pool
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        return _create_scoring_pool(workers, method)
+
+def shutdown_scoring_pool():
+    """Stop the shared scoring pool's worker processes"""
+    global _scoring_pool
+    with _scoring_pool_lock:
+        if _scoring_pool is not None:
+            _scoring_pool.shutdown()
+        _scoring_pool = None
+
+def _text_scores(texts, batch_size=DEFAULT_BATCH_SIZE, n_process=DEFAULT_N_PROCESS, workers=DEFAULT_SCORING_WORKERS):
+    """
+    Yield (polarity, subjectivity) for each text, in order.
     
-    # Lists to store message-level detail
-    message_details = []
+    With several workers the texts are cut into `batch_size` chunks that are
+    scored by the process pool; executor.map returns chunks in submission
+    order, so the merged scores are the same as scoring in-process.
+    """
+    if workers <= 1 or len(texts) <= batch_size:
+        for text, doc in zip(texts, _pipe_docs(texts, batch_size=batch_size, n_process=n_process)):
+            yield _doc_sentiment(doc, text)
+        return
     
-    # Track each user's sentiment separately
-    user_polarities = {}
+    chunks = [texts[start:start + batch_size] for start in range(0, len(texts), batch_size)]
+    for chunk_scores in get_scoring_pool(workers).map(_score_texts, chunks):
+        yield from chunk_scores
+
+def _score_messages(messages, batch_size=DEFAULT_BATCH_SIZE, n_process=DEFAULT_N_PROCESS, stats=None, progress_callback=None,
+                    workers=DEFAULT_SCORING_WORKERS):
+    """
+    Score a list of (content, speaker_names) through the sentiment cache.
     
-    # Extract user names from conversation
-    users = set()
-    for message in conversation:
-        name_end = message.find(':')
-        if name_end > 0:
-            name = message[:name_end].strip()
-            users.add(name)
+    Only texts that are neither cached nor repeated earlier in the list go
+    through the pipeline. Returns one (polarity, subjectivity) per message and,
+    if `stats` is a dict, adds this run's cache counters to it.
+    `progress_callback(done, total)` is called after every `batch_size` texts scored.
+    With `workers` > 1 the texts are scored by the shared process pool.
+    """
+    results = [None] * len(messages)
+    misses = OrderedDict()  # text to score -> indices of the messages waiting on it
+    for index, (content, names) in enumerate(messages):
+        key = sentiment_cache.key(content, names)
+        if key in misses:
+            misses[key].append(index)
+            continue
+        scores = sentiment_cache.get(key)
+        if scores is None:
+            misses[key] = [index]
+        else:
+            results[index] = scores
     
-    print(f"Analyzing sentiment for conversation between {', '.join(users)}...")
+    texts = list(misses)
+    with span("nlp_score"):
+        text_scores = _text_scores(texts, batch_size=batch_size, n_process=n_process, workers=workers)
+        for done, (text, scores) in enumerate(zip(texts, text_scores), 1):
+            sentiment_cache.set(text, scores)
+            for index in misses[text]:
+                results[index] = scores
+            if progress_callback and (done % batch_size == 0 or done == len(texts)):
+                progress_callback(done, len(texts))
+    sentiment_messages.inc(len(texts), source="nlp")
+    sentiment_messages.inc(len(messages) - len(texts), source="cache")
+    if progress_callback and not texts:
+        # Everything came from the cache
+        progress_callback(0, 0)
+    
+    if stats is not None:
+        stats["messages"] = stats.get("messages", 0) + len(messages)
+        stats["scored"] = stats.get("scored", 0) + len(texts)
+        stats["cache_hits"] = stats.get("cache_hits", 0) + len(messages) - len(texts)
+        stats["hit_rate"] = stats["cache_hits"] / stats["messages"] if stats["messages"] else 0.0
+    return results
+
+def _compatibility_score(scored_messages, verbose=True):
+    """
+    Compute the 0-1 compatibility score for one conversation from its
+    scored messages, a list of (name, content, polarity, subjectivity).
+    """
+    # Track each user's sentiment separately
+    user_polarities = {}
     
-    # Process each message in the conversation
     total_polarity = 0
     message_count = 0
     
-    for message in conversation:
-        # Split into name and content
-        name_end = message.find(':')
-        if name_end <= 0:
-            continue
-            
-        name = message[:name_end].strip()
-        content = message[name_end+1:].strip()
-        
-        # Skip empty messages
-        if not content:
-            continue
-            
-        # Process text content 
-        doc = nlp(content)
-        
-        # Get message-level sentiment using TextBlob sentiment
-        # In spacytextblob, blob property contains TextBlob object
-        try:
-            polarity = doc._.blob.polarity  
-            subjectivity = doc._.blob.subjectivity
-        except AttributeError:
-            # Fallback if attributes aren't available
-            print(f"Warning: Unable to access sentiment attributes for message: {content}")
-            polarity = 0
-            subjectivity = 0.5
-        
+    for name, content, polarity, subjectivity in scored_messages:
         message_count += 1
         total_polarity += polarity
         
@@ -92,40 +344,18 @@ def analyze_sentiment(conversation):
                 "total_polarity": 0, 
                 "total_subjectivity": 0,
                 "count": 0,
-                "messages": []
+                "polarities": []
             }
         
         # Update user stats
         user_polarities[name]["total_polarity"] += polarity
         user_polarities[name]["total_subjectivity"] += subjectivity
         user_polarities[name]["count"] += 1
-        user_polarities[name]["messages"].append({
-            "text": content,
-            "polarity": polarity,
-            "subjectivity": subjectivity
-        })
-        
-        # Store message details
-        message_details.append({
-            "name": name,
-            "message": content,
-            "polarity": polarity,
-            "subjectivity": subjectivity
-        })
+        user_polarities[name]["polarities"].append(polarity)
     
     # Calculate overall conversation statistics
     overall_sentiment = total_polarity / message_count if message_count > 0 else 0.0
     
-    # Calculate user-level sentiment
-    user_sentiments = {}
-    for name, data in user_polarities.items():
-        user_sentiments[name] = {
-            "average_polarity": data["total_polarity"] / data["count"] if data["count"] > 0 else 0.0,
-            "average_subjectivity": data["total_subjectivity"] / data["count"] if data["count"] > 0 else 0.0,
-            "message_count": data["count"],
-            "message_sentiments": data["messages"]
-        }
-    
     # Calculate compatibility score between users
     compatibility_score = 0.0
     
@@ -147,12 +377,12 @@ def analyze_sentiment(conversation):
         # Detect pattern of increasing positivity (conversation getting better)
         trend_scores = []
         for name, data in user_polarities.items():
-            if len(data["messages"]) >= 2:
-                first_half = data["messages"][:len(data["messages"])//2]
-                second_half = data["messages"][len(data["messages"])//2:]
+            if len(data["polarities"]) >= 2:
+                first_half = data["polarities"][:len(data["polarities"])//2]
+                second_half = data["polarities"][len(data["polarities"])//2:]
                 
-                first_half_avg = sum(m["polarity"] for m in first_half) / len(first_half)
-                second_half_avg = sum(m["polarity"] for m in second_half) / len(second_half)
+                first_half_avg = sum(first_half) / len(first_half)
+                second_half_avg = sum(second_half) / len(second_half)
                 
                 # Positive trend if second half is more positive
                 trend_scores.append(1 if second_half_avg > first_half_avg else 0)
@@ -166,11 +396,204 @@ def analyze_sentiment(conversation):
         # If only one user, just use their sentiment directly (shouldn't happen in conversation)
         compatibility_score = (overall_sentiment + 1) / 2  # Convert from [-1,1] to [0,1]
     
-    # Print detailed breakdown for debugging
-    print(f"Overall sentiment: {overall_sentiment:.2f}")
-    print(f"Compatibility score: {compatibility_score:.2f}")
-    for name, data in user_sentiments.items():
-        print(f"{name}'s average sentiment: {data['average_polarity']:.2f}")
+    if verbose and logger.isEnabledFor(logging.DEBUG):
+        # Log detailed breakdown for debugging
+        logger.debug("Overall sentiment: %.2f", overall_sentiment)
+        logger.debug("Compatibility score: %.2f", compatibility_score)
+        for name, data in user_polarities.items():
+            average_polarity = data["total_polarity"] / data["count"] if data["count"] > 0 else 0.0
+            logger.debug("%s's average sentiment: %.2f", name, average_polarity)
+    
+    return compatibility_score
+
+def _compatibility_scores(polarities, message_users, user_owners, num_conversations):
+    """
+    Vectorized _compatibility_score for many conversations at once.
+    
+    `polarities[i]` is message i's polarity and `message_users[i]` its
+    speaker's user index. Users are numbered across all conversations, in
+    order of first appearance within each conversation, and `user_owners[u]`
+    is user u's conversation. Messages must be in conversation order.
+    
+    np.bincount adds weights one at a time in array order, which is the
+    order the per-conversation loops add them in, so every sum and hence
+    every score is bit-for-bit the same as _compatibility_score's.
+    """
+    polarities = np.asarray(polarities, dtype=np.float64)
+    message_users = np.asarray(message_users, dtype=np.intp)
+    user_owners = np.asarray(user_owners, dtype=np.intp)
+    num_users = len(user_owners)
+    message_owners = user_owners[message_users]
+    
+    # Per-user averages, shifted from [-1,1] to [0,1]
+    user_counts = np.bincount(message_users, minlength=num_users)
+    user_totals = np.bincount(message_users, weights=polarities, minlength=num_users)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pos_shifted = (user_totals / user_counts + 1) / 2
+    
+    # Weakest link and average per conversation
+    min_scores = np.full(num_conversations, np.inf)
+    np.minimum.at(min_scores, user_owners, pos_shifted)
+    users_per_conversation = np.bincount(user_owners, minlength=num_conversations)
+    shifted_totals = np.bincount(user_owners, weights=pos_shifted, minlength=num_conversations)
+    
+    # Each message's position among its speaker's messages, for the half split
+    order = np.argsort(message_users, kind="stable")
+    group_starts = np.concatenate(([0], np.cumsum(user_counts)[:-1])) if num_users else np.zeros(0, dtype=np.intp)
+    positions = np.empty(len(message_users), dtype=np.intp)
+    positions[order] = np.arange(len(message_users)) - group_starts[message_users[order]]
+    first_half = positions < (user_counts // 2)[message_users]
+    
+    first_totals = np.bincount(message_users[first_half], weights=polarities[first_half], minlength=num_users)
+    second_totals = np.bincount(message_users[~first_half], weights=polarities[~first_half], minlength=num_users)
+    first_counts = user_counts // 2
+    has_trend = user_counts >= 2
+    with np.errstate(invalid="ignore", divide="ignore"):
+        improving = second_totals / (user_counts - first_counts) > first_totals / first_counts
+    
+    # Share of users (with at least 2 messages) whose second half is more positive
+    trend_counts = np.bincount(user_owners[has_trend], minlength=num_conversations)
+    trend_totals = np.bincount(user_owners[has_trend], weights=improving[has_trend], minlength=num_conversations)
+    
+    # Single-speaker (or empty) conversations fall back to the overall sentiment
+    message_counts = np.bincount(message_owners, minlength=num_conversations)
+    polarity_totals = np.bincount(message_owners, weights=polarities, minlength=num_conversations)
+    
+    with np.errstate(invalid="ignore", divide="ignore"):
+        trend_bonus = np.where(trend_counts > 0, trend_totals / trend_counts, 0.5)
+        avg_scores = shifted_totals / users_per_conversation
+        overall = np.where(message_counts > 0, polarity_totals / message_counts, 0.0)
+        paired = (0.4 * min_scores) + (0.4 * avg_scores) + (0.2 * trend_bonus)
+    return np.where(users_per_conversation >= 2, paired, (overall + 1) / 2)
+
+def analyze_sentiment(conversation, details=None, key=None):
+    """
+    Returns an average polarity for the entire conversation.
+    Polarity range: -1.0 (most negative) to +1.0 (most positive).
+    Pass a SentimentDetails as `details` to also receive each message's
+    polarity and subjectivity, under `key` (default: the next index).
+    """
+    # Make sure NLP is initialized
+    initialize_nlp()
+    
+    if nlp is None:
+        logger.warning("NLP model not initialized. Returning neutral sentiment.")
+        return 0.0
+    
+    # Extract user names from conversation
+    users = set()
+    for message in conversation:
+        name_end = message.find(':')
+        if name_end > 0:
+            name = message[:name_end].strip()
+            users.add(name)
+    
+    logger.debug("Analyzing sentiment for conversation between %s...", ', '.join(users))
+    
+    # Process each message in the conversation
+    parsed = []
+    positions = []
+    for position, message in enumerate(conversation):
+        parts = _split_message(message)
+        if parts is not None:
+            parsed.append(parts)
+            positions.append(position)
+    
+    # Get message-level sentiment using TextBlob sentiment
+    scores = _score_messages([(content, users) for _, content in parsed])
+    scored_messages = [(name, content, polarity, subjectivity)
+                       for (name, content), (polarity, subjectivity) in zip(parsed, scores)]
+    if details is not None:
+        details.add([len(details) if key is None else key], [conversation], [0] * len(parsed), positions,
+                    [name for name, _ in parsed], [polarity for polarity, _ in scores],
+                    [subjectivity for _, subjectivity in scores])
     
     # Return the compatibility score (0-1 range)
-    return compatibility_score 
\ No newline at end of file
+    return _compatibility_score(scored_messages)
+
+def analyze_sentiment_batch(conversations, batch_size=DEFAULT_BATCH_SIZE, n_process=DEFAULT_N_PROCESS, stats=None, progress_callback=None,
+                            details=None, workers=DEFAULT_SCORING_WORKERS):
+    """
+    Score many conversations in a single spaCy pass.
+    
+    `conversations` is either a dict of key -> conversation (e.g. the
+    (userA_id, userB_id) -> messages dict from simulate_conversations) or a
+    list of conversations. Every message of every conversation is streamed
+    through one nlp.pipe() call and the scores are regrouped per conversation,
+    so the result is a dict with the same keys (or a list in the same order)
+    holding the same scores analyze_sentiment would return.
+    
+    Messages already in the sentiment cache (or repeated within the batch) are
+    not re-scored; pass a dict as `stats` to receive this run's cache counters.
+    `progress_callback(done, total)` reports how many distinct texts are scored.
+    Pass a dict as `details` to receive key -> [(speaker, polarity, subjectivity), ...]
+    for each conversation's messages, or a SentimentDetails to receive them
+    as columns (much smaller for large runs). `workers` > 1 spreads the texts
+    that need scoring over that many processes; scores are identical either way.
+    """
+    is_dict = isinstance(conversations, dict)
+    items = list(conversations.items()) if is_dict else list(enumerate(conversations))
+    
+    # Make sure NLP is initialized
+    initialize_nlp()
+    
+    if nlp is None:
+        logger.warning("NLP model not initialized. Returning neutral sentiment.")
+        scores = [0.0] * len(items)
+    else:
+        # Flatten every message into one stream, remembering which conversation
+        # it came from and which of that conversation's speakers sent it
+        owners = []
+        positions = []
+        parsed = []
+        speakers = []
+        message_users = []
+        user_owners = []
+        for index, (_, conversation) in enumerate(items):
+            parts = []
+            for position, message in enumerate(conversation):
+                split = _split_message(message)
+                if split is not None:
+                    parts.append(split)
+                    positions.append(position)
+            user_ids = {}
+            for name, _ in parts:
+                if name not in user_ids:
+                    user_ids[name] = len(user_owners)
+                    user_owners.append(index)
+                message_users.append(user_ids[name])
+            names = set(user_ids)
+            owners.extend([index] * len(parts))
+            parsed.extend(parts)
+            speakers.extend([names] * len(parts))
+        
+        logger.info("Analyzing sentiment for %d conversations (%d messages)...", len(items), len(parsed))
+        
+        run_stats = {}
+        message_scores = _score_messages(
+            [(content, names) for (_, content), names in zip(parsed, speakers)],
+            batch_size=batch_size, n_process=n_process, stats=run_stats,
+            progress_callback=progress_callback, workers=workers
+        )
+        logger.info("Sentiment cache: %d of %d messages reused (%.0f%% hit rate), %d scored",
+                    run_stats['cache_hits'], run_stats['messages'], run_stats['hit_rate'] * 100, run_stats['scored'])
+        if stats is not None:
+            stats.update(run_stats)
+        
+        # One NumPy pass scores every conversation
+        with span("compatibility_scores"):
+            polarities = [polarity for polarity, _ in message_scores]
+            scores = _compatibility_scores(polarities, message_users, user_owners, len(items)).tolist()
+        if isinstance(details, SentimentDetails):
+            details.add([key for key, _ in items], [conversation for _, conversation in items], owners, positions,
+                        [name for name, _ in parsed], polarities, [subjectivity for _, subjectivity in message_scores])
+        elif details is not None:
+            scored = [[] for _ in items]
+            for owner, (name, _), (polarity, subjectivity) in zip(owners, parsed, message_scores):
+                scored[owner].append((name, polarity, subjectivity))
+            for (key, _), messages in zip(items, scored):
+                details[key] = messages
+    
+    if is_dict:
+        return {key: score for (key, _), score in zip(items, scores)}
+    return scores
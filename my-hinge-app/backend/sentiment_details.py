@@ -0,0 +1,142 @@
+# sentiment_details.py
+# Per-message sentiment in columns: one NumPy array per field instead of a
+# dict or tuple per message. Message text isn't copied; each row points at
+# its message in the scored conversation, which is resolved only on export.
+import numpy as np
+
+class SentimentDetails:
+    """
+    Message-level polarity and subjectivity for a batch of conversations.
+
+    Row i describes one message:
+      pair[i]         - index into `keys` (and `conversations`)
+      position[i]     - index of the message in its conversation list
+      speaker[i]      - index into `speakers` (names are stored once)
+      polarity[i], subjectivity[i]
+
+    Rows of a conversation are contiguous and in message order. Pass an
+    instance as `details` to analyze_sentiment or analyze_sentiment_batch.
+    For code written against the dict form, items() and [key] return
+    [(speaker, polarity, subjectivity), ...] per conversation.
+    """
+    COLUMNS = ("pair", "position", "speaker", "polarity", "subjectivity")
+
+    def __init__(self):
+        self.keys = []
+        self.conversations = []
+        self.speakers = []
+        self.pair = np.zeros(0, dtype=np.int32)
+        self.position = np.zeros(0, dtype=np.int32)
+        self.speaker = np.zeros(0, dtype=np.int32)
+        self.polarity = np.zeros(0, dtype=np.float64)
+        self.subjectivity = np.zeros(0, dtype=np.float64)
+        self._key_index = {}
+        self._speaker_index = {}
+        self._bounds = None
+
+    def add(self, keys, conversations, pairs, positions, names, polarities, subjectivities):
+        """
+        Append a scored batch. `pairs[i]` indexes this batch's `keys` and
+        `conversations`; `names[i]` is row i's speaker name.
+        """
+        first = len(self.keys)
+        for offset, key in enumerate(keys):
+            self._key_index[key] = first + offset
+        self.keys.extend(keys)
+        self.conversations.extend(conversations)
+        speaker_ids = []
+        for name in names:
+            speaker_id = self._speaker_index.get(name)
+            if speaker_id is None:
+                speaker_id = self._speaker_index[name] = len(self.speakers)
+                self.speakers.append(name)
+            speaker_ids.append(speaker_id)
+
+        self.pair = np.concatenate((self.pair, np.asarray(pairs, dtype=np.int32) + first))
+        self.position = np.concatenate((self.position, np.asarray(positions, dtype=np.int32)))
+        self.speaker = np.concatenate((self.speaker, np.asarray(speaker_ids, dtype=np.int32)))
+        self.polarity = np.concatenate((self.polarity, np.asarray(polarities, dtype=np.float64)))
+        self.subjectivity = np.concatenate((self.subjectivity, np.asarray(subjectivities, dtype=np.float64)))
+        self._bounds = None
+
+    def __len__(self):
+        """Number of conversations, like the dict form"""
+        return len(self.keys)
+
+    @property
+    def num_messages(self):
+        return len(self.pair)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the columns (the keys and speaker names are extra)"""
+        return sum(getattr(self, column).nbytes for column in self.COLUMNS)
+
+    def _rows(self, pair_index):
+        if self._bounds is None:
+            self._bounds = np.searchsorted(self.pair, np.arange(len(self.keys) + 1))
+        return slice(int(self._bounds[pair_index]), int(self._bounds[pair_index + 1]))
+
+    def _messages(self, rows):
+        return [(self.speakers[speaker], polarity, subjectivity) for speaker, polarity, subjectivity
+                in zip(self.speaker[rows].tolist(), self.polarity[rows].tolist(), self.subjectivity[rows].tolist())]
+
+    def __getitem__(self, key):
+        return self._messages(self._rows(self._key_index[key]))
+
+    def __contains__(self, key):
+        return key in self._key_index
+
+    def items(self):
+        for pair_index, key in enumerate(self.keys):
+            yield key, self._messages(self._rows(pair_index))
+
+    def text(self, row):
+        """Message text of a row, read from its conversation"""
+        message = self.conversations[self.pair[row]][self.position[row]]
+        return message[message.find(':') + 1:].strip()
+
+    def to_arrow(self, include_text=False):
+        """
+        A pyarrow Table with one row per message. (userA_id, userB_id) keys
+        become two columns; other keys become a "conversation" column.
+        Speaker names are dictionary-encoded. Text is only materialized
+        with `include_text`.
+        """
+        pa = _require_pyarrow()
+        pair_keys = all(isinstance(key, tuple) and len(key) == 2 for key in self.keys)
+        if pair_keys:
+            key_columns = {
+                "userA_id": pa.array(np.array([key[0] for key in self.keys])[self.pair]),
+                "userB_id": pa.array(np.array([key[1] for key in self.keys])[self.pair]),
+            }
+        else:
+            key_columns = {"conversation": pa.array([self.keys[index] for index in self.pair.tolist()])}
+        columns = dict(key_columns,
+                       message_index=pa.array(self.position),
+                       speaker=pa.DictionaryArray.from_arrays(pa.array(self.speaker), pa.array(self.speakers, pa.string())),
+                       polarity=pa.array(self.polarity),
+                       subjectivity=pa.array(self.subjectivity))
+        if include_text:
+            columns["text"] = pa.array([self.text(row) for row in range(self.num_messages)], pa.string())
+        return pa.table(columns)
+
+    def write_parquet(self, path, include_text=False):
+        table = self.to_arrow(include_text)
+        import pyarrow.parquet as pq
+        pq.write_table(table, path)
+
+    def write_arrow(self, path, include_text=False):
+        """Write an Arrow IPC (Feather v2) file"""
+        pa = _require_pyarrow()
+        table = self.to_arrow(include_text)
+        with pa.OSFile(str(path), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+def _require_pyarrow():
+    # Optional: only the Parquet/Arrow export needs it
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError("Exporting sentiment details needs pyarrow (pip install pyarrow)") from e
+    return pyarrow
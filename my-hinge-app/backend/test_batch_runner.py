@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# test_batch_runner.py - Tests for the command-line batch runner and its checkpoints
+
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import llm_client
+from batch_runner import run_batch
+from llm_client import LLMClient
+from llm_stub_server import StubLLMServer
+from run_store import RunStore
+from sentiment_analyzer import initialize_nlp
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+OPTIONS = {"num_profiles": 16, "engine": "local", "seed": 5, "top_k": 3}
+
+class Crash(Exception):
+    pass
+
+def crash_after(kind, count, records):
+    """emit that keeps records and raises once `count` records of `kind` went by, like a killed process"""
+    seen = [0]
+
+    def emit(record):
+        records.append(record)
+        if record["type"] == kind:
+            seen[0] += 1
+            if seen[0] == count:
+                raise Crash(kind)
+    return emit
+
+def test_resume_matches_uninterrupted_run():
+    """Test that runs crashed while simulating or scoring resume to the same output as a clean run"""
+    print("Testing resume from checkpoints...")
+    initialize_nlp("lean")
+    with tempfile.TemporaryDirectory() as directory:
+        clean = RunStore(os.path.join(directory, "clean.db"))
+        expected = []
+        summary = run_batch(clean, OPTIONS, expected.append, chunk_size=25, checkpoint_rows=10)
+        assert summary["conversations"] == summary["scored"] == 16 * 15 // 2
+
+        for stage, count in (("conversation", 47), ("pair", 63)):
+            store = RunStore(os.path.join(directory, f"crash-{stage}.db"))
+            try:
+                run_batch(store, OPTIONS, crash_after(stage, count, []), chunk_size=25, checkpoint_rows=10)
+                assert False, "expected a crash"
+            except Crash:
+                pass
+            assert store.get_run(1)["status"] != "analyzed"
+
+            # The options on the command line don't matter for a resumed run
+            records = []
+            summary = run_batch(store, {"num_profiles": 99, "seed": 1}, records.append, chunk_size=25, checkpoint_rows=10)
+            print(stage, summary)
+            assert summary["resumed"] and summary["run_id"] == 1
+            if stage == "pair":
+                assert 0 < summary["scored"] < summary["conversations"]
+            assert store.load_results(1) == clean.load_results(1)
+            assert sorted(map(json.dumps, records[1:])) == sorted(map(json.dumps, expected[1:]))
+            assert [r for r in records if r["type"] == "match"] == [r for r in expected if r["type"] == "match"]
+
+            # A finished run isn't resumed again
+            assert not run_batch(store, OPTIONS, chunk_size=25)["resumed"]
+            store.close()
+        clean.close()
+
+        # Tied checkpointed scores rank the same whatever order their rows were written in
+        results = []
+        for name in ("ties-in-order.db", "ties-reversed.db"):
+            path = os.path.join(directory, name)
+            store = RunStore(path)
+            try:
+                run_batch(store, OPTIONS, crash_after("pair", 63, []), chunk_size=25, checkpoint_rows=10)
+                assert False, "expected a crash"
+            except Crash:
+                pass
+            store.close()
+            with sqlite3.connect(path) as connection:
+                rows = connection.execute("SELECT run_id, userA_id, userB_id FROM pair_scores ORDER BY rowid").fetchall()
+                if name == "ties-reversed.db":
+                    rows.reverse()
+                connection.execute("DELETE FROM pair_scores")
+                connection.executemany("INSERT INTO pair_scores VALUES (?, ?, ?, 0.99)", rows)
+            store = RunStore(path)
+            run_batch(store, OPTIONS, chunk_size=25, checkpoint_rows=10)
+            results.append(store.load_results(1))
+            store.close()
+        tied = sum(match['sentiment_score'] == 0.99 for data in results[0].values() for match in data['matches'])
+        print(f"{tied} tied matches")
+        assert tied > 0 and results[0] == results[1]
+    print("")
+
+def test_budget_skipped_pairs_resume():
+    """Test that pairs the token budget skipped keep the run unfinished until a later run simulates them"""
+    print("Testing resume after budget-skipped pairs...")
+    initialize_nlp("lean")
+    options = {"num_profiles": 6, "engine": "single", "seed": 3, "token_budget": 4000}
+    original = llm_client._default_client
+    with tempfile.TemporaryDirectory() as directory, StubLLMServer() as stub:
+        llm_client._default_client = LLMClient(base_url=stub.base_url, api_key="stub", concurrency=2)
+        store = RunStore(os.path.join(directory, "runs.db"))
+        try:
+            summaries = [run_batch(store, options, chunk_size=5)]
+            while summaries[-1]["budget_skipped"] and len(summaries) < 10:
+                summaries.append(run_batch(store, options, chunk_size=5))
+        finally:
+            llm_client._default_client = original
+        for summary in summaries:
+            print({key: summary[key] for key in ("run_id", "resumed", "simulated", "budget_skipped", "scored")})
+        assert summaries[0]["budget_skipped"] > 0 and summaries[-1]["budget_skipped"] == 0
+        assert all(summary["run_id"] == 1 for summary in summaries) and len(summaries) > 1
+        assert sum(summary["simulated"] for summary in summaries) == 15
+        assert store.get_run(1)["status"] == "analyzed" and store.get_run(1)["num_conversations"] == 15
+        store.close()
+    print("")
+
+def test_cli_streams_records():
+    """Test that the CLI streams NDJSON to stdout and reports its summary on stderr"""
+    print("Testing the batch CLI...")
+    with tempfile.TemporaryDirectory() as directory:
+        result = subprocess.run(
+            [sys.executable, "batch_runner.py", "--profiles", "8", "--engine", "local", "--seed", "2",
+             "--nlp-mode", "lean", "--quiet", "--checkpoint-dir", directory],
+            cwd=BACKEND_DIR, capture_output=True, text=True, timeout=120
+        )
+        assert result.returncode == 0, result.stderr
+        records = [json.loads(line) for line in result.stdout.splitlines()]
+        summary = json.loads(result.stderr.splitlines()[-1])
+        print(summary)
+        assert records[0]["type"] == "run" and records[0]["options"]["seed"] == 2
+        assert sum(r["type"] == "conversation" for r in records) == summary["conversations"] == 28
+        assert sum(r["type"] == "match" for r in records) == summary["matches"]
+    print("")
+
+if __name__ == "__main__":
+    test_resume_matches_uninterrupted_run()
+    test_budget_skipped_pairs_resume()
+    test_cli_streams_records()
+    print("All tests completed!")
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# test_benchmark.py - Tests for the pipeline benchmark harness
+
+import copy
+import json
+from benchmark import run_benchmark, compare, percentile, STAGES
+
+def test_benchmark_report():
+    """Test that a small run reports every stage and is reproducible"""
+    print("Testing benchmark report...")
+    first = run_benchmark([6], memory=None)
+    second = run_benchmark([6], memory=None)
+    print(json.dumps(first["results"], indent=2))
+
+    stages = first["results"][0]["stages"]
+    assert tuple(stages) == STAGES
+    assert stages["generate_profiles"]["items"] == 6
+    assert stages["simulate_conversations"]["items"] == 15
+    assert stages["match_assembly"]["items"] == 15
+    for stats in stages.values():
+        assert stats["throughput"] > 0
+        assert stats["latency_p50_ms"] <= stats["latency_p95_ms"]
+
+    # The same seed produces the same work
+    counts = lambda report: {stage: (stats["items"], stats.get("scored")) for stage, stats in report["results"][0]["stages"].items()}
+    assert counts(first) == counts(second)
+    print("")
+
+def test_compare_flags_regressions():
+    """Test that compare reports stages whose throughput dropped past the tolerance"""
+    print("Testing regression comparison...")
+    baseline = {"results": [{"size": 10, "stages": {"sentiment_scoring": {"throughput": 1000.0},
+                                                    "match_assembly": {"throughput": 500.0}}}]}
+    current = copy.deepcopy(baseline)
+    current["results"][0]["stages"]["sentiment_scoring"]["throughput"] = 700.0
+    current["results"][0]["stages"]["match_assembly"]["throughput"] = 450.0
+
+    regressions = compare(baseline, current, tolerance=0.2)
+    assert [(r["stage"], r["change"]) for r in regressions] == [("sentiment_scoring", -0.3)]
+    assert percentile([3, 1, 2, 4], 50) == 2 and percentile([3, 1, 2, 4], 95) == 4
+    print("")
+
+if __name__ == "__main__":
+    test_benchmark_report()
+    test_compare_flags_regressions()
+    print("All tests completed!")
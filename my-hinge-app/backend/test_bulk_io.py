@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# test_bulk_io.py - Tests for bulk export and import of runs
+
+import gzip
+import io
+import json
+import os
+import tempfile
+from bulk_io import (run_records, store_records, select_tables, write_ndjson, read_ndjson, write_parquet,
+                     read_parquet, arrow_stream_chunks, import_run, collect_records)
+from pipeline import run_analyze_sentiment
+from run_store import RunStore
+from sample_data import sample_run
+from sentiment_analyzer import initialize_nlp
+
+def stored_run(path, include_all_pairs=True):
+    """A run store at `path` holding one analyzed run; returns (store, run_id, analysis)"""
+    initialize_nlp("lean")
+    profiles, conversations = sample_run()
+    store = RunStore(path)
+    run_id = store.create_run()
+    store.save_profiles(run_id, profiles)
+    store.save_conversations(run_id, conversations)
+    analysis = run_analyze_sentiment(profiles, conversations, {"include_all_pairs": include_all_pairs})
+    store.save_analysis(run_id, analysis)
+    return store, run_id, analysis
+
+def records_of(records, kind):
+    return [record for record in records if record["type"] == kind]
+
+def test_ndjson_round_trip():
+    """Test that a stored run comes back record for record from gzip NDJSON"""
+    print("Testing NDJSON export...")
+    with tempfile.TemporaryDirectory() as directory:
+        store, run_id, analysis = stored_run(os.path.join(directory, "runs.db"))
+        path = os.path.join(directory, "run.ndjson.gz")
+        write_ndjson(path, store_records(store, run_id))
+        with gzip.open(path, "rt") as f:
+            lines = f.read().splitlines()
+        print(f"{len(lines)} records, {os.path.getsize(path)} bytes compressed")
+
+        records = list(read_ndjson(path))
+        assert records[0]["type"] == "run" and records[0]["run_id"] == run_id
+        assert [r["type"] for r in records[1:]] == sorted((r["type"] for r in records[1:]),
+                                                          key=["profile", "conversation", "pair", "match"].index)
+        assert len(records_of(records, "match")) == len(records_of(records, "profile")) * 3
+        profiles, conversations, scores = collect_records(records)
+        assert profiles == store.load_profiles(run_id)
+        assert conversations == store.load_conversations(run_id)
+        assert dict(scores) == store.load_scores(run_id)
+
+        # Plain NDJSON in a stream reads the same, and tables can be left out
+        plain = b"".join(json.dumps(r).encode() + b"\n" for r in select_tables(records, ["profiles"]))
+        assert [r["type"] for r in read_ndjson(io.BytesIO(plain))] == ["run"] + ["profile"] * len(profiles)
+        try:
+            list(read_ndjson(io.BytesIO(plain + b"{not json\n")))
+            assert False, "expected a ValueError"
+        except ValueError as e:
+            assert f"Line {len(profiles) + 2}" in str(e)
+        store.close()
+    print("")
+
+def test_parquet_round_trip():
+    """Test that the Parquet tables and the Arrow stream hold the same rows as the NDJSON records"""
+    print("Testing Parquet export...")
+    try:
+        import pyarrow as pa
+    except ImportError:
+        print("pyarrow not installed, skipping")
+        return
+    with tempfile.TemporaryDirectory() as directory:
+        store, run_id, _ = stored_run(os.path.join(directory, "runs.db"))
+        records = list(store_records(store, run_id))
+        write_parquet(os.path.join(directory, "export"), records, batch_rows=7)
+        assert sorted(os.listdir(os.path.join(directory, "export"))) == [
+            "conversations.parquet", "matches.parquet", "pairs.parquet", "profiles.parquet", "run.json"]
+        assert list(read_parquet(os.path.join(directory, "export"), batch_rows=5)) == records
+
+        stream = b"".join(arrow_stream_chunks("pairs", records, batch_rows=7))
+        table = pa.ipc.open_stream(stream).read_all()
+        assert table.num_rows == sum(1 for r in records if r["type"] == "pair")
+        assert table.column("sentiment_score").to_pylist() == [r["sentiment_score"] for r in records if r["type"] == "pair"]
+        store.close()
+    print("")
+
+def test_import_run():
+    """Test that importing with and without rescoring gives the matches of a full analysis"""
+    print("Testing import...")
+    with tempfile.TemporaryDirectory() as directory:
+        store, run_id, analysis = stored_run(os.path.join(directory, "runs.db"))
+        path = os.path.join(directory, "run.ndjson.gz")
+        write_ndjson(path, store_records(store, run_id))
+
+        rescored = import_run(store, read_ndjson(path), {"top_k": 3}, rescore=True, chunk_size=7, batch_rows=4)
+        rematched = import_run(store, read_ndjson(path), {"top_k": 3}, batch_rows=4)
+        print(rescored, rematched)
+        for summary in (rescored, rematched):
+            assert summary["analyzed"] and summary["conversations"] == len(store.load_conversations(run_id))
+            assert store.load_results(summary["run_id"]) == store.load_results(run_id)
+            assert store.load_scores(summary["run_id"]).keys() == store.load_scores(run_id).keys()
+            assert store.get_run(summary["run_id"])["status"] == "analyzed"
+
+        # Profiles only: nothing to match
+        summary = import_run(store, select_tables(read_ndjson(path), ["profiles"]))
+        assert not summary["analyzed"] and store.get_run(summary["run_id"])["status"] == "profiles"
+        store.close()
+    print("")
+
+def test_app_endpoints():
+    """Test that /api/export streams the current run and /api/import loads it back"""
+    print("Testing export and import endpoints...")
+    os.environ["RUN_STORE"] = "off"
+    os.environ["NLP_WARMUP"] = "lazy"
+    import app
+    initialize_nlp("lean")
+    profiles, conversations = sample_run()
+    records = list(run_records(profiles, conversations.items()))
+    client = app.app.test_client()
+
+    body = b"".join(json.dumps(r).encode() + b"\n" for r in records)
+    response = client.post("/api/import?rescore=true&top_k=2", data=body)
+    assert response.status_code == 200, response.json
+    assert response.json["num_conversations"] == len(conversations) and response.json["analyzed"]
+    expected = run_analyze_sentiment(profiles, conversations, {"top_k": 2})
+    assert app.app_state["sentiment_analyzed"]["results"] == expected["results"]
+
+    response = client.get("/api/export")
+    assert response.mimetype == "application/gzip"
+    # The export is a snapshot: a stage changing the state mid-stream doesn't change what it sends
+    app.app_state["conversations"] = dict(conversations)
+    streaming = client.get("/api/export", buffered=False)
+    app.app_state["conversations"].clear()
+    assert list(read_ndjson(io.BytesIO(b"".join(streaming.response)))) == list(read_ndjson(io.BytesIO(response.data)))
+    app.app_state["conversations"] = conversations
+    exported = list(read_ndjson(io.BytesIO(response.data)))
+    _, exported_conversations, scores = collect_records(exported)
+    assert exported_conversations == conversations
+    assert len(scores) == len(conversations)
+
+    # The export imports again (gzip this time), re-matching its scores
+    response = client.post("/api/import?top_k=2", data=response.data)
+    assert response.status_code == 200 and response.json["num_pairs"] == len(conversations)
+    assert app.app_state["sentiment_analyzed"]["results"] == expected["results"]
+
+    assert client.post("/api/import", data=b"{nope\n").status_code == 400
+    malformed = dict(records_of(records, "conversation")[0], messages="Hi!")
+    body = b"".join(json.dumps(r).encode() + b"\n" for r in records_of(records, "profile") + [malformed])
+    assert client.post("/api/import", data=body).status_code == 400
+    assert client.post("/api/import", data=b'[1, 2]\n{"type": "profile"}\n').status_code == 400
+    assert client.get("/api/export?format=xml").status_code == 400
+    client.post("/api/reset")
+    print("")
+
+if __name__ == "__main__":
+    test_ndjson_round_trip()
+    test_parquet_round_trip()
+    test_import_run()
+    test_app_endpoints()
+    print("All tests completed!")
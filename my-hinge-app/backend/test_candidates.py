@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# test_candidates.py - Tests for candidate pre-filtering of conversation pairs
+
+from candidates import candidate_pair_ids, candidate_recall, candidate_score
+from conversation_simulator import simulate_conversations, _conversation_pairs
+from sample_data import make_profiles
+
+class EchoClient:
+    """Minimal LLM client that answers every prompt with a fixed conversation"""
+    concurrency = 4
+
+    def chat(self, messages, **kwargs):
+        return "A: Hi there!\nB: Hey, nice to meet you!"
+
+def test_candidate_pruning():
+    """Test that top-k candidates bound the pairs simulated and keep each user's best partners"""
+    print("Testing candidate pruning...")
+    profiles = make_profiles(30)
+    total_pairs = len(_conversation_pairs(profiles))
+
+    # Keeping every partner prunes nothing
+    assert len(candidate_pair_ids(profiles, len(profiles) - 1)) == total_pairs
+
+    candidates = candidate_pair_ids(profiles, 3)
+    assert len(candidates) <= 3 * len(profiles)
+    for user in profiles:
+        best = max((p for p in profiles if p['id'] != user['id']), key=lambda p: candidate_score(user, p))
+        assert frozenset((user['id'], best['id'])) in candidates
+
+    stats = {}
+    conversations = simulate_conversations(profiles, client=EchoClient(), candidate_k=3, stats=stats)
+    print(f"Simulated {stats['simulated_pairs']} of {stats['total_pairs']} pairs")
+    assert len(conversations) == stats['simulated_pairs'] == len(candidates)
+    assert stats['pruned_pairs'] == total_pairs - len(candidates)
+    assert all(frozenset(pair) in candidates for pair in conversations)
+    print("")
+
+def test_candidate_recall():
+    """Test recall of true top matches against a full run's ranked pairs"""
+    print("Testing candidate recall...")
+    all_pairs = [
+        {'userA_id': 0, 'userB_id': 1},
+        {'userA_id': 1, 'userB_id': 2},
+        {'userA_id': 0, 'userB_id': 2},
+    ]
+    # With k=1: user 0 -> 1, user 1 -> 0, user 2 -> 1
+    candidates = {frozenset((0, 1))}
+    recall = candidate_recall(candidates, all_pairs, k=1)
+    print(f"Recall: {recall:.2f}")
+    assert abs(recall - 2 / 3) < 1e-9
+    assert candidate_recall({frozenset((0, 1)), frozenset((1, 2))}, all_pairs, k=1) == 1.0
+    print("")
+
+if __name__ == "__main__":
+    test_candidate_pruning()
+    test_candidate_recall()
+    print("All tests completed!")
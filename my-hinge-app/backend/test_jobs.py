@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# test_jobs.py - Tests for the background job engine
+
+import threading
+import time
+from jobs import Job, JobManager
+
+def wait_for(job, timeout=5):
+    """Poll a job until it finishes"""
+    start = time.time()
+    while not job.finished and time.time() - start < timeout:
+        time.sleep(0.01)
+    return job
+
+def test_job_lifecycle():
+    """Test that a job reports progress and keeps its result"""
+    print("Testing job lifecycle...")
+    manager = JobManager(max_workers=2)
+    release = threading.Event()
+    
+    def work(job):
+        report = job.progress_callback("counting", "Counted {done}/{total}")
+        report(1, 2)
+        release.wait()
+        report(2, 2)
+        return {"answer": 42}
+    
+    job = manager.submit("count", work)
+    time.sleep(0.05)
+    running = job.to_dict()
+    print(f"While running: {running['state']} {running['progress']} {running['message']}")
+    assert running["state"] == "running"
+    assert running["progress"] == {"done": 1, "total": 2}
+    assert "result" not in running
+    
+    release.set()
+    finished = wait_for(job).to_dict()
+    print(f"Finished: {finished['state']} {finished['result']}")
+    assert finished["state"] == "succeeded" and finished["result"] == {"answer": 42}
+    assert manager.get(job.id) is job
+    print("")
+
+def test_failed_job():
+    """Test that exceptions mark the job as failed instead of escaping"""
+    print("Testing failed job...")
+    manager = JobManager(max_workers=1)
+    
+    def work(job):
+        raise RuntimeError("boom")
+    
+    job = wait_for(manager.submit("explode", work))
+    print(f"Job state: {job.state}, error: {job.error}")
+    assert job.state == "failed" and job.error == "boom"
+    print("")
+
+def test_jobs_run_concurrently():
+    """Test that independent jobs run side by side on the worker pool"""
+    print("Testing concurrent jobs...")
+    manager = JobManager(max_workers=3)
+    barrier = threading.Barrier(3, timeout=2)
+    
+    # Each job only finishes once all three are running at the same time
+    jobs = [manager.submit("wait", lambda job: barrier.wait()) for _ in range(3)]
+    states = [wait_for(job).state for job in jobs]
+    print(f"Job states: {states}")
+    assert states == ["succeeded"] * 3
+    print("")
+
+def test_finished_jobs_are_pruned():
+    """Test that only the most recent finished jobs are kept"""
+    print("Testing job retention...")
+    manager = JobManager(max_workers=1, max_finished=2)
+    jobs = [wait_for(manager.submit("noop", lambda job: None)) for _ in range(4)]
+    manager.submit("noop", lambda job: None)
+    kept = [job for job in jobs if manager.get(job.id) is not None]
+    print(f"Kept {len(kept)} of {len(jobs)} finished jobs")
+    assert kept == jobs[2:]
+    print("")
+
+def test_job_events():
+    """Test that followers receive events in order as they are emitted"""
+    print("Testing job events...")
+    manager = JobManager(max_workers=1)
+    release = threading.Event()
+    
+    def work(job):
+        report = job.progress_callback("counting")
+        for i in range(3):
+            job.emit("item", {"index": i})
+            report(i + 1, 3)
+        release.wait()
+        return "done"
+    
+    job = manager.submit("stream", work)
+    received = []
+    seq = 0
+    finished = False
+    while not finished:
+        if len(received) >= 8:
+            release.set()
+        events, finished = job.events_since(seq, timeout=1)
+        received.extend(events)
+        if events:
+            seq = events[-1]["seq"] + 1
+    
+    types = [event["type"] for event in received]
+    print(f"Received: {types}")
+    assert [event["seq"] for event in received] == list(range(len(received)))
+    assert types[0] == "state" and received[-1]["data"] == {"state": "succeeded"}
+    assert [event["data"]["index"] for event in received if event["type"] == "item"] == [0, 1, 2]
+    assert received[-2]["type"] == "progress" and received[-2]["data"]["done"] == 3
+    print("")
+
+def test_job_event_log_is_bounded():
+    """Test that old events are dropped and followers skip ahead"""
+    print("Testing job event retention...")
+    job = Job("noop", max_events=5)
+    for i in range(12):
+        job.emit("item", i)
+    events, finished = job.events_since(0, timeout=0)
+    print(f"Kept events {[event['seq'] for event in events]}")
+    assert [event["data"] for event in events] == [7, 8, 9, 10, 11]
+    assert [event["data"] for event in job.events_since(10, timeout=0)[0]] == [10, 11]
+    print("")
+
+if __name__ == "__main__":
+    test_job_lifecycle()
+    test_failed_job()
+    test_jobs_run_concurrently()
+    test_finished_jobs_are_pruned()
+    test_job_events()
+    test_job_event_log_is_bounded()
+    print("All tests completed!")
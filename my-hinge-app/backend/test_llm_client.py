@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# test_llm_client.py - Tests for the bounded LLM client against the local stub server
+
+import os
+import tempfile
+import time
+from completion_cache import CompletionCache, MemoryLRUCache, SQLiteCacheBackend, cache_from_env
+from llm_client import LLMClient, TokenBucket
+from llm_stub_server import StubLLMServer
+from conversation_simulator import simulate_conversations
+from sample_data import make_profiles
+
+def test_retries_rate_limits():
+    """Test that 429 and 500 responses are retried until the call succeeds"""
+    print("Testing retries on rate limits and server errors...")
+    with StubLLMServer(rate_limit_first=2, error_first=1) as stub:
+        client = LLMClient(base_url=stub.base_url, api_key="stub", backoff_base=0.01)
+        reply = client.chat([{"role": "user", "content": "User 1: Ann, 30\nUser 2: Bob, 31"}])
+        print(f"Reply after retries: {reply[:40]}...")
+        assert reply.startswith("Ann:")
+        assert stub.stats["requests"] == 4
+        assert client.stats["retries"] == 3
+    print("")
+
+def test_gives_up_after_max_retries():
+    """Test that persistent rate limiting eventually raises"""
+    print("Testing retry limit...")
+    with StubLLMServer(rate_limit_first=100) as stub:
+        client = LLMClient(base_url=stub.base_url, api_key="stub", max_retries=2, backoff_base=0.01)
+        try:
+            client.chat([{"role": "user", "content": "hello"}])
+            assert False, "Expected the call to fail"
+        except Exception as e:
+            print(f"Call failed as expected: {type(e).__name__}")
+        assert stub.stats["requests"] == 3
+        assert client.stats["failures"] == 1
+    print("")
+
+def test_concurrent_simulation():
+    """Test that pairs are simulated concurrently within the concurrency limit"""
+    print("Testing concurrent conversation simulation...")
+    profiles = make_profiles(6)  # 15 pairs
+    with StubLLMServer(latency=0.1) as stub:
+        client = LLMClient(base_url=stub.base_url, api_key="stub", concurrency=5)
+        start = time.time()
+        conversations = simulate_conversations(profiles, client=client)
+        elapsed = time.time() - start
+        print(f"Simulated {len(conversations)} conversations in {elapsed:.2f}s (max in flight: {stub.stats['max_in_flight']})")
+        assert len(conversations) == 15
+        assert list(conversations) == [(i, j) for i in range(6) for j in range(i + 1, 6)]
+        assert conversations[(0, 1)][0].startswith("User0:")
+        assert 1 < stub.stats["max_in_flight"] <= 5
+        # Serial simulation would take 15 x 0.1s
+        assert elapsed < 1.0
+    print("")
+
+def test_token_bucket():
+    """Test that the token bucket blocks once its per-minute budget is spent"""
+    print("Testing token bucket...")
+    bucket = TokenBucket(per_minute=600)  # 10 per second
+    start = time.time()
+    bucket.acquire(600)
+    bucket.acquire(3)
+    elapsed = time.time() - start
+    print(f"Waited {elapsed:.2f}s for 3 tokens")
+    assert 0.2 < elapsed < 1.0
+    print("")
+
+def test_completion_cache():
+    """Test that repeated requests are served from memory, then from SQLite after a restart"""
+    print("Testing completion cache...")
+    messages = [{"role": "user", "content": "User 1: Ann, 30\nUser 2: Bob, 31"}]
+    with tempfile.TemporaryDirectory() as directory, StubLLMServer() as stub:
+        path = os.path.join(directory, "completions.db")
+        cache = CompletionCache(backend=SQLiteCacheBackend(path))
+        client = LLMClient(base_url=stub.base_url, api_key="stub", cache=cache)
+        first = client.chat(messages)
+        second = client.chat(messages)
+        client.chat(messages, temperature=0.2)  # different parameters, different key
+        assert first == second
+        assert stub.stats["requests"] == 2
+        assert cache.get_stats()["memory_hits"] == 1
+        
+        # A fresh process only has the on-disk entries
+        restarted = CompletionCache(backend=SQLiteCacheBackend(path))
+        client = LLMClient(base_url=stub.base_url, api_key="stub", cache=restarted)
+        assert client.chat(messages) == first
+        assert stub.stats["requests"] == 2
+        print(f"Cache stats after restart: {restarted.get_stats()}")
+        assert restarted.get_stats()["backend_hits"] == 1
+    print("")
+
+def test_memory_cache_eviction():
+    """Test LRU size limits and TTL expiry of the in-memory and SQLite caches"""
+    print("Testing memory cache eviction...")
+    memory = MemoryLRUCache(max_entries=2)
+    memory.set("a", "1")
+    memory.set("b", "2")
+    memory.get("a")
+    memory.set("c", "3")  # evicts "b", the least recently used
+    assert memory.get("b") is None and memory.get("a") == "1" and memory.get("c") == "3"
+    
+    expiring = MemoryLRUCache(ttl=60)
+    expiring.set("old", "text", stored_at=time.time() - 120)
+    assert expiring.get("old") is None and len(expiring) == 0
+    
+    # The SQLite store is bounded the same way, pruning as it writes
+    with tempfile.TemporaryDirectory() as directory:
+        backend = SQLiteCacheBackend(os.path.join(directory, "cache.db"), ttl=60, max_entries=2, prune_every=1)
+        backend.set("a", "1")
+        backend.set("b", "2")
+        backend.get("a")
+        backend.set("c", "3")
+        assert backend.get("b") is None and backend.get("a")[0] == "1" and backend.get("c")[0] == "3"
+        backend.connection.execute("UPDATE completions SET stored_at = ? WHERE key = 'a'", (time.time() - 120,))
+        backend.set("d", "4")
+        assert len(backend) == 2 and backend.get("a") is None
+    print("")
+
+def test_cache_is_opt_in():
+    """Test that completions are only cached when LLM_CACHE turns the cache on"""
+    print("Testing cache default...")
+    saved = os.environ.pop("LLM_CACHE", None)
+    try:
+        assert cache_from_env() is None
+        os.environ["LLM_CACHE"] = "on"
+        assert isinstance(cache_from_env(), CompletionCache)
+    finally:
+        os.environ.pop("LLM_CACHE", None)
+        if saved is not None:
+            os.environ["LLM_CACHE"] = saved
+    print("")
+
+if __name__ == "__main__":
+    test_retries_rate_limits()
+    test_gives_up_after_max_retries()
+    test_concurrent_simulation()
+    test_token_bucket()
+    test_completion_cache()
+    test_memory_cache_eviction()
+    test_cache_is_opt_in()
+    print("All tests completed!")
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# test_local_generator.py - Tests for the seeded local conversation generator
+
+import os
+import random
+import subprocess
+import sys
+import time
+from conversation_simulator import simulate_conversations
+from local_generator import simulate_conversation_local, local_prompt_answers
+from profiles import HINGE_PROMPTS, PERSONALITY_PROMPTS
+from sample_data import local_profiles
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def test_local_engine_is_seeded():
+    """Test that the local engine writes the same conversations for the same seed, in any process"""
+    print("Testing local engine determinism...")
+    profiles = local_profiles(12)
+    conversations = simulate_conversations(profiles, engine="local")
+    print(conversations[(0, 1)])
+    assert len(conversations) == 66
+    assert conversations == simulate_conversations(profiles, engine="local")
+    assert all(len(messages) == 8 and messages[0].startswith(profiles[userA]['name'] + ": ")
+               for (userA, _), messages in conversations.items())
+    assert simulate_conversation_local(profiles[0], profiles[1], seed=1) != conversations[(0, 1)]
+
+    # String hashing is salted per process, so compare against a fresh interpreter
+    code = ("import random\nfrom profiles import generate_user_profiles\n"
+            "from local_generator import simulate_conversation_local\nrandom.seed(0)\n"
+            "profiles = generate_user_profiles(num_profiles=12, local_answers=True)\n"
+            "print(simulate_conversation_local(profiles[0], profiles[1]))\n")
+    result = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True,
+                            timeout=60, env=dict(os.environ, PYTHONHASHSEED="123"))
+    assert result.stdout.strip() == str(conversations[(0, 1)])
+    print("")
+
+def test_local_text_is_varied():
+    """Test that prompt answers and conversations cover many templates and tones"""
+    print("Testing local text variety...")
+    answers = local_prompt_answers(PERSONALITY_PROMPTS[0], HINGE_PROMPTS[:3], ["Hiking"], profile_id=7)
+    print(answers)
+    assert [answer["prompt"] for answer in answers] == HINGE_PROMPTS[:3]
+    assert all(answer["answer"] for answer in answers)
+
+    profiles = local_profiles(40)
+    tones = {}
+    messages = set()
+    for userA in profiles[:20]:
+        for userB in profiles[20:]:
+            details = {}
+            messages.update(simulate_conversation_local(userA, userB, details=details))
+            tones[details["tone"]] = tones.get(details["tone"], 0) + 1
+    print(tones, len(messages), "distinct messages")
+    assert set(tones) == {"warm", "neutral", "cold"}
+    assert len(messages) > 500
+    print("")
+
+def test_local_engine_throughput():
+    """Test that the local engine writes thousands of conversations per second"""
+    print("Testing local engine throughput...")
+    profiles = local_profiles(100)
+    start = time.perf_counter()
+    conversations = simulate_conversations(profiles, engine="local")
+    rate = len(conversations) / (time.perf_counter() - start)
+    print(f"{rate:.0f} conversations/s")
+    assert len(conversations) == 4950
+    # Typically well above 10k/s; the bound leaves room for slow CI machines
+    assert rate > 2000
+    print("")
+
+if __name__ == "__main__":
+    test_local_engine_is_seeded()
+    test_local_text_is_varied()
+    test_local_engine_throughput()
+    print("All tests completed!")
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# test_metrics.py - Tests for counters, spans and the Prometheus rendering
+
+import metrics
+from metrics import (MetricsRegistry, span, span_seconds, llm_calls, llm_tokens, sentiment_cache_lookups,
+                     pair_cache_lookups)
+from pair_cache import PairCache
+from sentiment_analyzer import SentimentCache
+from llm_client import LLMClient
+from llm_stub_server import StubLLMServer
+
+def test_prometheus_rendering():
+    """Test the text exposition format for counters, histograms and collectors"""
+    print("Testing Prometheus rendering...")
+    registry = MetricsRegistry()
+    calls = registry.counter("demo_calls_total", "Calls made")
+    calls.inc(site="a")
+    calls.inc(2, site='say "hi"')
+    latency = registry.histogram("demo_seconds", "Latency", buckets=(0.1, 1.0))
+    latency.observe(0.05, span="x")
+    latency.observe(0.5, span="x")
+    registry.add_collector(lambda: [("demo_entries", "gauge", "Entries held", [({}, 7)])])
+
+    text = registry.render()
+    print(text)
+    lines = text.splitlines()
+    assert "# TYPE demo_calls_total counter" in lines
+    assert 'demo_calls_total{site="a"} 1' in lines
+    assert 'demo_calls_total{site="say \\"hi\\""} 2' in lines
+    assert 'demo_seconds_bucket{span="x",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{span="x",le="1.0"} 2' in lines
+    assert 'demo_seconds_bucket{span="x",le="+Inf"} 2' in lines
+    assert 'demo_seconds_count{span="x"} 2' in lines
+    assert "demo_entries 7" in lines
+
+    try:
+        registry.histogram("demo_calls_total")
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+    print("")
+
+def test_spans_and_llm_counters():
+    """Test that spans record outcomes and LLM calls count requests and tokens"""
+    print("Testing spans and LLM counters...")
+    try:
+        with span("demo_span"):
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+    with span("demo_span"):
+        pass
+    assert span_seconds.count(span="demo_span", outcome="error") == 1
+    assert span_seconds.count(span="demo_span", outcome="ok") == 1
+
+    calls_before = llm_calls.value()
+    tokens_before = llm_tokens.value(kind="prompt")
+    requests_before = span_seconds.count(span="llm_request", outcome="ok")
+    with StubLLMServer() as stub:
+        client = LLMClient(base_url=stub.base_url, api_key="stub")
+        for _ in range(3):
+            client.chat([{"role": "user", "content": "Say hi to everyone in the room"}])
+    assert llm_calls.value() == calls_before + 3
+    assert span_seconds.count(span="llm_request", outcome="ok") == requests_before + 3
+    # The stub reports ~4 characters per prompt token
+    assert llm_tokens.value(kind="prompt") == tokens_before + 3 * 7
+    assert "hinge_llm_calls_total" in metrics.render_metrics()
+    print("")
+
+def test_cache_counters_survive_clear():
+    """Test that clearing a cache resets its own stats but not the monotonic lookup counters"""
+    print("Testing cache lookup counters...")
+    hits_before = sentiment_cache_lookups.value(result="hit")
+    cache = SentimentCache()
+    cache.set("hi", (0.1, 0.2))
+    cache.get("hi")
+    cache.clear()
+    cache.get("hi")
+    assert cache.get_stats()["hits"] == 0
+    assert sentiment_cache_lookups.value(result="hit") == hits_before + 1
+
+    misses_before = pair_cache_lookups.value(result="miss")
+    pairs = PairCache()
+    pairs.get_or_build((1, 2), lambda: ("value", True))
+    pairs.clear()
+    pairs.get_or_build((1, 2), lambda: ("value", True))
+    assert pair_cache_lookups.value(result="miss") == misses_before + 2
+    assert 'hinge_sentiment_cache_lookups_total{result="hit"}' in metrics.render_metrics()
+    print("")
+
+if __name__ == "__main__":
+    test_prometheus_rendering()
+    test_spans_and_llm_counters()
+    test_cache_counters_survive_clear()
+    print("All tests completed!")
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# test_pair_cache.py - Tests for the single-pair conversation cache
+
+import os
+import threading
+import time
+import llm_client
+from pair_cache import PairCache
+from profile_store import ProfileStore
+from sample_data import local_profiles
+from sentiment_analyzer import initialize_nlp
+
+def test_concurrent_requests_share_one_build():
+    """Test that requests arriving during a build wait for it instead of building again"""
+    print("Testing single-flight builds...")
+    cache = PairCache()
+    builds = []
+    def build():
+        builds.append(1)
+        time.sleep(0.2)
+        return ["Alex: hi", "Sam: hey"], True
+
+    results = []
+    key = PairCache.key(2, 1)
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_build(key, build))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(builds) == 1
+    assert all(result is results[0] for result in results)
+    assert cache.get_or_build(PairCache.key(1, 2), build) is results[0]
+    stats = cache.get_stats()
+    print(stats)
+    assert (stats["misses"], stats["coalesced"], stats["hits"], stats["in_flight"]) == (1, 7, 1, 0)
+    print("")
+
+def test_failures_and_fallbacks_are_not_cached():
+    """Test that build errors reach every waiter and that store=False values are rebuilt"""
+    print("Testing failed and fallback builds...")
+    cache = PairCache()
+    def fail():
+        raise RuntimeError("LLM down")
+    try:
+        cache.get_or_build((1, 2), fail)
+        assert False, "expected RuntimeError"
+    except RuntimeError:
+        pass
+    assert cache.get_or_build((1, 2), lambda: ("fallback", False)) == "fallback"
+    assert cache.get_or_build((1, 2), lambda: ("scored", True)) == "scored"
+    assert cache.get_or_build((1, 2), lambda: ("rebuilt", True)) == "scored"
+    print("")
+
+def test_clear_discards_builds_in_flight():
+    """Test that a build that started before clear() doesn't store its stale result"""
+    print("Testing clear during a build...")
+    cache = PairCache()
+    started = threading.Event()
+    def slow_build():
+        started.set()
+        time.sleep(0.1)
+        return "old run", True
+    thread = threading.Thread(target=cache.get_or_build, args=((1, 2), slow_build))
+    thread.start()
+    started.wait()
+    cache.clear()
+    thread.join()
+    assert cache.get_or_build((1, 2), lambda: ("new run", True)) == "new run"
+    print("")
+
+class FlakyClient:
+    """Stand-in LLM client whose first call fails"""
+    def __init__(self):
+        self.calls = 0
+
+    def chat(self, messages, **kwargs):
+        self.calls += 1
+        if self.calls == 1:
+            raise RuntimeError("LLM down")
+        return "Ava: Hey, love your hiking photos!\nBen: Thanks! Where do you usually go?"
+
+def test_placeholder_conversations_are_retried():
+    """Test that the conversation endpoint doesn't cache the placeholder a failed LLM call falls back to"""
+    print("Testing the conversation endpoint after an LLM failure...")
+    os.environ["RUN_STORE"] = "off"
+    os.environ["NLP_WARMUP"] = "lazy"
+    import app
+    initialize_nlp("lean")
+    client = FlakyClient()
+    original = llm_client._default_client
+    llm_client._default_client = client
+    try:
+        app.app_state["profiles"] = ProfileStore(local_profiles(2))
+        app.pair_cache.clear()
+        test_client = app.app.test_client()
+        first = test_client.get("/api/conversation/0/1").json
+        second = test_client.get("/api/conversation/0/1").json
+        third = test_client.get("/api/conversation/0/1").json
+    finally:
+        llm_client._default_client = original
+        test_client.post("/api/reset")
+    print(first["conversation"][0], "->", second["conversation"][0])
+    assert client.calls == 2
+    assert first["conversation"] != second["conversation"] == third["conversation"]
+    assert second["conversation"][0].startswith("Ava:")
+    print("")
+
+if __name__ == "__main__":
+    test_concurrent_requests_share_one_build()
+    test_failures_and_fallbacks_are_not_cached()
+    test_clear_discards_builds_in_flight()
+    test_placeholder_conversations_are_retried()
+    print("All tests completed!")
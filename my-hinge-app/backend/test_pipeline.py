@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# test_pipeline.py - Tests for match assembly in the pipeline stages
+
+import os
+import random
+import tempfile
+from sentiment_analyzer import initialize_nlp
+from conversation_simulator import _conversation_pairs
+from metrics import fallbacks
+from pipeline import run_analyze_sentiment, update_analysis
+from run_store import RunStore
+from sample_data import make_profiles, make_conversations
+
+def test_incremental_analysis_matches_full_run():
+    """Test that adding profiles incrementally gives the same results as re-analyzing everything"""
+    print("Testing incremental analysis...")
+    initialize_nlp("lean")
+    rng = random.Random(7)
+    
+    profiles = make_profiles(12)
+    conversations = make_conversations(_conversation_pairs(profiles), rng)
+    analysis = run_analyze_sentiment(profiles, conversations, {})
+    directory = tempfile.TemporaryDirectory()
+    store = RunStore(os.path.join(directory.name, "runs.db"))
+    run_id = store.create_run()
+    store.save_analysis(run_id, analysis)
+    
+    # Grow the pool twice, storing only what changed
+    for start, count in [(12, 3), (15, 1)]:
+        new_profiles = make_profiles(count, start=start)
+        profiles = profiles + new_profiles
+        new_pairs = _conversation_pairs(profiles, new_ids={p['id'] for p in new_profiles})
+        assert len(new_pairs) == count * start + count * (count - 1) // 2
+        new_conversations = make_conversations(new_pairs, rng)
+        changes = {}
+        update_analysis(analysis, profiles, new_conversations, {}, changes=changes)
+        store.save_analysis(run_id, analysis, changes=changes)
+        conversations.update(new_conversations)
+        assert len(changes['pairs']) == len(new_pairs)
+        assert {p['id'] for p in new_profiles} <= set(changes['users']) <= set(analysis['results'])
+    
+    full = run_analyze_sentiment(profiles, conversations, {})
+    print(f"{len(full['all_pairs'])} pairs, {len(full['results'])} users")
+    assert analysis['all_pairs'] == full['all_pairs']
+    assert analysis['results'] == full['results']
+    
+    # The stored run (ties included) reads back as the full analysis
+    assert store.load_analysis(run_id) == {'results': full['results'], 'all_pairs': full['all_pairs']}
+    store.close()
+    directory.cleanup()
+    
+    # Results reference conversations by pair id rather than embedding them
+    for pair in full['all_pairs']:
+        assert 'conversation' not in pair
+        assert pair['pair_id'] == f"{pair['userA_id']}-{pair['userB_id']}"
+        assert (pair['userA_id'], pair['userB_id']) in conversations
+    print("")
+
+def test_bad_conversation_gets_neutral_score():
+    """Test that a conversation that breaks the batched scoring gets 0.5 without failing the others"""
+    print("Testing per-pair scoring fallback...")
+    initialize_nlp("lean")
+    profiles = make_profiles(3)
+    conversations = make_conversations(_conversation_pairs(profiles), random.Random(3))
+    expected = run_analyze_sentiment(profiles, conversations, {})
+    conversations[(0, 2)] = ["User0: hi", None]
+    before = fallbacks.value(site="sentiment")
+    analysis = run_analyze_sentiment(profiles, conversations, {})
+    scores = {(pair['userA_id'], pair['userB_id']): pair['sentiment_score'] for pair in analysis['all_pairs']}
+    print(scores)
+    assert scores[(0, 2)] == 0.5
+    assert all(scores[(p['userA_id'], p['userB_id'])] == p['sentiment_score']
+               for p in expected['all_pairs'] if (p['userA_id'], p['userB_id']) != (0, 2))
+    assert fallbacks.value(site="sentiment") == before + 1
+    assert analysis['sentiment_cache']['messages'] == 8
+    print("")
+
+if __name__ == "__main__":
+    test_incremental_analysis_matches_full_run()
+    test_bad_conversation_gets_neutral_score()
+    print("All tests completed!")
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# test_profile_store.py - Tests for the indexed profile store
+
+from profile_store import Profile, ProfileStore
+
+PROFILES = [
+    {'id': 0, 'name': "Alex0", 'age': 25, 'bio': "Fitness enthusiast", 'interests': ["Yoga", "Hiking"],
+     'personality': "Calm", 'prompt_answers': None},
+    {'id': 1, 'name': "Jordan1", 'age': 31, 'bio': "Tech geek into AI", 'interests': ["Gaming"],
+     'personality': "Curious", 'prompt_answers': [{"prompt": "Green flags I look for", "answer": "Kindness"}],
+     'pronouns': "they/them"},
+]
+
+def test_profile_dict_compatibility():
+    """Test that Profile reads like the profile dicts it replaces"""
+    print("Testing profile dict compatibility...")
+    profile = Profile.from_dict(PROFILES[1])
+    assert profile['name'] == "Jordan1"
+    assert profile.get('age') == 31
+    assert profile['pronouns'] == "they/them"
+    assert profile.get('missing', "default") == "default"
+    assert 'prompt_answers' in profile
+
+    # Unset fields behave like missing keys and are left out of to_dict
+    assert 'prompt_answers' not in Profile.from_dict(PROFILES[0])
+    try:
+        Profile.from_dict(PROFILES[0])['prompt_answers']
+        assert False, "expected KeyError"
+    except KeyError:
+        pass
+    assert Profile.from_dict(PROFILES[1]).to_dict() == PROFILES[1]
+    print("")
+
+def test_profile_store_lookup():
+    """Test id and name lookups and incremental adds"""
+    print("Testing profile store lookup...")
+    store = ProfileStore(PROFILES)
+    assert len(store) == 2
+    assert store.get(1).name == "Jordan1"
+    assert store.get_by_name("Alex0").id == 0
+    assert store.get(5) is None
+    assert store.name_of(5) == "User 5"
+    assert [p.id for p in store] == [0, 1]
+
+    added = store.add([{'id': store.next_id(), 'name': "Sam2"}])
+    assert added[0].id == 2 and 2 in store
+    assert ProfileStore.of(store) is store
+    try:
+        store.add([{'id': 0, 'name': "Duplicate"}])
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+    print("")
+
+if __name__ == "__main__":
+    test_profile_dict_compatibility()
+    test_profile_store_lookup()
+    print("All tests completed!")
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# test_profiles.py - Tests for parallel and batched profile generation against the local stub server
+
+import random
+import time
+from llm_client import LLMClient
+from llm_stub_server import StubLLMServer
+from profiles import generate_user_profiles
+
+def test_parallel_generation_is_ordered():
+    """Test that parallel generation returns the same profiles, in id order, as serial generation"""
+    print("Testing parallel profile generation...")
+    with StubLLMServer(latency=0.02) as stub:
+        client = LLMClient(base_url=stub.base_url, api_key="stub", concurrency=8)
+        random.seed(42)
+        serial = generate_user_profiles(12, concurrency=1, client=client)
+        random.seed(42)
+        parallel = generate_user_profiles(12, concurrency=8, client=client)
+    
+    assert [p['id'] for p in parallel] == list(range(12))
+    assert parallel == serial
+    for profile in parallel:
+        print(f"{profile['name']}: {[a['prompt'] for a in profile['prompt_answers']]}")
+        assert len(profile['prompt_answers']) == 3
+        assert profile['prompt_answers'][0]['answer'] == "Honestly, ask me in person!"
+    print("")
+
+def test_batched_generation():
+    """Test that batch mode splits one completion back into per-profile answers"""
+    print("Testing batched profile generation...")
+    with StubLLMServer() as stub:
+        client = LLMClient(base_url=stub.base_url, api_key="stub")
+        profiles = generate_user_profiles(10, batch_size=4, client=client)
+        print(f"Generated {len(profiles)} profiles with {stub.stats['requests']} requests")
+        assert stub.stats['requests'] == 3
+    
+    for profile in profiles:
+        # The stub echoes each profile's own prompts back
+        assert [a['answer'] for a in profile['prompt_answers']] == ["Honestly, ask me in person!"] * 3
+    print("")
+
+def test_wall_clock_scales_with_concurrency():
+    """Test that generation time is bounded by concurrency rather than profile count"""
+    print("Testing generation wall-clock time...")
+    with StubLLMServer(latency=0.1) as stub:
+        client = LLMClient(base_url=stub.base_url, api_key="stub", concurrency=20)
+        start = time.time()
+        generate_user_profiles(40, concurrency=20, client=client)
+        elapsed = time.time() - start
+    print(f"Generated 40 profiles in {elapsed:.2f}s with concurrency 20")
+    # Two rounds of 0.1s instead of 40 sequential calls
+    assert elapsed < 1.0
+    print("")
+
+if __name__ == "__main__":
+    test_parallel_generation_is_ordered()
+    test_batched_generation()
+    test_wall_clock_scales_with_concurrency()
+    print("All tests completed!")
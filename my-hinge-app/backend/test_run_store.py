@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# test_run_store.py - Tests for the persistent run store
+
+import os
+import sqlite3
+import tempfile
+import time
+from run_store import RunStore
+from sample_data import make_profiles, make_conversations
+
+def test_run_round_trip():
+    """Test that a run's profiles, conversations and analysis come back as saved"""
+    print("Testing run round trip...")
+    with tempfile.TemporaryDirectory() as directory:
+        store = RunStore(os.path.join(directory, "runs.db"))
+        run_id = store.create_run({"num_profiles": 3})
+        profiles = [{'id': i, 'name': f"User{i}", 'age': 20 + i} for i in range(3)]
+        store.save_profiles(run_id, profiles)
+
+        # Conversations arrive out of order; the recorded order wins on load
+        conversations = {(0, 1): ["User0: Hi"], (0, 2): ["User0: Hello"], (1, 2): ["User1: Hey"]}
+        with store.conversation_writer(run_id, batch_size=2) as writer:
+            for key in [(1, 2), (0, 2), (0, 1)]:
+                writer.add(key, conversations[key])
+        store.set_conversation_order(run_id, conversations)
+
+        all_pairs = [
+            {'userA_id': 0, 'userB_id': 2, 'userA_name': "User0", 'userB_name': "User2", 'sentiment_score': 0.8, 'pair_id': "0-2"},
+            {'userA_id': 0, 'userB_id': 1, 'userA_name': "User0", 'userB_name': "User1", 'sentiment_score': 0.5, 'pair_id': "0-1"},
+            {'userA_id': 1, 'userB_id': 2, 'userA_name': "User1", 'userB_name': "User2", 'sentiment_score': 0.5, 'pair_id': "1-2"},
+        ]
+        results = {p['id']: {'user': p, 'matches': []} for p in profiles}
+        details = {(0, 1): [("User0", 0.0, 0.5)]}
+        store.save_analysis(run_id, {'results': results, 'all_pairs': all_pairs}, details)
+        store.close()
+
+        # A new process sees the same run
+        store = RunStore(os.path.join(directory, "runs.db"))
+        assert store.latest_run_id() == run_id
+        assert store.load_profiles(run_id) == profiles
+        assert list(store.load_conversations(run_id).items()) == list(conversations.items())
+        assert store.get_conversation(run_id, 2, 0) == ["User0: Hello"]
+        analysis = store.load_analysis(run_id)
+        assert analysis == {'results': results, 'all_pairs': all_pairs}
+        assert store.load_message_sentiment(run_id, 0, 1) == [("User0", 0.0, 0.5)]
+        run = store.get_run(run_id)
+        print(f"Run: {run['status']}, {run['num_profiles']} profiles, {run['num_conversations']} conversations")
+        assert run['status'] == "analyzed" and run['num_pair_scores'] == 3
+
+        # Re-simulating drops the conversations and everything derived from them
+        store.clear_conversations(run_id)
+        assert store.load_conversations(run_id) == {} and store.load_analysis(run_id) is None
+        store.close()
+    print("")
+
+def test_bulk_write_throughput():
+    """Test that batched conversation writes sustain thousands per second"""
+    print("Testing bulk write throughput...")
+    with tempfile.TemporaryDirectory() as directory:
+        store = RunStore(os.path.join(directory, "runs.db"))
+        run_id = store.create_run()
+        profiles = make_profiles(20001)
+        conversations = make_conversations(zip(profiles, profiles[1:]), turns=8)
+
+        start = time.perf_counter()
+        with store.conversation_writer(run_id) as writer:
+            for key, messages in conversations.items():
+                writer.add(key, messages)
+        elapsed = time.perf_counter() - start
+        print(f"Wrote {len(conversations)} conversations in {elapsed:.2f}s ({len(conversations) / elapsed:.0f}/s)")
+
+        assert len(store.load_conversations(run_id)) == len(conversations)
+        assert len(conversations) / elapsed > 2000
+        store.close()
+    print("")
+
+def test_job_runs_are_not_current():
+    """Test that runs of independent jobs are never picked as the latest run, in new and older databases"""
+    print("Testing run sources...")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "runs.db")
+        # A database from before runs had a source
+        connection = sqlite3.connect(path)
+        connection.execute("CREATE TABLE runs (id INTEGER PRIMARY KEY AUTOINCREMENT, status TEXT NOT NULL, "
+                           "options TEXT NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL)")
+        connection.execute("INSERT INTO runs (status, options, created_at, updated_at) VALUES ('analyzed', '{}', 0, 0)")
+        connection.commit()
+        connection.close()
+
+        store = RunStore(path)
+        assert store.get_run(1)["source"] == "app"
+        job_run = store.create_run(source="job")
+        assert store.latest_run_id() == 1
+        assert store.latest_run_id(source=None) == job_run
+        app_run = store.create_run()
+        assert store.latest_run_id() == app_run
+        assert [run["source"] for run in store.list_runs()] == ["app", "job", "app"]
+        store.close()
+    print("")
+
+if __name__ == "__main__":
+    test_run_round_trip()
+    test_bulk_write_throughput()
+    test_job_runs_are_not_current()
+    print("All tests completed!")
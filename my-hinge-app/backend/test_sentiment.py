@@ -1,7 +1,14 @@
 #!/usr/bin/env python3
 # test_sentiment.py - Test script for sentiment analysis
 
-from sentiment_analyzer import initialize_nlp, analyze_sentiment
+import random
+import sentiment_analyzer
+from sentiment_analyzer import (initialize_nlp, analyze_sentiment, analyze_sentiment_batch, load_nlp, SentimentCache,
+                                start_scoring_pool, shutdown_scoring_pool, _compatibility_score, _compatibility_scores)
+from conversation_simulator import _placeholder_conversation
+from comprehensive_sentiment_test import TEST_CASES
+from textblob import TextBlob
+import threading
 import time
 
 def test_simple_conversation():
@@ -69,6 +76,187 @@ def test_one_sided_conversation():
     print(f"One-sided conversation sentiment score: {score}")
     print("")
 
+def test_batch_conversations():
+    """Test that batched analysis matches scoring each conversation on its own"""
+    print("Testing batched conversations...")
+    initialize_nlp("lean")
+    conversations = {
+        (0, 1): [
+            "Alex: Hey there! How's it going?",
+            "Sam: Pretty good, thanks for asking! How about you?",
+            "Alex: I'm doing great. I really enjoyed that movie we talked about.",
+            "Sam: Me too! It was fantastic. We should watch more films like that."
+        ],
+        (0, 2): [
+            "Alex: I didn't like that restaurant at all.",
+            "Jordan: Me neither. The service was terrible and the food was cold."
+        ],
+        (1, 2): []
+    }
+    
+    batch_scores = analyze_sentiment_batch(conversations, batch_size=2)
+    for pair, conversation in conversations.items():
+        single_score = analyze_sentiment(conversation)
+        print(f"Pair {pair}: batch score {batch_scores[pair]}, single score {single_score}")
+        assert batch_scores[pair] == single_score
+    # Real NLP scores, not the neutral fallback compared with itself
+    assert batch_scores[(0, 1)] > 0.5 > batch_scores[(0, 2)]
+    print("")
+
+def test_lean_pipeline_parity():
+    """Test that the lean pipeline scores the comprehensive test corpus exactly like the full one"""
+    print("Testing lean pipeline parity...")
+    lean_nlp = load_nlp("lean")
+    try:
+        full_nlp = load_nlp("full")
+    except OSError:
+        # en_core_web_sm isn't installed; spacytextblob scores the raw text with
+        # TextBlob, so compare against TextBlob directly instead
+        print("en_core_web_sm not available, comparing against TextBlob directly")
+        full_nlp = None
+    
+    for test_case in TEST_CASES:
+        for message in test_case["conversation"]:
+            content = message[message.find(':')+1:].strip()
+            lean_doc = lean_nlp(content)
+            lean_scores = (lean_doc._.blob.polarity, lean_doc._.blob.subjectivity)
+            if full_nlp is not None:
+                full_doc = full_nlp(content)
+                full_scores = (full_doc._.blob.polarity, full_doc._.blob.subjectivity)
+            else:
+                blob = TextBlob(content)
+                full_scores = (blob.polarity, blob.subjectivity)
+            assert lean_scores == full_scores, f"{content!r}: lean {lean_scores} != full {full_scores}"
+    print("Lean pipeline matches the full pipeline on every message")
+    print("")
+
+def test_sentiment_cache_reuse():
+    """Test that placeholder conversations mostly hit the name-masked message cache"""
+    print("Testing sentiment cache reuse...")
+    initialize_nlp("lean")
+    profiles = [{'name': name, 'interests': ["Hiking"]} for name in ["Alex0", "Sam1", "Jordan2", "Taylor3", "Casey4"]]
+    conversations = {
+        (i, j): _placeholder_conversation(profiles[i], profiles[j])
+        for i in range(len(profiles)) for j in range(i + 1, len(profiles))
+    }
+    
+    original_cache = sentiment_analyzer.sentiment_cache
+    try:
+        sentiment_analyzer.sentiment_cache = SentimentCache(mask_names=False)
+        plain_scores = analyze_sentiment_batch(conversations)
+        
+        sentiment_analyzer.sentiment_cache = SentimentCache(mask_names=True)
+        stats = {}
+        masked_scores = analyze_sentiment_batch(conversations, stats=stats)
+    finally:
+        sentiment_analyzer.sentiment_cache = original_cache
+    
+    print(f"Run stats: {stats}")
+    # 10 conversations x 6 lines reduce to the 6 distinct masked lines
+    assert stats["messages"] == 60 and stats["scored"] == 6
+    assert stats["hit_rate"] == 0.9
+    assert masked_scores == plain_scores
+    print("")
+
+def test_scoring_pool_parity():
+    """Test that scoring across worker processes gives the same scores, details and order as in-process"""
+    print("Testing process pool scoring parity...")
+    initialize_nlp("lean")
+    # Numbered copies of the test corpus so every message is a distinct text
+    conversations = {
+        (copy, index): [f"{message} ({copy})" for message in test_case["conversation"]]
+        for copy in range(20) for index, test_case in enumerate(TEST_CASES)
+    }
+    
+    original_cache = sentiment_analyzer.sentiment_cache
+    try:
+        runs = {}
+        for workers in (1, 2):
+            sentiment_analyzer.sentiment_cache = SentimentCache(max_entries=0)
+            details = {}
+            progress = []
+            start = time.perf_counter()
+            scores = analyze_sentiment_batch(conversations, batch_size=16, workers=workers, details=details,
+                                             progress_callback=lambda done, total: progress.append(done))
+            print(f"{workers} worker(s): {time.perf_counter() - start:.2f}s")
+            runs[workers] = (list(scores.items()), details, progress)
+    finally:
+        sentiment_analyzer.sentiment_cache = original_cache
+        shutdown_scoring_pool()
+    
+    assert runs[2] == runs[1]
+    print("")
+
+def test_scoring_pool_not_forked_from_threads():
+    """Test that a pool first needed on a worker thread doesn't fork the process, and scores the same"""
+    print("Testing scoring pool start methods...")
+    initialize_nlp("lean")
+    conversations = {index: test_case["conversation"] for index, test_case in enumerate(TEST_CASES)}
+    original_cache = sentiment_analyzer.sentiment_cache
+    results = {}
+    def score():
+        results["scores"] = analyze_sentiment_batch(conversations, batch_size=2, workers=2)
+        results["method"] = sentiment_analyzer._scoring_pool._mp_context.get_start_method()
+    try:
+        # Nothing cached, so every batch reaches the pool
+        sentiment_analyzer.sentiment_cache = SentimentCache(max_entries=0)
+        expected = analyze_sentiment_batch(conversations, batch_size=2, workers=1)
+        thread = threading.Thread(target=score)
+        thread.start()
+        thread.join()
+        assert results["method"] != "fork", results["method"]
+        assert results["scores"] == expected
+        # An existing pool is reused rather than replaced
+        assert start_scoring_pool(2) is sentiment_analyzer._scoring_pool
+        shutdown_scoring_pool()
+        
+        # Started up front, the workers are forked and share the loaded model
+        pool = start_scoring_pool(2)
+        assert pool._mp_context.get_start_method() == "fork"
+        assert analyze_sentiment_batch(conversations, batch_size=2, workers=2) == expected
+    finally:
+        sentiment_analyzer.sentiment_cache = original_cache
+        shutdown_scoring_pool()
+    print("")
+
+def test_vectorized_compatibility_parity():
+    """Test that the NumPy compatibility pass reproduces the per-conversation scores exactly"""
+    print("Testing vectorized compatibility scores...")
+    rng = random.Random(7)
+    # Coarse polarities force ties between halves; -0.0 and 0 check signed zeros
+    levels = [-1.0, -0.5, -0.0, 0, 0.1, 0.25, 1 / 3, 0.5, 0.8, 1.0]
+    conversations = []
+    for _ in range(2000):
+        speakers = [f"User{i}" for i in range(rng.choice([0, 1, 2, 2, 2, 3]))]
+        length = rng.randint(0, 12) if speakers else 0
+        conversations.append([
+            (rng.choice(speakers), rng.choice(levels) if rng.random() < 0.5 else rng.uniform(-1, 1), rng.random())
+            for _ in range(length)
+        ])
+    
+    polarities, message_users, user_owners = [], [], []
+    for index, messages in enumerate(conversations):
+        user_ids = {}
+        for name, polarity, _ in messages:
+            if name not in user_ids:
+                user_ids[name] = len(user_owners)
+                user_owners.append(index)
+            message_users.append(user_ids[name])
+            polarities.append(polarity)
+    
+    start = time.perf_counter()
+    expected = [_compatibility_score([(name, "", polarity, subjectivity) for name, polarity, subjectivity in messages],
+                                     verbose=False) for messages in conversations]
+    loop_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    vectorized = _compatibility_scores(polarities, message_users, user_owners, len(conversations)).tolist()
+    vectorized_seconds = time.perf_counter() - start
+    print(f"Loop: {loop_seconds * 1000:.1f}ms, vectorized: {vectorized_seconds * 1000:.1f}ms")
+    
+    mismatches = [i for i, (a, b) in enumerate(zip(expected, vectorized)) if a != b]
+    assert not mismatches, f"conversation {mismatches[0]}: {expected[mismatches[0]]!r} != {vectorized[mismatches[0]]!r}"
+    print("")
+
 if __name__ == "__main__":
     print("Initializing NLP...")
     initialize_nlp()
@@ -80,5 +268,11 @@ if __name__ == "__main__":
     test_mixed_conversation()
     test_empty_conversation()
     test_one_sided_conversation()
+    test_batch_conversations()
+    test_lean_pipeline_parity()
+    test_sentiment_cache_reuse()
+    test_scoring_pool_parity()
+    test_scoring_pool_not_forked_from_threads()
+    test_vectorized_compatibility_parity()
     
     print("All tests completed!") 
\ No newline at end of file
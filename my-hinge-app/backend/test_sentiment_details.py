@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# test_sentiment_details.py - Tests for columnar per-message sentiment and its export
+
+import os
+import tempfile
+from sentiment_analyzer import initialize_nlp, analyze_sentiment, analyze_sentiment_batch
+from sentiment_details import SentimentDetails
+from sample_data import sample_run
+
+def sample_conversations(num_profiles=8):
+    _, conversations = sample_run(num_profiles)
+    # A malformed line keeps its slot, so positions must skip it
+    conversations[(0, 1)] = ["not a message"] + conversations[(0, 1)]
+    return conversations
+
+def test_columnar_matches_dict_details():
+    """Test that the columns hold exactly what the dict form of details holds"""
+    print("Testing columnar details...")
+    initialize_nlp("lean")
+    conversations = sample_conversations()
+    as_dict, columns = {}, SentimentDetails()
+    scores = analyze_sentiment_batch(conversations, details=as_dict)
+    assert analyze_sentiment_batch(conversations, details=columns) == scores
+
+    assert len(columns) == len(as_dict) == len(conversations)
+    assert columns.num_messages == sum(len(messages) for messages in as_dict.values())
+    assert dict(columns.items()) == as_dict
+    assert columns[(0, 1)] == as_dict[(0, 1)]
+    print(f"{columns.num_messages} messages in {columns.nbytes} bytes of columns")
+
+    # Text is read back from the conversations by reference
+    first = columns._rows(columns.keys.index((0, 1))).start
+    assert columns.position[first] == 1
+    assert columns.text(first) == conversations[(0, 1)][1].split(":", 1)[1].strip()
+
+    single = SentimentDetails()
+    score = analyze_sentiment(conversations[(0, 1)], details=single, key=(0, 1))
+    assert score == scores[(0, 1)]
+    assert single[(0, 1)] == as_dict[(0, 1)]
+    print("")
+
+def test_parquet_export():
+    """Test that the Parquet and Arrow files round-trip the columns"""
+    print("Testing Parquet export...")
+    try:
+        import pyarrow.parquet as pq
+        import pyarrow.feather as feather
+    except ImportError:
+        print("pyarrow not installed, skipping")
+        return
+    initialize_nlp("lean")
+    conversations = sample_conversations()
+    details = SentimentDetails()
+    analyze_sentiment_batch(conversations, details=details)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "sentiment.parquet")
+        details.write_parquet(path, include_text=True)
+        table = pq.read_table(path)
+        arrow_path = os.path.join(directory, "sentiment.arrow")
+        details.write_arrow(arrow_path)
+        assert feather.read_table(arrow_path).num_rows == details.num_messages
+    print(table.schema)
+
+    assert table.column_names == ["userA_id", "userB_id", "message_index", "speaker", "polarity", "subjectivity", "text"]
+    rows = table.to_pylist()
+    assert len(rows) == details.num_messages
+    assert rows[0]["userA_id"] == details.keys[0][0]
+    assert [row["polarity"] for row in rows] == details.polarity.tolist()
+    assert rows[0]["text"] == details.text(0)
+    assert rows[0]["speaker"] == details.speakers[details.speaker[0]]
+    print("")
+
+if __name__ == "__main__":
+    test_columnar_matches_dict_details()
+    test_parquet_export()
+    print("All tests completed!")
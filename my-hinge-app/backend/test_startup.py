@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# test_startup.py - Tests for lazy imports, NLP warm-up and the readiness endpoint
+
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import sentiment_analyzer
+from pipeline import run_match_scores
+from run_store import RunStore
+from sample_data import sample_run
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def run_in_fresh_process(code, stderr=False, **env):
+    """Run code in a new interpreter (so nothing is imported yet) and return its stdout (after stderr if asked)"""
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True, timeout=60,
+        env=dict(os.environ, NLP_MODE="lean", **env)
+    )
+    assert result.returncode == 0, result.stderr
+    return result.stderr + result.stdout if stderr else result.stdout
+
+def stored_run(path, num_profiles=60):
+    """Save an analyzed run (made-up scores, so no model is needed) at `path`"""
+    profiles, conversations = sample_run(num_profiles)
+    store = RunStore(path)
+    run_id = store.create_run()
+    store.save_profiles(run_id, profiles)
+    store.save_conversations(run_id, conversations)
+    store.save_analysis(run_id, run_match_scores(profiles, ((pair, random.random()) for pair in conversations), {}))
+    store.close()
+    return len(conversations)
+
+def test_app_import_is_lazy():
+    """Test that importing the app doesn't pull in spaCy or the OpenAI SDK, nor wait for the stored run"""
+    print("Testing lazy app import...")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "runs.db")
+        num_conversations = stored_run(path)
+        output = run_in_fresh_process(
+            "import sys, threading, time\n"
+            "start = time.perf_counter()\n"
+            "import app\n"
+            "print(round(time.perf_counter() - start, 3))\n"
+            "print(sorted(name for name in ('spacy', 'openai') if name in sys.modules))\n"
+            "client = app.app.test_client()\n"
+            "print(client.get('/api/status').json['nlp_state'])\n"
+            "for thread in threading.enumerate():\n"
+            "    if thread.name == 'run-restore':\n"
+            "        thread.join()\n"
+            "response = client.get('/api/ready')\n"
+            "print(response.status_code, response.json['restore']['state'], len(app.app_state['conversations']))\n",
+            NLP_WARMUP="lazy", RUN_STORE="on", RUN_STORE_PATH=path
+        )
+    print(output)
+    seconds, heavy_modules, nlp_state, ready = output.splitlines()
+    assert heavy_modules == "[]"
+    assert nlp_state == "cold"
+    assert ready == f"200 done {num_conversations}"
+    assert float(seconds) < 1.0
+    print("")
+
+def test_background_warmup_readiness():
+    """Test that /api/ready turns 200 once the background warm-up has loaded the model"""
+    print("Testing background warm-up...")
+    output = run_in_fresh_process(
+        "import app, threading\n"
+        "client = app.app.test_client()\n"
+        "print(client.get('/api/status').status_code)\n"
+        "warmup = [t for t in threading.enumerate() if t.name == 'nlp-warmup']\n"
+        "for thread in warmup:\n"
+        "    thread.join()\n"
+        "response = client.get('/api/ready')\n"
+        "print(response.status_code, response.json['nlp']['state'])\n",
+        NLP_WARMUP="background", RUN_STORE="off"
+    )
+    print(output)
+    assert output.splitlines() == ["200", "200 ready"]
+    print("")
+
+def test_multiple_workers_warn():
+    """Test that configuring several server workers logs a warning, since state is per process"""
+    print("Testing the worker count check...")
+    output = run_in_fresh_process(
+        "import logging, app\n"
+        "print(app.configured_workers({}), app.configured_workers({'GUNICORN_CMD_ARGS': '-b :5001 -w 3'}))\n",
+        NLP_WARMUP="lazy", RUN_STORE="off", WEB_CONCURRENCY="2", stderr=True
+    )
+    print(output)
+    assert output.splitlines()[-1] == "1 3"
+    assert "2 worker processes configured" in output
+    print("")
+
+def test_concurrent_initialize_loads_once():
+    """Test that threads racing to initialize the model share one load"""
+    print("Testing concurrent NLP initialization...")
+    loads = []
+    original_load = sentiment_analyzer.load_nlp
+    original = (sentiment_analyzer.nlp, sentiment_analyzer.nlp_mode)
+    sentiment_analyzer.load_nlp = lambda mode: loads.append(mode) or original_load(mode)
+    sentiment_analyzer.nlp = None
+    try:
+        threads = [threading.Thread(target=sentiment_analyzer.initialize_nlp, args=("lean",)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sentiment_analyzer.load_nlp = original_load
+    assert loads == ["lean"]
+    assert sentiment_analyzer.get_nlp_status()["state"] == "ready"
+    if original[0] is not None:
+        sentiment_analyzer.nlp, sentiment_analyzer.nlp_mode = original
+    print("")
+
+if __name__ == "__main__":
+    test_app_import_is_lazy()
+    test_background_warmup_readiness()
+    test_multiple_workers_warn()
+    test_concurrent_initialize_loads_once()
+    print("All tests completed!")
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# test_topk.py - Property test: streaming top-K selection matches sort-then-fill
+
+import random
+from topk import TopKSelector
+
+def reference_top_k(pairs, k):
+    """The original selection: stable-sort every pair best first, then fill each user's list in order"""
+    matches = {}
+    for pair_index, (userA_id, userB_id, score) in sorted(enumerate(pairs), key=lambda x: x[1][2], reverse=True):
+        for user_id, partner_id in ((userA_id, userB_id), (userB_id, userA_id)):
+            user_list = matches.setdefault(user_id, [])
+            if len(user_list) < k:
+                user_list.append((partner_id, score, pair_index))
+    return matches
+
+def streaming_top_k(pairs, k):
+    selector = TopKSelector(k)
+    for pair_index, (userA_id, userB_id, score) in enumerate(pairs):
+        selector.offer(userA_id, score, (userB_id, score, pair_index))
+        selector.offer(userB_id, score, (userA_id, score, pair_index))
+    return {user_id: selector.top(user_id) for user_id in selector.keys()}
+
+def test_streaming_top_k_matches_sort():
+    """Test that the heap selector picks the same matches, in the same order, on random inputs"""
+    print("Testing streaming top-K against sort-based selection...")
+    rng = random.Random(11)
+    for trial in range(300):
+        num_users = rng.randint(2, 15)
+        k = rng.randint(1, 5)
+        # Coarse scores force plenty of ties
+        levels = rng.choice([3, 10, 1000])
+        pairs = [
+            (a, b, rng.randint(0, levels) / levels)
+            for a in range(num_users) for b in range(a + 1, num_users)
+        ]
+        rng.shuffle(pairs)
+        assert streaming_top_k(pairs, k) == reference_top_k(pairs, k), f"trial {trial} differs"
+    print("300 random trials agree")
+    print("")
+
+def test_selector_bounds_memory():
+    """Test that each key holds at most K items"""
+    print("Testing selector memory bound...")
+    selector = TopKSelector(2)
+    for i in range(1000):
+        selector.offer("user", i % 17, i)
+    assert len(selector.heaps["user"]) == 2
+    assert selector.top("user") == [16, 33]
+    assert not selector.accepts("user", 16)
+    print("")
+
+if __name__ == "__main__":
+    test_streaming_top_k_matches_sort()
+    test_selector_bounds_memory()
+    print("All tests completed!")
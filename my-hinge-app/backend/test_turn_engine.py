@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# test_turn_engine.py - Tests for the turn-by-turn engine and the token budget
+
+from conversation_simulator import simulate_conversations
+from llm_client import LLMClient, TokenBudget
+from llm_stub_server import StubLLMServer
+from turn_engine import simulate_conversation_turns, END_MARKER
+
+NAMES = ["Alex", "Blake", "Casey", "Devon", "Emery", "Finley", "Harper", "Jordan"]
+PROFILES = [
+    {"id": f"u{index}", "name": name, "age": 25 + index, "bio": "Coffee and long walks",
+     "interests": ["hiking", "coffee"], "personality": "friendly", "prompt_answers": []}
+    for index, name in enumerate(NAMES)
+]
+
+def test_early_stopping_saves_tokens():
+    """Test that cold conversations stop early and spend fewer tokens than full ones"""
+    print("Testing turn engine early stopping...")
+    with StubLLMServer() as stub:
+        client = LLMClient(base_url=stub.base_url, api_key="stub")
+        full_stats, stats = {}, {}
+        full = simulate_conversations(PROFILES, client=client, engine="turns", stats=full_stats,
+                                      engine_options={"stop_polarity": None}, token_budget=10**9)
+        early = simulate_conversations(PROFILES, client=client, engine="turns", stats=stats, token_budget=10**9)
+    print(full_stats)
+    print(stats)
+
+    assert full_stats["stop_reasons"] == {"completed": 28}
+    assert all(len(messages) == 8 for messages in full.values())
+    assert stats["early_stopped_pairs"] > 0
+    assert stats["stop_reasons"].get("negative") == stats["early_stopped_pairs"]
+    assert stats["tokens_used"] < full_stats["tokens_used"]
+    assert len(early) == 28
+    assert all(len(early[pair]) < 8 for pair in early if len(early[pair]) != len(full[pair]))
+    print("")
+
+def test_token_budget_cap():
+    """Test that the budget is never exceeded and pairs it can't cover are skipped"""
+    print("Testing token budget cap...")
+    with StubLLMServer() as stub:
+        client = LLMClient(base_url=stub.base_url, api_key="stub")
+        stats = {}
+        conversations = simulate_conversations(PROFILES, client=client, engine="turns", stats=stats,
+                                               token_budget=12000, concurrency=2)
+    print(stats)
+    assert stats["tokens_used"] <= 12000
+    assert stats["budget_skipped_pairs"] > 0
+    assert len(conversations) + stats["budget_skipped_pairs"] == 28
+    assert all(len(messages) >= 2 for messages in conversations.values())
+
+    budget = TokenBudget(100)
+    assert budget.reserve(80) and not budget.reserve(30)
+    budget.settle(80, 50)
+    assert budget.reserve(30)
+    assert budget.get_stats()["budget_refusals"] == 1
+    print("")
+
+def test_engine_selection():
+    """Test that the single-call engine stays the default and unknown engines are rejected"""
+    print("Testing engine selection...")
+    with StubLLMServer() as stub:
+        client = LLMClient(base_url=stub.base_url, api_key="stub")
+        default = simulate_conversations(PROFILES[:3], client=client)
+        single = simulate_conversations(PROFILES[:3], client=client, engine="single")
+        assert default == single
+        try:
+            simulate_conversations(PROFILES[:3], client=client, engine="poetry")
+            assert False, "expected ValueError"
+        except ValueError:
+            pass
+    print("")
+
+class RefusingClient:
+    """Stand-in LLM client whose personas leave before saying anything"""
+    concurrency = 2
+
+    def chat(self, messages, **kwargs):
+        return END_MARKER
+
+def test_refused_conversations_are_failed_pairs():
+    """Test that a conversation ending before two messages is left out rather than scored"""
+    print("Testing conversations that end on the first turn...")
+    details = {}
+    assert simulate_conversation_turns(PROFILES[0], PROFILES[1], client=RefusingClient(), details=details) is None
+    assert details["stop_reason"] == "ended" and details["turns"] == 0
+
+    stats = {}
+    conversations = simulate_conversations(PROFILES[:3], client=RefusingClient(), engine="turns", stats=stats)
+    print(stats)
+    assert conversations == {}
+    assert stats["failed_pairs"] == 3 and stats["stop_reasons"] == {"ended": 3}
+    print("")
+
+if __name__ == "__main__":
+    test_early_stopping_saves_tokens()
+    test_token_budget_cap()
+    test_engine_selection()
+    test_refused_conversations_are_failed_pairs()
+    print("All tests completed!")
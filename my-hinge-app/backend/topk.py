@@ -0,0 +1,45 @@
+# topk.py
+# Streaming top-K selection: each user's best K matches without sorting every pair
+import heapq
+
+class TopKSelector:
+    """
+    Keeps a bounded min-heap of the K highest-scoring items per key, so memory
+    is O(keys x K) however many items are offered. On equal scores the item
+    offered first wins, which matches filling each list from a stable
+    best-first sort of everything offered.
+    """
+    def __init__(self, k=3):
+        self.k = k
+        self.heaps = {}
+        self.offered = 0
+
+    def accepts(self, key, score):
+        """Whether an item with `score` offered now would make the key's top K"""
+        heap = self.heaps.get(key)
+        if heap is None or len(heap) < self.k:
+            return self.k > 0
+        # Later offers lose ties, so they must beat the current worst outright
+        return score > heap[0][0]
+
+    def offer(self, key, score, item):
+        """Add an item if it makes the key's top K; returns whether it was kept"""
+        if not self.accepts(key, score):
+            return False
+        # The running count breaks ties (earlier offers rank higher) and keeps
+        # items themselves out of comparisons
+        entry = (score, -self.offered, item)
+        self.offered += 1
+        heap = self.heaps.setdefault(key, [])
+        if len(heap) < self.k:
+            heapq.heappush(heap, entry)
+        else:
+            heapq.heapreplace(heap, entry)
+        return True
+
+    def top(self, key):
+        """The key's kept items, best first"""
+        return [item for _, _, item in sorted(self.heaps.get(key, ()), key=lambda entry: entry[:2], reverse=True)]
+
+    def keys(self):
+        return self.heaps.keys()
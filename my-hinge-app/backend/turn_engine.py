@@ -0,0 +1,159 @@
+# turn_engine.py
+# Turn-by-turn conversation engine: each message is its own completion,
+# written by one persona with only their own profile and what they can see
+# of their match, so conversations can stop as soon as they clearly fail.
+import logging
+from llm_client import get_default_client, TokenBudgetExceeded
+from metrics import timed
+
+logger = logging.getLogger(__name__)
+
+# A persona replies with this instead of a message when they would stop responding
+END_MARKER = "[END]"
+
+# Defaults for the turn engine's options
+DEFAULT_MAX_TURNS = 8
+DEFAULT_MIN_TURNS = 4
+DEFAULT_STOP_POLARITY = -0.1
+DEFAULT_STOP_WINDOW = 4
+DEFAULT_TURN_MAX_TOKENS = 80
+
+# Options read from the simulate request when engine is "turns"
+TURN_OPTIONS = ("max_turns", "min_turns", "stop_polarity", "stop_window", "turn_max_tokens")
+
+TURN_SYSTEM_PROMPT = """
+You are {name}, {age}, chatting with a match on the Hinge dating app.
+Your bio: {bio}
+Your interests: {interests}
+Your personality: {personality}
+
+Your match is {partner_name}, {partner_age}.
+Their bio: {partner_bio}
+Their interests: {partner_interests}
+{partner_answers}
+Guidelines:
+- Write exactly like a real dating app message: casual, 1-2 short sentences
+- Stay in character and react to what {partner_name} actually said
+- Reply with only your next message, without your name in front
+- If the conversation is going nowhere and you would stop replying in real life, reply with {end_marker} only
+"""
+
+def _persona_prompt(profile, partner):
+    answers = "".join(
+        f"Their answer to \"{answer.get('prompt')}\": {answer.get('answer')}\n"
+        for answer in (partner.get('prompt_answers') or [])
+    )
+    return TURN_SYSTEM_PROMPT.format(
+        name=profile['name'], age=profile.get('age', ''), bio=profile.get('bio', ''),
+        interests=", ".join(profile.get('interests') or []), personality=profile.get('personality', ''),
+        partner_name=partner['name'], partner_age=partner.get('age', ''), partner_bio=partner.get('bio', ''),
+        partner_interests=", ".join(partner.get('interests') or []), partner_answers=answers,
+        end_marker=END_MARKER
+    )
+
+def _turn_messages(system_prompt, speaker_name, partner_name, history):
+    """Chat messages for the speaker's next turn: their own lines as assistant, the match's as user"""
+    messages = [{"role": "system", "content": system_prompt}]
+    if not history:
+        messages.append({"role": "user", "content": f"(You just matched with {partner_name}. Send the first message.)"})
+    for name, text in history:
+        messages.append({"role": "assistant" if name == speaker_name else "user", "content": text})
+    return messages
+
+def _clean_reply(reply, speaker_name):
+    """(message text, ended) from a raw completion; the text is empty if nothing usable came back"""
+    ended = END_MARKER in reply
+    lines = [line.strip() for line in reply.replace(END_MARKER, "").split("\n") if line.strip()]
+    text = lines[0] if lines else ""
+    # Models sometimes echo the "Name: message" transcript format
+    if text.lower().startswith(f"{speaker_name.lower()}:"):
+        text = text[len(speaker_name) + 1:].strip()
+    return text, ended
+
+def _polarity(text):
+    # TextBlob is what spacytextblob scores with, so this matches the analysis stage
+    from textblob import TextBlob
+    return TextBlob(text).sentiment.polarity
+
+@timed("simulate_conversation", engine="turns")
+def simulate_conversation_turns(userA, userB, client=None, budget=None, max_turns=DEFAULT_MAX_TURNS,
+                                min_turns=DEFAULT_MIN_TURNS, stop_polarity=DEFAULT_STOP_POLARITY,
+                                stop_window=DEFAULT_STOP_WINDOW, turn_max_tokens=DEFAULT_TURN_MAX_TOKENS,
+                                details=None):
+    """
+    Simulate a conversation one message at a time, alternating from userA.
+
+    The conversation ends early when:
+    - a persona replies with END_MARKER (they would stop responding),
+    - after `min_turns` messages, the mean polarity of the last `stop_window`
+      messages is at or below `stop_polarity` (None turns this check off),
+    - two replies in a row come back empty or malformed, or
+    - the run's token `budget` can't cover another turn.
+
+    Returns the "Name: message" lines like simulate_conversation_with_ai,
+    or None if the conversation ended (or went malformed) before two
+    messages were written: that pair didn't talk, and scoring an empty
+    conversation would rank it as neutral. Raises TokenBudgetExceeded if the
+    budget ran out before two messages were written. Pass a dict as
+    `details` to receive the number of turns, the stop reason and the
+    tokens used.
+    """
+    client = client or get_default_client()
+    personas = [
+        (userA['name'], userB['name'], _persona_prompt(userA, userB)),
+        (userB['name'], userA['name'], _persona_prompt(userB, userA)),
+    ]
+    history = []
+    polarities = []
+    malformed = 0
+    tokens = 0
+    stop_reason = "completed"
+
+    for turn in range(max_turns):
+        speaker_name, partner_name, system_prompt = personas[turn % 2]
+        usage = {}
+        try:
+            reply = client.chat(
+                messages=_turn_messages(system_prompt, speaker_name, partner_name, history),
+                max_tokens=turn_max_tokens,
+                temperature=0.8,
+                usage=usage,
+                budget=budget
+            )
+        except TokenBudgetExceeded:
+            if len(history) < 2:
+                raise
+            stop_reason = "budget"
+            break
+        tokens += usage.get("total_tokens", 0)
+
+        text, ended = _clean_reply(reply, speaker_name)
+        if text:
+            malformed = 0
+            history.append((speaker_name, text))
+            polarities.append(_polarity(text))
+        else:
+            malformed += 1
+
+        if ended:
+            stop_reason = "ended"
+            break
+        if turn == max_turns - 1:
+            break
+        if malformed >= 2:
+            stop_reason = "malformed"
+            break
+        recent = polarities[-stop_window:]
+        if (stop_polarity is not None and len(history) >= min_turns and recent
+                and sum(recent) / len(recent) <= stop_polarity):
+            stop_reason = "negative"
+            break
+
+    if details is not None:
+        details.update(turns=len(history), stop_reason=stop_reason, tokens=tokens)
+    if stop_reason != "completed":
+        logger.debug("Conversation between %s and %s stopped after %d messages (%s)",
+                     userA['name'], userB['name'], len(history), stop_reason)
+    if len(history) < 2:
+        return None
+    return [f"{name}: {text}" for name, text in history]
@@ -14,11 +14,8 @@ document.addEventListener('DOMContentLoaded', () => {
   // Initial connection test
   testApiConnection();
   
-  // Check initial status
+  // Check initial status; after that, progress arrives on each job's event stream
   checkStatus();
-  
-  // Set up polling for status updates (every 2 seconds)
-  setInterval(checkStatus, 2000);
 });
 
 // API base URL
@@ -126,6 +123,59 @@ function updateUIBasedOnStatus(status) {
   }
 }
 
+// Follow a background job's event stream until it finishes
+function followJob(jobId, handlers = {}) {
+  return new Promise((resolve, reject) => {
+    const source = new EventSource(`${API_BASE_URL}/api/jobs/${jobId}/events`);
+    
+    source.addEventListener('progress', event => {
+      const progress = JSON.parse(event.data);
+      const eta = progress.eta_seconds != null ? ` (about ${Math.ceil(progress.eta_seconds)}s left)` : '';
+      updateStatusBanner(`In progress: ${progress.message}${eta}`, 'in-progress');
+    });
+    
+    // Per-item results as they complete
+    ['conversation', 'pair'].forEach(type => {
+      if (handlers[type]) {
+        source.addEventListener(type, event => handlers[type](JSON.parse(event.data)));
+      }
+    });
+    
+    source.addEventListener('state', event => {
+      const state = JSON.parse(event.data);
+      if (state.state === 'succeeded') {
+        source.close();
+        resolve(state);
+      } else if (state.state === 'failed') {
+        source.close();
+        reject(new Error(state.error || 'Job failed'));
+      }
+    });
+    
+    // EventSource reconnects on its own and resumes from the last event id
+    source.onerror = () => console.warn('Job event stream interrupted, reconnecting...');
+  });
+}
+
+// Run a pipeline step as a background job and wait for it to finish
+async function runStageJob(endpoint, body, errorMessage, handlers) {
+  const response = await fetch(`${API_BASE_URL}${endpoint}`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json'
+    },
+    body: JSON.stringify({ ...body, async: true })
+  });
+  
+  if (!response.ok) {
+    const errorData = await response.json();
+    throw new Error(errorData.error || errorMessage);
+  }
+  
+  const data = await response.json();
+  return followJob(data.job_id, handlers);
+}
+
 // Generate profiles
 async function generateProfiles() {
   try {
@@ -141,31 +191,17 @@ async function generateProfiles() {
     document.getElementById('results-heading').style.display = 'none';
     document.getElementById('conversation-view').style.display = 'none';
     
-    // Call the API
-    const response = await fetch(`${API_BASE_URL}/api/generate-profiles`, {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json'
-      },
-      body: JSON.stringify({ num_profiles: 10 })
-    });
-    
-    if (!response.ok) {
-      const errorData = await response.json();
-      throw new Error(errorData.error || 'Failed to generate profiles');
-    }
-    
-    const data = await response.json();
-    
-    // Display profiles
-    displayProfiles(data.profiles);
+    // Run the step in the background, then load the new profiles
+    await runStageJob('/api/generate-profiles', { num_profiles: 10 }, 'Failed to generate profiles');
+    document.getElementById('profiles-summary').innerHTML = '';
+    await fetchAndDisplayProfiles();
     
     // Update UI
     document.getElementById('profiles-spinner').style.display = 'none';
     document.getElementById('profiles-content').style.display = 'block';
     document.getElementById('simulate-conversations-btn').disabled = false;
     
-    updateStatusBanner(data.message, 'success');
+    updateStatusBanner('Profiles generated!', 'success');
   } catch (error) {
     console.error('Error generating profiles:', error);
     document.getElementById('profiles-spinner').style.display = 'none';
@@ -233,30 +269,22 @@ async function simulateConversations() {
     document.getElementById('results-heading').style.display = 'none';
     document.getElementById('conversation-view').style.display = 'none';
     
-    // Call the API
-    const response = await fetch(`${API_BASE_URL}/api/simulate-conversations`, {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json'
-      }
+    // Run the step in the background, counting conversations as they arrive
+    let simulated = 0;
+    await runStageJob('/api/simulate-conversations', {}, 'Failed to simulate conversations', {
+      conversation: () => { simulated += 1; }
     });
     
-    if (!response.ok) {
-      const errorData = await response.json();
-      throw new Error(errorData.error || 'Failed to simulate conversations');
-    }
-    
-    const data = await response.json();
-    
     // Display sample conversation
-    displaySampleConversation(data.sample_conversation);
+    document.getElementById('sample-conversation').innerHTML = '';
+    await fetchAndDisplaySampleConversation();
     
     // Update UI
     document.getElementById('conversations-spinner').style.display = 'none';
     document.getElementById('conversations-content').style.display = 'block';
     document.getElementById('analyze-sentiment-btn').disabled = false;
     
-    updateStatusBanner(data.message, 'success');
+    updateStatusBanner(`Simulated ${simulated} conversations`, 'success');
   } catch (error) {
     console.error('Error simulating conversations:', error);
     document.getElementById('conversations-spinner').style.display = 'none';
@@ -341,20 +369,8 @@ async function analyzeSentiment() {
     document.getElementById('results-heading').style.display = 'none';
     document.getElementById('conversation-view').style.display = 'none';
     
-    // Call the API
-    const response = await fetch(`${API_BASE_URL}/api/analyze-sentiment`, {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json'
-      }
-    });
-    
-    if (!response.ok) {
-      const errorData = await response.json();
-      throw new Error(errorData.error || 'Failed to analyze sentiment');
-    }
-    
-    const data = await response.json();
+    // Run the step in the background
+    await runStageJob('/api/analyze-sentiment', {}, 'Failed to analyze sentiment');
     
     // Update UI
     document.getElementById('sentiment-spinner').style.display = 'none';
@@ -362,7 +378,7 @@ async function analyzeSentiment() {
     document.getElementById('results-heading').style.display = 'block';
     
     // Display results
-    renderResults(data.results);
+    await fetchResults();
     
     updateStatusBanner('Sentiment analysis complete!', 'success');
   } catch (error) {
@@ -493,8 +509,7 @@ function renderMatchesList(matches, userId) {
     return `
       <div class="match-item" 
            data-user-id="${userId}" 
-           data-partner-id="${match.partner_id}"
-           data-conversation='${JSON.stringify(match.conversation || [])}'>
+           data-partner-id="${match.partner_id}">
         <div class="d-flex justify-content-between align-items-center">
           <div>
             <strong>${match.partner_name || 'Unknown User'}</strong>
@@ -509,16 +524,25 @@ function renderMatchesList(matches, userId) {
   }).join('');
 }
 
-// Handle click on a match item
-function handleMatchClick(event) {
-  const matchItem = event.currentTarget;
-  let conversation = [];
-  
+// Fetch a pair's conversation; results only reference conversations by pair
+async function fetchConversation(userId, partnerId) {
   try {
-    conversation = JSON.parse(matchItem.dataset.conversation || '[]');
+    const response = await fetch(`${API_BASE_URL}/api/conversation/${userId}/${partnerId}`);
+    if (!response.ok) {
+      throw new Error('Failed to fetch conversation');
+    }
+    const data = await response.json();
+    return data.conversation || [];
   } catch (error) {
-    console.error('Error parsing conversation data:', error);
+    console.error('Error fetching conversation:', error);
+    return [];
   }
+}
+
+// Handle click on a match item
+async function handleMatchClick(event) {
+  const matchItem = event.currentTarget;
+  const conversation = await fetchConversation(matchItem.dataset.userId, matchItem.dataset.partnerId);
   
   if (!conversation || conversation.length === 0) {
     document.getElementById('conversation-title').textContent = 'No conversation available';
@@ -528,7 +552,6 @@ function handleMatchClick(event) {
     return;
   }
   
-  const userId = matchItem.dataset.userId;
   const partnerId = matchItem.dataset.partnerId;
   
   // Get user names from the conversation